@@ -0,0 +1,94 @@
+# app/aws_clients.py
+"""
+Process-wide AWS client registry. Clients are created lazily on first use (importing a module
+never touches boto3 credentials or endpoints), shared by every thread, and configured with a
+connection pool large enough for the concurrent ingestion paths and TCP keep-alive.
+API calls are counted on the active metrics trace, and every client is paced by the shared
+per-service rate limits. API calls are retried (throttling and transient errors) in exactly one
+place, the rate-limited wrapper (app.rate_limit), so botocore's own retries are switched off for
+them. Managed transfers, paginators and waiters are not single calls the wrapper can replay: they go
+to a twin client that keeps botocore's retries (AWS_RETRY_MODE, adaptive by default).
+"""
+import os
+import threading
+import boto3
+from botocore.config import Config
+from app.metrics import instrument_client
+from app.rate_limit import limited
+
+REGION = os.environ.get("AWS_REGION", "us-east-1")
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", "64"))
+AWS_RETRY_MODE = os.environ.get("AWS_RETRY_MODE", "adaptive")
+AWS_MAX_ATTEMPTS = int(os.environ.get("AWS_MAX_ATTEMPTS", "8"))
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+_resources = {}
+
+
+def client_config(retrying: bool = False) -> Config:
+    """
+    Config of the clients behind the rate-limited wrapper (no botocore retries) or, with retrying,
+    of the twin clients that serve the calls the wrapper passes through.
+    """
+    if retrying:
+        retries = {"mode": AWS_RETRY_MODE, "max_attempts": AWS_MAX_ATTEMPTS}
+    else:
+        retries = {"mode": "standard", "total_max_attempts": 1}
+    return Config(
+        region_name=REGION,
+        max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+        retries=retries,
+        tcp_keepalive=True,
+    )
+
+
+def _new_client(service: str, retrying: bool = False):
+    return instrument_client(_get_session().client(service, config=client_config(retrying)), service)
+
+
+def _get_session():
+    # boto3 sessions are not thread-safe; only ever touched under _lock
+    global _session
+    if _session is None:
+        _session = boto3.session.Session(region_name=REGION)
+    return _session
+
+
+def get_client(service: str):
+    client = _clients.get(service)
+    if client is None:
+        with _lock:
+            client = _clients.get(service)
+            if client is None:
+                client = _clients[service] = limited(_new_client(service), service, passthrough=_new_client(service, retrying=True))
+    return client
+
+
+def get_resource(service: str):
+    resource = _resources.get(service)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(service)
+            if resource is None:
+                resource = _resources[service] = _get_session().resource(service, config=client_config())
+                # tables and other sub-resources created from here on call through the limited client
+                resource.meta.client = limited(instrument_client(resource.meta.client, service), service,
+                                               passthrough=_new_client(service, retrying=True))
+    return resource
+
+
+def set_client(service: str, client):
+    """
+    Register a client (or stand-in) for a service, e.g. for local runs and benchmarks.
+    It is rate limited like the clients created here.
+    """
+    with _lock:
+        _clients[service] = limited(client, service)
+
+
+def set_resource(service: str, resource):
+    with _lock:
+        resource.meta.client = limited(resource.meta.client, service)
+        _resources[service] = resource
@@ -1,18 +1,26 @@
 # app/bedrock_kb.py
 import os
 import uuid
-import boto3
 from botocore.exceptions import ClientError
+from app.aws_clients import get_client
 
-REGION = os.environ.get("AWS_REGION", "us-east-1")
-BEDROCK_AGENT = boto3.client("bedrock-agent", region_name=REGION)
 ROLE_ARN = os.environ.get("BEDROCK_ROLE_ARN")
 EMBEDDING_MODEL_ARN = os.environ.get("EMBEDDING_MODEL_ARN")
 
 
 class BedrockKB:
-    def __init__(self, agent_client=None):
-        self.client = agent_client or BEDROCK_AGENT
+    def __init__(self, agent_client=None, runtime_client=None):
+        self._client = agent_client
+        self._runtime = runtime_client
+
+    @property
+    def client(self):
+        return self._client or get_client("bedrock-agent")
+
+    @property
+    def runtime(self):
+        # retrieve_and_generate(_stream) live on the runtime client, not on bedrock-agent
+        return self._runtime or get_client("bedrock-agent-runtime")
 
     def create_kb(self, name: str, s3_bucket: str, s3_prefix: str, structured_config: dict = None, description: str = None):
         req = {
@@ -49,12 +57,8 @@ class BedrockKB:
         except ClientError as e:
             return {"error": str(e)}
 
-    def retrieve_and_generate(self, kb_id: str, prompt: str, model_arn: str = None, max_output_tokens: int = 1024, retrieval_filters: dict = None):
-        """
-        Calls Bedrock's retrieve_and_generate on the KB.
-        retrieval_filters is passed in as {"filters": { ... }} depending on API.
-        Common filter: restrict to batch_id metadata.
-        """
+    @staticmethod
+    def _rag_params(kb_id: str, prompt: str, model_arn: str = None, max_output_tokens: int = 1024, retrieval_filters: dict = None):
         params = {
             "knowledgeBaseId": kb_id,
             "input": {"text": prompt},
@@ -64,5 +68,40 @@ class BedrockKB:
             params["modelArn"] = model_arn
         if retrieval_filters:
             params["retrievalConfiguration"] = {"filters": retrieval_filters}
-        resp = self.client.retrieve_and_generate(**params)
+        return params
+
+    def retrieve_and_generate(self, kb_id: str, prompt: str, model_arn: str = None, max_output_tokens: int = 1024, retrieval_filters: dict = None):
+        """
+        Calls Bedrock's retrieve_and_generate on the KB.
+        retrieval_filters is passed in as {"filters": { ... }} depending on API.
+        Common filter: restrict to batch_id metadata.
+        """
+        params = self._rag_params(kb_id, prompt, model_arn, max_output_tokens, retrieval_filters)
+        resp = self.runtime.retrieve_and_generate(**params)
         return resp
+
+    def retrieve_and_generate_stream(self, kb_id: str, prompt: str, model_arn: str = None, max_output_tokens: int = 1024, retrieval_filters: dict = None):
+        """
+        Streaming variant of retrieve_and_generate over Bedrock's event stream. Yields events as they
+        arrive: {"type": "text", "text": delta} and {"type": "citation", "citation": {...}}.
+        An error event in the stream raises RuntimeError. With a botocore that predates the streaming
+        operation, the blocking call is made instead and replayed as one text event plus its citations.
+        """
+        params = self._rag_params(kb_id, prompt, model_arn, max_output_tokens, retrieval_filters)
+        runtime = self.runtime
+        if not hasattr(runtime, "retrieve_and_generate_stream"):
+            resp = runtime.retrieve_and_generate(**params)
+            yield {"type": "text", "text": (resp.get("output") or {}).get("text", "")}
+            for citation in resp.get("citations", []):
+                yield {"type": "citation", "citation": citation}
+            return
+        resp = runtime.retrieve_and_generate_stream(**params)
+        for event in resp["stream"]:
+            if "output" in event:
+                yield {"type": "text", "text": event["output"].get("text", "")}
+            elif "citation" in event:
+                yield {"type": "citation", "citation": event["citation"].get("citation") or event["citation"]}
+            else:
+                name, body = next(iter(event.items()))
+                if name.endswith("Exception"):
+                    raise RuntimeError(f"retrieve_and_generate_stream failed: {name}: {body.get('message', body)}")
@@ -0,0 +1,78 @@
+# app/chunk_sink.py
+"""
+Chunk persistence stage: uploads chunk JSONs to S3 from a bounded thread pool and
+streams the uploaded chunks into DynamoClient.put_chunks (25-item batch writes).
+With pack_bytes the chunks are packed into size-targeted KB documents instead (see kb_packer).
+"""
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from botocore.exceptions import ClientError, BotoCoreError
+from contextvars import copy_context
+from app.aws_clients import get_client
+from app.metrics import count
+from app.kb_packer import DocumentPacker
+
+CHUNK_SINK_CONCURRENCY = int(os.environ.get("CHUNK_SINK_CONCURRENCY", "16"))
+
+
+class ChunkSink:
+    def __init__(self, bucket: str, use_case: str, batch_id: str, dyn, s3_client=None, max_workers: int = None, prefix: str = "kb_chunks", pack_bytes: int = 0):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.use_case = use_case
+        self.batch_id = batch_id
+        self.dyn = dyn
+        self.s3 = s3_client or get_client("s3")
+        self.max_workers = max_workers or CHUNK_SINK_CONCURRENCY
+        self.packer = DocumentPacker(bucket, use_case, batch_id, self.s3, self.max_workers, pack_bytes) if pack_bytes else None
+
+    def chunk_key(self, chunk_id: str) -> str:
+        return f"usecase/{self.use_case}/{self.prefix}/{self.batch_id}/{chunk_id}.json"
+
+    def _upload(self, ch: dict):
+        body = json.dumps(ch).encode("utf-8")
+        self.s3.put_object(Bucket=self.bucket, Key=self.chunk_key(ch["chunk_id"]), Body=body)
+        count("chunk_bytes", len(body))
+        return ch
+
+    def upload(self, chunks, failed: list):
+        """
+        Upload chunks with at most 2 * max_workers in flight and yield each chunk once its
+        S3 object exists. Failed uploads are appended to failed and not yielded.
+        """
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for ch in chunks:
+                meta = ch.setdefault("metadata", {})
+                meta["batch_id"] = self.batch_id
+                meta["chunk_id"] = ch["chunk_id"]
+                if len(in_flight) >= self.max_workers * 2:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    yield from self._collect(done, in_flight, failed)
+                in_flight[pool.submit(copy_context().run, self._upload, ch)] = ch
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                yield from self._collect(done, in_flight, failed)
+
+    @staticmethod
+    def _collect(done, in_flight: dict, failed: list):
+        for fut in done:
+            ch = in_flight.pop(fut)
+            try:
+                fut.result()
+            except (ClientError, BotoCoreError) as e:
+                failed.append({"chunk_id": ch["chunk_id"], "stage": "s3", "error": str(e)})
+                continue
+            yield ch
+
+    def write(self, chunks) -> dict:
+        """
+        Persist chunks (any iterable). Returns {"written": int, "failed": [{"chunk_id", "stage", "error"}],
+        "documents": {doc_key: [chunk_id, ...]}} (documents only when packing).
+        """
+        failed = []
+        uploaded = self.packer.upload(chunks, failed) if self.packer else self.upload(chunks, failed)
+        res = self.dyn.put_chunks(self.use_case, uploaded)
+        failed.extend({"chunk_id": f["chunk_id"], "stage": "dynamodb", "error": f["error"]} for f in res["failed"])
+        return {"written": res["written"], "failed": failed, "documents": self.packer.documents if self.packer else {}}
@@ -0,0 +1,159 @@
+# app/chunks.py
+"""
+Compact chunk storage. ChunkBatch keeps chunks column-wise instead of one nested dict per chunk:
+chunk ids as 16 raw bytes, page/table/row/col/slide as int64 arrays, doc_uri and sheet as indexes
+into interned string tables, and the set/order of metadata keys as a shared layout id. Chunks are
+rebuilt into the usual {chunk_id, text, metadata} dicts only at the output edge (iteration / indexing),
+so they have exactly the JSON shape the parsers produced.
+"""
+import json
+import uuid
+import hashlib
+from array import array
+
+INT_COLUMNS = ("page", "table", "row", "col", "slide")
+LOCATOR_KEYS = ("sheet", "slide", "page", "table", "row", "col")
+STR_COLUMNS = ("doc_uri", "sheet")
+
+_NONE = -(2 ** 63)  # stored value for an explicit None
+_INT, _BOOL, _STR = 0, 1, 2
+
+
+class ChunkBatch:
+    __slots__ = ("_ids", "_texts", "_layout_ids", "_layouts", "_layout_pos", "_ints", "_strs",
+                 "_str_table", "_str_pos", "_extras")
+
+    def __init__(self):
+        self._ids = bytearray()
+        self._texts = []
+        self._layout_ids = array("H")
+        self._layouts = []
+        self._layout_pos = {}
+        self._ints = {k: array("q") for k in INT_COLUMNS}
+        self._strs = {k: array("I") for k in STR_COLUMNS}
+        self._str_table = [None]
+        self._str_pos = {None: 0}
+        self._extras = {}
+
+    def __len__(self):
+        return len(self._texts)
+
+    def _intern(self, s) -> int:
+        pos = self._str_pos.get(s)
+        if pos is None:
+            pos = self._str_pos[s] = len(self._str_table)
+            self._str_table.append(s)
+        return pos
+
+    def append(self, text: str, metadata: dict, chunk_id: str = None, **extra):
+        """
+        Add one chunk. Metadata keys outside the known columns, non-hex chunk ids and extra top-level
+        fields (e.g. s3_uri) are kept per chunk in a sparse side table.
+        """
+        i = len(self._texts)
+        layout, meta_extra = [], None
+        ints = {k: 0 for k in INT_COLUMNS}
+        strs = {k: 0 for k in STR_COLUMNS}
+        for k, v in metadata.items():
+            if k in ints and (v is None or type(v) in (int, bool)):
+                layout.append((k, _BOOL if type(v) is bool else _INT))
+                ints[k] = _NONE if v is None else int(v)
+            elif k in strs and (v is None or isinstance(v, str)):
+                layout.append((k, _STR))
+                strs[k] = self._intern(v)
+            else:
+                meta_extra = meta_extra or {}
+                meta_extra[k] = v
+                layout.append((k, None))
+        layout = tuple(layout)
+        layout_id = self._layout_pos.get(layout)
+        if layout_id is None:
+            layout_id = self._layout_pos[layout] = len(self._layouts)
+            self._layouts.append(layout)
+
+        raw_id = None
+        if chunk_id is None:
+            raw_id = uuid.uuid4().bytes
+        elif len(chunk_id) == 32:
+            try:
+                raw_id = bytes.fromhex(chunk_id)
+            except ValueError:
+                pass
+        if raw_id is None:
+            raw_id = bytes(16)
+            extra["chunk_id"] = chunk_id
+        self._ids += raw_id
+        self._texts.append(text)
+        self._layout_ids.append(layout_id)
+        for k in INT_COLUMNS:
+            self._ints[k].append(ints[k])
+        for k in STR_COLUMNS:
+            self._strs[k].append(strs[k])
+        if meta_extra or extra:
+            self._extras[i] = (meta_extra, extra or None)
+
+    def extend(self, chunks):
+        for ch in chunks:
+            extra = {k: v for k, v in ch.items() if k not in ("chunk_id", "text", "metadata")}
+            self.append(ch["text"], ch.get("metadata", {}), ch.get("chunk_id"), **extra)
+        return self
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        return cls().extend(chunks)
+
+    def __getitem__(self, i):
+        """Chunk dict at index i; a slice returns a list of chunk dicts, as slicing a list would."""
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        meta_extra, extra = self._extras.get(i, (None, None))
+        metadata = {}
+        for k, kind in self._layouts[self._layout_ids[i]]:
+            if kind is None:
+                metadata[k] = meta_extra[k]
+            elif kind == _STR:
+                metadata[k] = self._str_table[self._strs[k][i]]
+            else:
+                v = self._ints[k][i]
+                metadata[k] = None if v == _NONE else (bool(v) if kind == _BOOL else v)
+        chunk = {"chunk_id": self._ids[i * 16:(i + 1) * 16].hex(), "text": self._texts[i], "metadata": metadata}
+        if extra:
+            chunk.update(extra)
+        return chunk
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_dicts(self) -> list:
+        return list(self)
+
+
+def document_key(use_case: str, filename: str) -> str:
+    """
+    Identity of a logical document across versions: re-uploading a corrected file under the same
+    name in the same use case is treated as a new version of that document.
+    """
+    return f"{use_case}/{filename}"
+
+
+def assign_chunk_ids(chunks, doc_key: str):
+    """
+    Replace chunk ids with deterministic ones derived from the document identity, the chunk's
+    position (sheet/slide/page/table/row/col), its text and its occurrence number among identical
+    chunks at that position. Unchanged chunks therefore keep their id across versions.
+    """
+    seen = {}
+    for ch in chunks:
+        meta = ch.get("metadata", {})
+        locator = json.dumps([meta.get(k) for k in LOCATOR_KEYS], default=str)
+        base = hashlib.sha256("\x1f".join((doc_key, locator, ch.get("text") or "")).encode("utf-8")).digest()
+        occurrence = seen.get(base, 0)
+        seen[base] = occurrence + 1
+        digest = base if occurrence == 0 else hashlib.sha256(base + str(occurrence).encode("ascii")).digest()
+        ch["chunk_id"] = digest[:16].hex()
+        yield ch
@@ -1,26 +1,61 @@
 # app/dynamo_client.py
 import os
-import boto3
+import gzip
+import json
 import time
 import uuid
-from boto3.dynamodb.conditions import Key
-
-REGION = os.environ.get("AWS_REGION", "us-east-1")
-dynamodb = boto3.resource("dynamodb", region_name=REGION)
+import base64
+import logging
+from decimal import Decimal
+from functools import cached_property
+from itertools import islice
+from boto3.dynamodb.conditions import Key, Attr
+from botocore.exceptions import ClientError, BotoCoreError
+from app.snippet_index import snippet_record, forget
+from app.aws_clients import get_client, get_resource
 
 TABLE_FILES = os.environ.get("DYNAMODB_TABLE_FILES")
 TABLE_CHUNKS = os.environ.get("DYNAMODB_TABLE_CHUNKS")
 TABLE_RECON = os.environ.get("DYNAMODB_TABLE_RECON")
+# Content dedup needs a GSI on the files table: partition key sha256 (S), sort key use_case (S),
+# projection ALL. Without it (or with DYNAMODB_FILES_SHA256_INDEX="") dedup is skipped.
+FILES_SHA256_INDEX = os.environ.get("DYNAMODB_FILES_SHA256_INDEX", "sha256-index")
+
+# Recon payloads larger than this (JSON bytes) go to S3, gzip-compressed; items stay far below 400 KB
+RECON_INLINE_MAX_BYTES = int(os.environ.get("RECON_INLINE_MAX_BYTES", "16384"))
+RECON_PAYLOAD_BUCKET = os.environ.get("RECON_PAYLOAD_BUCKET", os.environ.get("S3_BUCKET"))
+RECON_SUMMARY_TEXT_CHARS = 300
+MISSING_INDEX_CODES = ("ValidationException", "ResourceNotFoundException")
+
+logger = logging.getLogger("recon.dynamo")
+
+RECON_SUMMARY_ATTRIBUTES = ("use_case", "recon_id", "created_at", "batch_id", "summary", "payload_uri", "payload_bytes")
+
+BATCH_WRITE_SIZE = 25
+BATCH_MAX_RETRIES = int(os.environ.get("DYNAMODB_BATCH_MAX_RETRIES", "8"))
+BATCH_BACKOFF_BASE = 0.05
+BATCH_BACKOFF_MAX = 5.0
 
 
 class DynamoClient:
-    def __init__(self):
-        self.table_files = dynamodb.Table(TABLE_FILES)
-        self.table_chunks = dynamodb.Table(TABLE_CHUNKS)
-        self.table_recon = dynamodb.Table(TABLE_RECON)
+    _sha256_index_missing = False  # set once a dedup query finds no sha256 GSI
 
-    def put_file(self, use_case: str, file_id: str, s3_uri: str, sha256: str, batch_id: str, meta: dict):
-        item = {
+    # Tables resolve on first use, so constructing a DynamoClient costs nothing
+    @cached_property
+    def table_files(self):
+        return get_resource("dynamodb").Table(TABLE_FILES)
+
+    @cached_property
+    def table_chunks(self):
+        return get_resource("dynamodb").Table(TABLE_CHUNKS)
+
+    @cached_property
+    def table_recon(self):
+        return get_resource("dynamodb").Table(TABLE_RECON)
+
+    @staticmethod
+    def _file_item(use_case: str, file_id: str, s3_uri: str, sha256: str, batch_id: str, meta: dict):
+        return {
             "use_case": use_case,
             "file_id": file_id,
             "s3_uri": s3_uri,
@@ -29,15 +64,236 @@ class DynamoClient:
             "meta": meta,
             "uploaded_at": int(time.time())
         }
+
+    def put_file(self, use_case: str, file_id: str, s3_uri: str, sha256: str, batch_id: str, meta: dict):
+        item = self._file_item(use_case, file_id, s3_uri, sha256, batch_id, meta)
         self.table_files.put_item(Item=item)
         return item
 
+    def find_file_by_sha256(self, use_case: str, sha256: str):
+        """
+        Return a completely ingested file item with this content hash in the use case, or None.
+        Only items whose meta has complete=True qualify, so a failed or partial ingest
+        never short-circuits a re-upload. If the table has no FILES_SHA256_INDEX (not migrated yet)
+        a warning is logged once and dedup is skipped: every file is treated as new.
+        """
+        if not FILES_SHA256_INDEX or self._sha256_index_missing:
+            return None
+        try:
+            resp = self.table_files.query(
+                IndexName=FILES_SHA256_INDEX,
+                KeyConditionExpression=Key("sha256").eq(sha256) & Key("use_case").eq(use_case)
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in MISSING_INDEX_CODES:
+                raise
+            self._sha256_index_missing = True
+            logger.warning("dedup disabled: querying index %s of %s failed (%s); create the sha256 GSI to enable it",
+                           FILES_SHA256_INDEX, self.table_files.name, e)
+            return None
+        for item in resp.get("Items", []):
+            if item.get("meta", {}).get("complete"):
+                return item
+        return None
+
+    def list_files(self, use_case: str, batch_ids) -> list:
+        """
+        File items of the use case that belong to any of batch_ids (all pages of the query).
+        """
+        kwargs = {
+            "KeyConditionExpression": Key("use_case").eq(use_case),
+            "FilterExpression": Attr("batch_id").is_in(list(batch_ids))
+        }
+        items = []
+        while True:
+            resp = self.table_files.query(**kwargs)
+            items.extend(resp.get("Items", []))
+            if "LastEvaluatedKey" not in resp:
+                return items
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
     def put_chunk(self, use_case: str, chunk_id: str, chunk_obj: dict):
         item = {"use_case": use_case, "chunk_id": chunk_id, "chunk": chunk_obj}
         self.table_chunks.put_item(Item=item)
+        forget(use_case, [chunk_id])
         return item
 
+    def get_chunk(self, use_case: str, chunk_id: str):
+        return self.table_chunks.get_item(Key={"use_case": use_case, "chunk_id": chunk_id}).get("Item")
+
+    @staticmethod
+    def _request_payload(request: dict) -> dict:
+        return request["PutRequest"]["Item"] if "PutRequest" in request else request["DeleteRequest"]["Key"]
+
+    def _write_batch(self, table, requests: list) -> list:
+        """
+        One BatchWriteItem call (<= 25 Put/DeleteRequests) with exponential backoff on UnprocessedItems.
+        Throttled calls and transient errors are already retried by the rate-limited client
+        (app.rate_limit). Returns [(item or key, error)] for requests that could not be applied,
+        including every request of a call that still fails (e.g. the endpoint is unreachable).
+        """
+        attempt = 0
+        while requests:
+            try:
+                resp = table.meta.client.batch_write_item(RequestItems={table.name: requests})
+            except (ClientError, BotoCoreError) as e:
+                return [(self._request_payload(r), str(e)) for r in requests]
+            requests = resp.get("UnprocessedItems", {}).get(table.name, [])
+            if not requests:
+                break
+            attempt += 1
+            if attempt > BATCH_MAX_RETRIES:
+                return [(self._request_payload(r), "unprocessed after retries") for r in requests]
+            time.sleep(min(BATCH_BACKOFF_BASE * (2 ** attempt), BATCH_BACKOFF_MAX))
+        return []
+
+    def _batch_write(self, table, requests) -> dict:
+        """
+        Apply an iterable of write requests in 25-request batches. Only one batch is held in memory,
+        so generators are consumed lazily and never materialised.
+        """
+        written = 0
+        failed = []
+        it = iter(requests)
+        while True:
+            batch = list(islice(it, BATCH_WRITE_SIZE))
+            if not batch:
+                break
+            errors = self._write_batch(table, batch)
+            written += len(batch) - len(errors)
+            failed.extend(errors)
+        return {"written": written, "failed": failed}
+
+    def _batch_put(self, table, items) -> dict:
+        return self._batch_write(table, ({"PutRequest": {"Item": item}} for item in items))
+
+    def put_chunks(self, use_case: str, chunks) -> dict:
+        """
+        Bulk variant of put_chunk for an iterable/generator of chunk dicts. Each item also carries
+        the compact snippet record used by reference replay (see app.snippet_index).
+        Returns {"written": int, "failed": [{"chunk_id", "error"}]}.
+        """
+        chunk_ids = []
+
+        def items():
+            for ch in chunks:
+                chunk_ids.append(ch["chunk_id"])
+                yield {"use_case": use_case, "chunk_id": ch["chunk_id"], "chunk": ch, "snippet": snippet_record(ch)}
+        res = self._batch_put(self.table_chunks, items())
+        forget(use_case, chunk_ids)
+        res["failed"] = [{"chunk_id": item["chunk_id"], "error": err} for item, err in res["failed"]]
+        return res
+
+    def delete_chunks(self, use_case: str, chunk_ids) -> dict:
+        """
+        Bulk delete of chunk items. Returns {"written": deleted count, "failed": [{"chunk_id", "error"}]}.
+        """
+        chunk_ids = list(chunk_ids)
+        requests = ({"DeleteRequest": {"Key": {"use_case": use_case, "chunk_id": cid}}} for cid in chunk_ids)
+        res = self._batch_write(self.table_chunks, requests)
+        forget(use_case, chunk_ids)
+        res["failed"] = [{"chunk_id": key["chunk_id"], "error": err} for key, err in res["failed"]]
+        return res
+
+    def put_files(self, use_case: str, files) -> dict:
+        """
+        Bulk variant of put_file. files is an iterable of dicts with
+        file_id, s3_uri, sha256, batch_id and meta.
+        Returns {"written": int, "failed": [{"file_id", "error"}]}.
+        """
+        items = (self._file_item(use_case, f["file_id"], f["s3_uri"], f["sha256"], f["batch_id"], f.get("meta", {})) for f in files)
+        res = self._batch_put(self.table_files, items)
+        res["failed"] = [{"file_id": item["file_id"], "error": err} for item, err in res["failed"]]
+        return res
+
     def put_recon_result(self, use_case: str, recon_id: str, payload: dict):
-        item = {"use_case": use_case, "recon_id": recon_id, "payload": payload, "created_at": int(time.time())}
+        """
+        Store a recon. Payloads above RECON_INLINE_MAX_BYTES of JSON are written gzip-compressed to
+        S3 (usecase/{use_case}/recons/{recon_id}.json.gz) and the item keeps only a summary and
+        payload_uri; smaller ones stay inline. Either way the item carries batch_id and summary,
+        so listings never need the payload.
+        """
+        body = json.dumps(payload, default=str).encode("utf-8")
+        item = {
+            "use_case": use_case,
+            "recon_id": recon_id,
+            "created_at": int(time.time()),
+            "batch_id": payload.get("batch_id"),
+            "summary": recon_summary(payload),
+            "payload_bytes": len(body),
+        }
+        if len(body) > RECON_INLINE_MAX_BYTES:
+            key = f"usecase/{use_case}/recons/{recon_id}.json.gz"
+            get_client("s3").put_object(Bucket=RECON_PAYLOAD_BUCKET, Key=key, Body=gzip.compress(body), ContentType="application/json")
+            item["payload_uri"] = f"s3://{RECON_PAYLOAD_BUCKET}/{key}"
+        else:
+            item["payload"] = payload
+        # DynamoDB rejects floats (and datetimes in raw model responses); store numbers as Decimal
+        item = json.loads(json.dumps(item, default=str), parse_float=Decimal)
         self.table_recon.put_item(Item=item)
         return item
+
+    def iter_recons(self, use_case: str, page_size: int = 25, cursor: str = None):
+        """
+        Recon summary items of a use case, newest sort key first, fetched page_size at a time with a
+        projection (never the payload). Every item carries a "cursor"; passing it back resumes the
+        listing right after that item.
+        """
+        names = {f"#{a}": a for a in RECON_SUMMARY_ATTRIBUTES}
+        kwargs = {
+            "KeyConditionExpression": Key("use_case").eq(use_case),
+            "ProjectionExpression": ", ".join(names),
+            "ExpressionAttributeNames": names,
+            "ScanIndexForward": False,
+            "Limit": page_size,
+        }
+        if cursor:
+            kwargs["ExclusiveStartKey"] = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        while True:
+            resp = self.table_recon.query(**kwargs)
+            for item in resp.get("Items", []):
+                key = {"use_case": item["use_case"], "recon_id": item["recon_id"]}
+                item["cursor"] = base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii")
+                yield item
+            if "LastEvaluatedKey" not in resp:
+                return
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    def get_recon_payload(self, use_case: str, item: dict):
+        """
+        Full payload of a recon summary item: from S3 when it was offloaded, else the inline attribute.
+        """
+        if item.get("payload_uri"):
+            bucket, key = item["payload_uri"].replace("s3://", "").split("/", 1)
+            return json.loads(gzip.decompress(get_client("s3").get_object(Bucket=bucket, Key=key)["Body"].read()))
+        item = self.table_recon.get_item(
+            Key={"use_case": use_case, "recon_id": item["recon_id"]},
+            ProjectionExpression="#p",
+            ExpressionAttributeNames={"#p": "payload"}
+        ).get("Item", {})
+        # Same plain JSON types as an offloaded payload (DynamoDB numbers come back as Decimal)
+        return json.loads(json.dumps(item.get("payload", {}), default=_decimal_to_number))
+
+
+def _decimal_to_number(d: Decimal):
+    return int(d) if d == d.to_integral_value() else float(d)
+
+
+def recon_summary(payload: dict) -> dict:
+    """
+    The small part of a recon shown in listings: engine, model, reference count, rules counts
+    and the start of the answer.
+    """
+    resp = payload.get("bedrock_raw_response")
+    answer = ((resp or {}).get("output") or {}).get("text") if isinstance(resp, dict) else None
+    summary = {
+        "engine": payload.get("engine", "llm"),
+        "kb_id": payload.get("kb_id"),
+        "llm_model": payload.get("llm_model"),
+        "num_references": len(payload.get("references") or []),
+    }
+    if answer:
+        summary["answer"] = answer[:RECON_SUMMARY_TEXT_CHARS]
+    if payload.get("summary"):
+        summary["counts"] = payload["summary"]
+    return summary
@@ -0,0 +1,137 @@
+# app/incremental.py
+"""
+Incremental re-ingest. Each logical document (a caller-supplied doc_key within a use case) has a
+manifest in S3 listing the deterministic ids of its current chunks and the batch each one was written in.
+A new version of the document is diffed against it: only new or changed chunks go through
+the sink, chunks that disappeared are deleted from S3 and DynamoDB, unchanged ones are left alone.
+Chunks packed into KB documents are recorded per document too; removing one rewrites (or, once
+empty, deletes) the document it was packed into.
+"""
+import json
+import hashlib
+import threading
+from botocore.exceptions import ClientError, BotoCoreError
+from app.aws_clients import get_client
+from app.kb_packer import prune_document
+
+S3_DELETE_BATCH = 1000  # DeleteObjects limit
+
+_doc_locks = {}
+_doc_locks_guard = threading.Lock()
+
+
+def manifest_key(use_case: str, doc_key: str) -> str:
+    return f"usecase/{use_case}/manifests/{hashlib.sha256(doc_key.encode('utf-8')).hexdigest()[:32]}.json"
+
+
+def document_lock(use_case: str, doc_key: str) -> threading.Lock:
+    """
+    Lock serialising ingests of one document in this process, so two versions never interleave the
+    manifest read-modify-write. Writers in other processes must coordinate through the caller.
+    """
+    with _doc_locks_guard:
+        return _doc_locks.setdefault((use_case, doc_key), threading.Lock())
+
+
+class ChunkDiff:
+    def __init__(self, bucket: str, use_case: str, doc_key: str, s3_client=None):
+        self.bucket = bucket
+        self.use_case = use_case
+        self.doc_key = doc_key
+        self.s3 = s3_client or get_client("s3")
+        self.previous = {}  # chunk_id -> batch_id of the last ingested version
+        self.sha256 = None  # content hash of the last ingested version
+        self.prefixes = []
+        self.documents = {}  # packed document key -> chunk ids it held in the last ingested version
+        self.seen = set()
+        self.added = []
+
+    @property
+    def key(self) -> str:
+        return manifest_key(self.use_case, self.doc_key)
+
+    def load(self):
+        """
+        Read the previous manifest; a missing manifest means a first ingest (everything is new).
+        """
+        try:
+            body = self.s3.get_object(Bucket=self.bucket, Key=self.key)["Body"].read()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+                raise
+            return self
+        manifest = json.loads(body)
+        self.previous = manifest.get("chunks", {})
+        self.sha256 = manifest.get("sha256")
+        self.prefixes = sorted(set(self.prefixes) | set(manifest.get("prefixes", ["kb_chunks"])))
+        self.documents = manifest.get("documents", {})
+        return self
+
+    def filter(self, chunks):
+        """
+        Yield only chunks whose id was not in the previous version; every id is recorded as seen.
+        """
+        for ch in chunks:
+            cid = ch["chunk_id"]
+            self.seen.add(cid)
+            if cid not in self.previous:
+                self.added.append(cid)
+                yield ch
+
+    def removed(self) -> list:
+        return [cid for cid in self.previous if cid not in self.seen]
+
+    def delete_removed(self, dyn) -> dict:
+        """
+        Delete chunks of the previous version that are gone: their S3 objects under every prefix
+        the document was written to, their lines in packed KB documents, then their DynamoDB items.
+        """
+        removed = self.removed()
+        failed = []
+        gone = set(removed)
+        for doc_key, cids in self.documents.items():
+            if gone.intersection(cids):
+                try:
+                    prune_document(self.s3, self.bucket, doc_key, gone)
+                except (ClientError, BotoCoreError) as e:
+                    failed.append({"key": doc_key, "stage": "s3", "error": str(e)})
+        keys = [
+            f"usecase/{self.use_case}/{prefix}/{self.previous[cid]}/{cid}.json"
+            for cid in removed for prefix in self.prefixes
+        ]
+        for i in range(0, len(keys), S3_DELETE_BATCH):
+            objects = [{"Key": k} for k in keys[i:i + S3_DELETE_BATCH]]
+            try:
+                resp = self.s3.delete_objects(Bucket=self.bucket, Delete={"Objects": objects, "Quiet": True})
+            except ClientError as e:
+                failed.extend({"key": o["Key"], "stage": "s3", "error": str(e)} for o in objects)
+                continue
+            failed.extend({"key": err.get("Key"), "stage": "s3", "error": err.get("Message")} for err in resp.get("Errors", []))
+        if removed:
+            res = dyn.delete_chunks(self.use_case, removed)
+            failed.extend({"chunk_id": f["chunk_id"], "stage": "dynamodb", "error": f["error"]} for f in res["failed"])
+        return {"removed": len(removed), "failed": failed}
+
+    def save(self, batch_id: str, sha256: str, failed_ids=(), prefixes=(), documents=None):
+        """
+        Write the manifest of the new version: unchanged chunks keep their original batch, newly
+        written ones are recorded under batch_id. Failed chunks are left out so the next ingest retries them.
+        documents ({doc_key: [chunk_id, ...]} from the sink) are added to the packed documents that
+        still hold unchanged chunks.
+        """
+        failed_ids = set(failed_ids)
+        chunks = {cid: self.previous[cid] for cid in self.seen if cid in self.previous}
+        chunks.update((cid, batch_id) for cid in self.added if cid not in failed_ids)
+        kept = {}
+        for doc_key, cids in list(self.documents.items()) + list((documents or {}).items()):
+            cids = [cid for cid in cids if cid in chunks]
+            if cids:
+                kept[doc_key] = cids
+        self.prefixes = sorted(set(self.prefixes) | set(prefixes))
+        self.sha256 = sha256
+        body = json.dumps({"doc_key": self.doc_key, "sha256": sha256, "prefixes": self.prefixes, "chunks": chunks, "documents": kept})
+        self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=body.encode("utf-8"))
+        return chunks
+
+    def unchanged(self) -> int:
+        return len(self.seen) - len(self.added)
@@ -0,0 +1,239 @@
+# app/jobs.py
+"""
+Background ingestion jobs. submit() records a job and returns its id at once; a pool of
+INGEST_JOB_WORKERS threads runs upload -> parse -> persist -> KB sync through
+Orchestrator.ingest_batch, and every stage change is written to a job store, so any UI session
+(including one opened after a page refresh) can poll the progress.
+
+Stores: a DynamoDB table (INGEST_JOBS_TABLE; partition key job_id, optional GSI
+INGEST_JOBS_USE_CASE_INDEX on use_case + created_at for listings) or a local SQLite file
+(INGEST_JOBS_DB) as stand-in for local runs and tests.
+
+Job record: {job_id, use_case, kb_id, uploader, status: queued|running|succeeded|partial|failed,
+stage, files: {upload index: {name, stage, chunks?, error?}}, created_at, updated_at, result?,
+error?}; files is keyed by position because one job may carry several uploads of the same name
+(file_rows lists them in upload order for display). The final
+status follows the batch: partial when some files failed, failed when all did or the job crashed.
+A job interrupted by a process restart keeps its last stage; updated_at shows it went stale.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.conditions import Key
+from app.aws_clients import get_resource
+
+INGEST_JOB_WORKERS = int(os.environ.get("INGEST_JOB_WORKERS", "2"))
+INGEST_JOBS_TABLE = os.environ.get("INGEST_JOBS_TABLE")
+INGEST_JOBS_USE_CASE_INDEX = os.environ.get("INGEST_JOBS_USE_CASE_INDEX", "use_case-created_at-index")
+INGEST_JOBS_DB = os.environ.get("INGEST_JOBS_DB", "ingest_jobs.sqlite")
+
+# ingest_batch status -> final job status
+JOB_STATUS = {"failed": "failed", "partial": "partial"}
+
+logger = logging.getLogger("recon.jobs")
+
+
+class DynamoJobStore:
+    """
+    Job items in DynamoDB. Per-file progress is a nested map updated attribute by attribute, so
+    concurrent file workers never overwrite each other; result is stored as a JSON string.
+    """
+    def __init__(self, table):
+        self.table = table
+
+    def create(self, job: dict):
+        self.table.put_item(Item=job)
+
+    def update(self, job_id: str, fields: dict):
+        names = {f"#a{i}": k for i, k in enumerate(fields)}
+        values = {f":v{i}": v for i, v in enumerate(fields.values())}
+        self.table.update_item(
+            Key={"job_id": job_id},
+            UpdateExpression="SET " + ", ".join(f"#a{i} = :v{i}" for i in range(len(fields))),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+
+    def update_file(self, job_id: str, file_key: str, state: dict):
+        self.table.update_item(
+            Key={"job_id": job_id},
+            UpdateExpression="SET #files.#f = :s, #u = :t",
+            ExpressionAttributeNames={"#files": "files", "#f": file_key, "#u": "updated_at"},
+            ExpressionAttributeValues={":s": state, ":t": int(time.time())}
+        )
+
+    def get(self, job_id: str):
+        return self.table.get_item(Key={"job_id": job_id}).get("Item")
+
+    def list_jobs(self, use_case: str, limit: int = 20) -> list:
+        resp = self.table.query(
+            IndexName=INGEST_JOBS_USE_CASE_INDEX,
+            KeyConditionExpression=Key("use_case").eq(use_case),
+            ScanIndexForward=False,
+            Limit=limit
+        )
+        return resp.get("Items", [])
+
+
+class SQLiteJobStore:
+    """
+    Local stand-in with the same interface: one row per job holding the record as JSON.
+    """
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, use_case TEXT, created_at INTEGER, doc TEXT)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_use_case ON jobs (use_case, created_at)")
+
+    def create(self, job: dict):
+        with self._lock:
+            self._db.execute("INSERT INTO jobs VALUES (?, ?, ?, ?)", (job["job_id"], job["use_case"], job["created_at"], json.dumps(job)))
+
+    def _modify(self, job_id: str, fn):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT doc FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+                if row:
+                    job = json.loads(row[0])
+                    fn(job)
+                    self._db.execute("UPDATE jobs SET doc = ? WHERE job_id = ?", (json.dumps(job), job_id))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def update(self, job_id: str, fields: dict):
+        self._modify(job_id, lambda job: job.update(fields))
+
+    def update_file(self, job_id: str, file_key: str, state: dict):
+        def apply(job):
+            job.setdefault("files", {})[file_key] = state
+            job["updated_at"] = int(time.time())
+        self._modify(job_id, apply)
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._db.execute("SELECT doc FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_jobs(self, use_case: str, limit: int = 20) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT doc FROM jobs WHERE use_case = ? ORDER BY created_at DESC LIMIT ?", (use_case, limit)
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+
+def store_from_env():
+    if INGEST_JOBS_TABLE:
+        return DynamoJobStore(get_resource("dynamodb").Table(INGEST_JOBS_TABLE))
+    return SQLiteJobStore(INGEST_JOBS_DB)
+
+
+def file_rows(job: dict) -> list:
+    """
+    Per-file progress of a job as table rows ({file, stage, ...}) in upload order.
+    """
+    files = job.get("files", {})
+    rows = []
+    # records written before files were keyed by position are keyed by name; those sort last
+    for key in sorted(files, key=lambda k: (not k.isdigit(), int(k) if k.isdigit() else 0, k)):
+        state = dict(files[key])
+        rows.append({"file": state.pop("name", key), **state})
+    return rows
+
+
+def _detach(source):
+    """
+    Sources must outlive the request that submitted them: paths and buffers are kept as they
+    are, file objects (e.g. Streamlit UploadedFile) are read into memory.
+    """
+    if isinstance(source, (str, os.PathLike, bytes, bytearray, memoryview)):
+        return source
+    if source.seekable():
+        source.seek(0)
+    return source.read()
+
+
+class JobQueue:
+    def __init__(self, orchestrator, store=None, workers: int = None):
+        self.orc = orchestrator
+        self.store = store or store_from_env()
+        self.workers = workers or INGEST_JOB_WORKERS
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest-job")
+
+    def submit(self, use_case: str, kb_id: str, files, uploader: str, **options) -> str:
+        """
+        Queue an ingest_batch of files ((source, filename[, doc_key]) tuples) and return the job id.
+        options are passed on to ingest_batch (wait_build, timeout, dedup, structured_options, ...).
+        """
+        files = [(_detach(f[0]), *f[1:]) for f in files]
+        now = int(time.time())
+        job_id = uuid.uuid4().hex
+        self.store.create({
+            "job_id": job_id,
+            "use_case": use_case,
+            "kb_id": kb_id,
+            "uploader": uploader,
+            "status": "queued",
+            "stage": "queued",
+            "files": {str(i): {"name": f[1], "stage": "queued"} for i, f in enumerate(files)},
+            "created_at": now,
+            "updated_at": now,
+        })
+        self._pool.submit(self._run, job_id, use_case, kb_id, files, uploader, options)
+        return job_id
+
+    def _run(self, job_id: str, use_case: str, kb_id: str, files: list, uploader: str, options: dict):
+        # runs in the pool: anything that escapes would be lost in the future, so every failure is recorded here
+        try:
+            self._ingest(job_id, use_case, kb_id, files, uploader, options)
+        except Exception as e:
+            logger.exception("ingest job %s failed", job_id)
+            try:
+                self.store.update(job_id, {"status": "failed", "stage": "failed", "error": str(e), "updated_at": int(time.time())})
+            except Exception:
+                logger.exception("could not record the failure of ingest job %s", job_id)
+
+    def _ingest(self, job_id: str, use_case: str, kb_id: str, files: list, uploader: str, options: dict):
+        self.store.update(job_id, {"status": "running", "stage": "ingesting", "updated_at": int(time.time())})
+
+        def progress(filename, stage, file_index=None, **info):
+            if filename is None:
+                self.store.update(job_id, {"stage": stage, "updated_at": int(time.time())})
+            else:
+                self.store.update_file(job_id, str(file_index), dict(info, name=filename, stage=stage))
+
+        res = self.orc.ingest_batch(use_case, kb_id, files, uploader, progress=progress, **options)
+        for i, r in enumerate(res["files"]):
+            state = {"name": r["filename"], "stage": r["status"], "chunks": int(r.get("num_chunks", 0))}
+            if r.get("error"):
+                state["error"] = r["error"]
+            self.store.update_file(job_id, str(i), state)
+        fields = {
+            "status": JOB_STATUS.get(res["status"], "succeeded"),
+            "stage": "done",
+            "batch_id": res["batch_id"],
+            "result": json.dumps(res, default=str),
+            "updated_at": int(time.time())
+        }
+        errors = [f"{r['filename']}: {r['error']}" for r in res["files"] if r.get("error")]
+        if errors:
+            fields["error"] = "; ".join(errors)
+        self.store.update(job_id, fields)
+
+    def get(self, job_id: str):
+        return self.store.get(job_id)
+
+    def list_jobs(self, use_case: str, limit: int = 20) -> list:
+        return self.store.list_jobs(use_case, limit)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,262 @@
+# app/kb_packer.py
+"""
+Packs chunks into size-targeted KB documents instead of one tiny S3 object per chunk. Consecutive
+chunks of the same sheet, page or slide of a source file are concatenated (one labelled line each)
+into usecase/{uc}/kb_chunks/{batch}/{doc_id}.txt until the document reaches KB_PACK_TARGET_BYTES.
+Next to each document go:
+
+- {doc_id}.txt.metadata.json, the Bedrock KB metadata sidecar with the filterable attributes
+  (batch_id, doc_uri, sheet/page/slide, row_start/row_end), so retrieval filters keep working;
+- usecase/{uc}/kb_offsets/{batch}/{doc_id}.json, outside the KB prefix: the character range and
+  locator of every chunk in the document.
+
+A reference to a packed document is mapped back to the exact chunks (row, cell, line) its retrieved
+passage overlaps through that offset map. KB_PACK_TARGET_BYTES=0 keeps one object per chunk.
+"""
+import os
+import json
+import hashlib
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from botocore.exceptions import ClientError, BotoCoreError
+from contextvars import copy_context
+from app.aws_clients import get_client
+from app.chunks import LOCATOR_KEYS
+from app.metrics import count
+
+KB_PACK_TARGET_BYTES = int(os.environ.get("KB_PACK_TARGET_BYTES", "65536"))
+KB_OFFSETS_CACHE_SIZE = int(os.environ.get("KB_OFFSETS_CACHE_SIZE", "64"))
+
+GROUP_KEYS = ("doc_uri", "sheet", "page", "slide")
+METADATA_SUFFIX = ".metadata.json"
+PASSAGE_PROBE = 64  # characters matched at each end of a passage that is not found verbatim
+
+
+def document_keys(use_case: str, batch_id: str, doc_id: str) -> dict:
+    doc = f"usecase/{use_case}/kb_chunks/{batch_id}/{doc_id}.txt"
+    return {"doc": doc, "sidecar": doc + METADATA_SUFFIX, "offsets": f"usecase/{use_case}/kb_offsets/{batch_id}/{doc_id}.json"}
+
+
+def offsets_key(doc_key: str) -> str:
+    """Offset map key of a packed document key (usecase/{uc}/kb_chunks/{batch}/{doc_id}.txt)."""
+    prefix, _, rest = doc_key.partition("/kb_chunks/")
+    return f"{prefix}/kb_offsets/{rest[:-len('.txt')]}.json"
+
+
+def is_packed_document(uri: str) -> bool:
+    return bool(uri) and "/kb_chunks/" in uri and uri.endswith(".txt")
+
+
+def chunk_label(meta: dict) -> str:
+    """Locator prefix of a chunk's line, e.g. "sheet=Payments row=12: ", so answers can cite it."""
+    parts = [f"{k}={meta[k]}" for k in LOCATOR_KEYS if meta.get(k) is not None]
+    return " ".join(parts) + ": " if parts else ""
+
+
+def build_document(chunks: list) -> tuple:
+    """
+    (text, entries, attributes) for a group of chunks: the document text, one offset map entry
+    {chunk_id, start, end, locator...} per chunk and the sidecar metadataAttributes.
+    """
+    lines, entries, pos = [], [], 0
+    for ch in chunks:
+        meta = ch.get("metadata", {})
+        line = chunk_label(meta) + (ch.get("text") or "")
+        entry = {"chunk_id": ch["chunk_id"], "start": pos, "end": pos + len(line)}
+        entry.update((k, meta[k]) for k in LOCATOR_KEYS if meta.get(k) is not None)
+        entries.append(entry)
+        lines.append(line)
+        pos += len(line) + 1
+    return "\n".join(lines), entries, document_attributes(chunks[0].get("metadata", {}), entries)
+
+
+def document_attributes(meta: dict, entries: list) -> dict:
+    attrs = {k: meta[k] for k in ("batch_id", *GROUP_KEYS) if meta.get(k) is not None}
+    rows = [e["row"] for e in entries if isinstance(e.get("row"), int)]
+    if rows:
+        attrs["row_start"], attrs["row_end"] = min(rows), max(rows)
+    attrs["chunks"] = len(entries)
+    return attrs
+
+
+def put_document(s3, bucket: str, keys: dict, text: str, entries: list, attrs: dict) -> int:
+    """
+    Write a packed document, its offset map and its sidecar; the document goes last so the KB
+    never crawls it without its metadata. Returns the document size in bytes.
+    """
+    body = text.encode("utf-8")
+    s3.put_object(Bucket=bucket, Key=keys["offsets"], Body=json.dumps({"doc_key": keys["doc"], "chunks": entries}).encode("utf-8"))
+    s3.put_object(Bucket=bucket, Key=keys["sidecar"], Body=json.dumps({"metadataAttributes": attrs}).encode("utf-8"))
+    s3.put_object(Bucket=bucket, Key=keys["doc"], Body=body, ContentType="text/plain; charset=utf-8")
+    return len(body)
+
+
+class DocumentPacker:
+    """
+    Drop-in for ChunkSink.upload that packs chunks into KB documents. documents collects
+    {doc_key: [chunk_id, ...]} of every document written, for the incremental manifest.
+    """
+    def __init__(self, bucket: str, use_case: str, batch_id: str, s3_client=None, max_workers: int = 4, target_bytes: int = None):
+        self.bucket = bucket
+        self.use_case = use_case
+        self.batch_id = batch_id
+        self.s3 = s3_client or get_client("s3")
+        self.max_workers = max_workers
+        self.target_bytes = target_bytes or KB_PACK_TARGET_BYTES
+        self.documents = {}
+
+    def _write(self, chunks: list):
+        text, entries, attrs = build_document(chunks)
+        doc_id = hashlib.sha256("\x1f".join(e["chunk_id"] for e in entries).encode("utf-8")).hexdigest()[:32]
+        keys = document_keys(self.use_case, self.batch_id, doc_id)
+        uri = f"s3://{self.bucket}/{keys['doc']}"
+        for ch, e in zip(chunks, entries):
+            ch["metadata"].update(kb_document=uri, kb_offset=[e["start"], e["end"]])
+        size = put_document(self.s3, self.bucket, keys, text, entries, attrs)
+        count("kb_documents")
+        count("chunk_bytes", size)
+        return keys["doc"]
+
+    def _groups(self, chunks):
+        group, key, size = [], None, 0
+        for ch in chunks:
+            meta = ch.setdefault("metadata", {})
+            meta["batch_id"] = self.batch_id
+            meta["chunk_id"] = ch["chunk_id"]
+            k = tuple(meta.get(g) for g in GROUP_KEYS)
+            n = len((ch.get("text") or "").encode("utf-8")) + 32
+            if group and (k != key or size + n > self.target_bytes):
+                yield group
+                group, size = [], 0
+            group.append(ch)
+            key, size = k, size + n
+        if group:
+            yield group
+
+    def upload(self, chunks, failed: list):
+        """
+        Pack chunks into documents, write them with at most 2 * max_workers in flight and yield
+        each chunk once its document exists. Every chunk of a failed document goes to failed.
+        """
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for group in self._groups(chunks):
+                if len(in_flight) >= self.max_workers * 2:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    yield from self._collect(done, in_flight, failed)
+                in_flight[pool.submit(copy_context().run, self._write, group)] = group
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                yield from self._collect(done, in_flight, failed)
+
+    def _collect(self, done, in_flight: dict, failed: list):
+        for fut in done:
+            group = in_flight.pop(fut)
+            try:
+                doc_key = fut.result()
+            except (ClientError, BotoCoreError) as e:
+                failed.extend({"chunk_id": ch["chunk_id"], "stage": "s3", "error": str(e)} for ch in group)
+                continue
+            self.documents[doc_key] = [ch["chunk_id"] for ch in group]
+            yield from group
+
+
+def prune_document(s3, bucket: str, doc_key: str, remove_ids) -> list:
+    """
+    Drop chunks from a packed document in place (document, offset map and sidecar are rewritten);
+    a document left empty is deleted with its companions. Returns the chunk ids it still holds.
+    """
+    remove_ids = set(remove_ids)
+    okey = offsets_key(doc_key)
+    try:
+        entries = json.loads(s3.get_object(Bucket=bucket, Key=okey)["Body"].read())["chunks"]
+        text = s3.get_object(Bucket=bucket, Key=doc_key)["Body"].read().decode("utf-8")
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+            raise
+        return []
+    kept = [e for e in entries if e["chunk_id"] not in remove_ids]
+    keys = {"doc": doc_key, "sidecar": doc_key + METADATA_SUFFIX, "offsets": okey}
+    if not kept:
+        s3.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": k} for k in keys.values()], "Quiet": True})
+        return []
+    lines, new_entries, pos = [], [], 0
+    for e in kept:
+        line = text[e["start"]:e["end"]]
+        new_entries.append({**e, "start": pos, "end": pos + len(line)})
+        lines.append(line)
+        pos += len(line) + 1
+    attrs = json.loads(s3.get_object(Bucket=bucket, Key=keys["sidecar"])["Body"].read()).get("metadataAttributes", {})
+    attrs.pop("row_start", None)
+    attrs.pop("row_end", None)
+    attrs.update(document_attributes(attrs, new_entries))
+    put_document(s3, bucket, keys, "\n".join(lines), new_entries, attrs)
+    load_document.cache_clear()
+    return [e["chunk_id"] for e in new_entries]
+
+
+@lru_cache(maxsize=KB_OFFSETS_CACHE_SIZE)
+def load_document(s3_uri: str):
+    """(text, offset entries) of a packed document, cached."""
+    bucket, key = s3_uri.replace("s3://", "").split("/", 1)
+    s3 = get_client("s3")
+    entries = json.loads(s3.get_object(Bucket=bucket, Key=offsets_key(key))["Body"].read())["chunks"]
+    text = s3.get_object(Bucket=bucket, Key=key)["Body"].read().decode("utf-8")
+    return text, entries
+
+
+def find_passage(text: str, passage: str):
+    """(start, end) of a retrieved passage in the document text, or None."""
+    passage = (passage or "").strip()
+    if not passage:
+        return None
+    start = text.find(passage)
+    if start >= 0:
+        return start, start + len(passage)
+    # the KB may have re-flowed whitespace inside the passage: anchor on both ends instead
+    head, tail = passage[:PASSAGE_PROBE].strip(), passage[-PASSAGE_PROBE:].strip()
+    start = text.find(head)
+    if start < 0:
+        return None
+    end = text.find(tail, start)
+    return (start, end + len(tail)) if end >= 0 else (start, start + len(head))
+
+
+def locate_chunks(s3_uri: str, passage: str) -> list:
+    """
+    Offset map entries ({chunk_id, start, end, locator...}) of the chunks of a packed document that
+    a retrieved passage overlaps; empty when the passage cannot be placed.
+    """
+    try:
+        text, entries = load_document(s3_uri)
+    except ClientError:
+        return []
+    span = find_passage(text, passage)
+    if span is None:
+        return []
+    return [e for e in entries if e["start"] < span[1] and e["end"] > span[0]]
+
+
+def expand_references(refs: list) -> list:
+    """
+    Replace references to packed documents with one reference per chunk their passage covers
+    (metadata carries chunk_id and the exact locator, so replay resolves the row or cell); a
+    reference whose passage cannot be placed stays document-level. The passage text is dropped.
+    """
+    out, seen = [], set()
+    for ref in refs:
+        passage = ref.pop("content", None)
+        uri = ref.get("kb_chunk_id")
+        entries = locate_chunks(uri, passage) if is_packed_document(uri) else []
+        if not entries:
+            out.append(ref)
+            continue
+        meta = ref.get("metadata") or {}
+        base = {k: meta[k] for k in ("batch_id", "doc_uri") if meta.get(k) is not None}
+        for e in entries:
+            if e["chunk_id"] in seen:
+                continue
+            seen.add(e["chunk_id"])
+            locator = {k: v for k, v in e.items() if k in LOCATOR_KEYS}
+            out.append({"kb_chunk_id": e["chunk_id"], "metadata": {**base, **locator, "chunk_id": e["chunk_id"], "kb_document": uri}})
+    return out
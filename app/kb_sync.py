@@ -1,15 +1,11 @@
 # app/kb_sync.py
-import boto3
 from botocore.exceptions import ClientError
-import os
-
-REGION = os.environ.get("AWS_REGION", "us-east-1")
-BEDROCK_AGENT = boto3.client("bedrock-agent", region_name=REGION)
+from app.aws_clients import get_client
 
 
 def sync_kb(kb_id: str):
     try:
-        resp = BEDROCK_AGENT.start_knowledge_base_build(knowledgeBaseId=kb_id)
+        resp = get_client("bedrock-agent").start_knowledge_base_build(knowledgeBaseId=kb_id)
         return resp
     except ClientError as e:
         return {"error": str(e)}
@@ -17,7 +13,7 @@ def sync_kb(kb_id: str):
 
 def get_sync_status(kb_id: str):
     try:
-        resp = BEDROCK_AGENT.get_knowledge_base_build(knowledgeBaseId=kb_id)
+        resp = get_client("bedrock-agent").get_knowledge_base_build(knowledgeBaseId=kb_id)
         return resp
     except ClientError as e:
         return {"error": str(e)}
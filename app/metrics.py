@@ -0,0 +1,252 @@
+# app/metrics.py
+"""
+Lightweight tracing for the ingest and recon pipelines. An operation runs inside
+trace("ingest"), stages inside span("upload") and code anywhere below it bumps counters with
+count("chunks", n); the active trace is found through a context variable, so helpers need no
+extra parameters (thread pools propagate it with contextvars.copy_context()). AWS API calls are
+counted by botocore event hooks on the shared clients (see aws_clients); retries are counted both
+by the rate-limited wrapper and, for transfers and paginators, by botocore.
+
+When a trace ends its summary -- per-span count/total/max seconds, counters and total time --
+is handed to the configured exporters (METRICS_EXPORTERS, comma-separated: log, prometheus, memory).
+"""
+import os
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+METRICS_EXPORTERS = os.environ.get("METRICS_EXPORTERS", "log")
+
+logger = logging.getLogger("recon.metrics")
+_current = ContextVar("recon_trace", default=None)
+
+
+class Trace:
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.started = time.time()
+        self.duration = None
+        self.spans = {}  # name -> [count, total_s, max_s]
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, duration: float):
+        with self._lock:
+            agg = self.spans.setdefault(name, [0, 0.0, 0.0])
+            agg[0] += 1
+            agg[1] += duration
+            agg[2] = max(agg[2], duration)
+
+    @contextmanager
+    def span(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.add_span(name, time.perf_counter() - t0)
+
+    def count(self, name: str, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "trace": self.name,
+                "total_s": round(self.duration if self.duration is not None else time.time() - self.started, 3),
+                "spans": {k: {"count": c, "total_s": round(t, 3), "max_s": round(m, 3)} for k, (c, t, m) in self.spans.items()},
+                "counters": dict(self.counters),
+            }
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def trace(name: str, **attrs):
+    """
+    Run an operation under a new trace; exported when the block exits.
+    """
+    t = Trace(name, **attrs)
+    token = _current.set(t)
+    try:
+        yield t
+    finally:
+        _current.reset(token)
+        t.duration = time.time() - t.started
+        for exporter in exporters():
+            exporter.export(t)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Time a stage on the active trace (a no-op without one).
+    """
+    t = _current.get()
+    if t is None:
+        yield None
+        return
+    with t.span(name):
+        yield t
+
+
+def count(name: str, n=1):
+    t = _current.get()
+    if t is not None:
+        t.count(name, n)
+
+
+def timed(it, name: str):
+    """
+    Wrap an iterator so the time spent producing its items (not consuming them) is one span,
+    e.g. the parse share of a streamed parse -> persist pipeline.
+    """
+    t = _current.get()
+    if t is None:
+        yield from it
+        return
+    it = iter(it)
+    total = 0.0
+    try:
+        while True:
+            t0 = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                break
+            finally:
+                total += time.perf_counter() - t0
+            yield item
+    finally:
+        t.add_span(name, total)
+
+
+def isolated(gen):
+    """
+    Iterate a generator in its own copy of the current context. A trace it opens stays set only
+    while it runs, never in the consumer's context between items, and closing it early (an
+    abandoned stream) ends the trace in the context that started it.
+    """
+    ctx = contextvars.copy_context()
+    try:
+        while True:
+            try:
+                item = ctx.run(next, gen)
+            except StopIteration:
+                return
+            yield item
+    finally:
+        ctx.run(gen.close)
+
+
+class LogExporter:
+    def export(self, t: Trace):
+        s = t.summary()
+        spans = " ".join(f"{k}={v['total_s']}s" for k, v in s["spans"].items())
+        counters = " ".join(f"{k}={v}" for k, v in s["counters"].items())
+        logger.info("trace=%s total=%ss %s %s %s", t.name, s["total_s"], spans, counters, t.attrs or "")
+
+
+class InMemoryExporter:
+    def __init__(self):
+        self.traces = []
+
+    def export(self, t: Trace):
+        self.traces.append(t.summary())
+
+
+class PrometheusExporter:
+    """
+    Aggregates every exported trace; render() returns the Prometheus text exposition format.
+    """
+    def __init__(self, prefix: str = "recon"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._spans = {}     # (trace, span) -> [count, sum]
+        self._counters = {}  # (trace, name) -> total
+        self._traces = {}    # trace -> [count, sum]
+
+    def export(self, t: Trace):
+        s = t.summary()
+        with self._lock:
+            agg = self._traces.setdefault(t.name, [0, 0.0])
+            agg[0] += 1
+            agg[1] += s["total_s"]
+            for name, v in s["spans"].items():
+                agg = self._spans.setdefault((t.name, name), [0, 0.0])
+                agg[0] += v["count"]
+                agg[1] += v["total_s"]
+            for name, v in s["counters"].items():
+                self._counters[(t.name, name)] = self._counters.get((t.name, name), 0) + v
+
+    def render(self) -> str:
+        p = self.prefix
+        lines = [f"# TYPE {p}_trace_seconds summary", f"# TYPE {p}_span_seconds summary", f"# TYPE {p}_events_total counter"]
+        with self._lock:
+            for name, (c, total) in sorted(self._traces.items()):
+                lines.append(f'{p}_trace_seconds_count{{trace="{name}"}} {c}')
+                lines.append(f'{p}_trace_seconds_sum{{trace="{name}"}} {total}')
+            for (tname, name), (c, total) in sorted(self._spans.items()):
+                lines.append(f'{p}_span_seconds_count{{trace="{tname}",span="{name}"}} {c}')
+                lines.append(f'{p}_span_seconds_sum{{trace="{tname}",span="{name}"}} {total}')
+            for (tname, name), v in sorted(self._counters.items()):
+                lines.append(f'{p}_events_total{{trace="{tname}",name="{name}"}} {v}')
+        return "\n".join(lines) + "\n"
+
+
+_EXPORTER_TYPES = {"log": LogExporter, "prometheus": PrometheusExporter, "memory": InMemoryExporter}
+_exporters = None
+_exporters_lock = threading.Lock()
+
+
+def exporters() -> list:
+    global _exporters
+    if _exporters is None:
+        with _exporters_lock:
+            if _exporters is None:
+                _exporters = [_EXPORTER_TYPES[n.strip()]() for n in METRICS_EXPORTERS.split(",") if n.strip()]
+    return _exporters
+
+
+def add_exporter(exporter):
+    """
+    Register an exporter (anything with export(trace)) in addition to the configured ones.
+    """
+    exporters()
+    with _exporters_lock:
+        _exporters.append(exporter)
+    return exporter
+
+
+def get_exporter(kind):
+    """
+    The first registered exporter of a class, e.g. get_exporter(PrometheusExporter).render().
+    """
+    return next((e for e in exporters() if isinstance(e, kind)), None)
+
+
+def instrument_client(client, service: str):
+    """
+    Count API calls (api_calls, api_calls.{service}), failed calls and retries on the active trace.
+    """
+    def after_call(http_response=None, parsed=None, **kwargs):
+        count("api_calls")
+        count(f"api_calls.{service}")
+        retries = ((parsed or {}).get("ResponseMetadata") or {}).get("RetryAttempts", 0)
+        if retries:
+            count("retries", retries)
+
+    def after_call_error(**kwargs):
+        count("api_calls")
+        count(f"api_calls.{service}")
+        count("api_errors")
+
+    client.meta.events.register("after-call", after_call)
+    client.meta.events.register("after-call-error", after_call_error)
+    return client
@@ -1,98 +1,403 @@
 # app/orchestrator.py
+import io
 import os
 import uuid
 import json
-import boto3
 import time
-from app.s3_ingest import upload_file_with_metadata
-from app.textract_processor import start_async_analysis_s3, get_async_analysis_result, extract_chunks_from_textract_response, detect_text_bytes
-from app.pptx_parser import extract_chunks_from_pptx
-from app.structured_adapter import excel_to_row_chunks
+import contextvars
+from contextlib import nullcontext
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from app.s3_ingest import upload_file_with_metadata, compute_sha256
+from app.sources import open_source
+from app.parsers import ParseContext, get_parser
 from app.bedrock_kb import BedrockKB
-from app.kb_sync import sync_kb, get_sync_status
+from app.kb_sync import get_sync_status
+from app.sync_scheduler import request_sync
+from app.recon_cache import ReconCache, build_version, make_key
+from app.snippet_index import SnippetIndex, split_s3_uri
+from app.aws_clients import get_client
 from app.dynamo_client import DynamoClient
+from app.chunk_sink import ChunkSink
+from app.chunks import assign_chunk_ids, document_key
+from app.incremental import ChunkDiff, document_lock
+from app.kb_packer import KB_PACK_TARGET_BYTES, expand_references
+from app import metrics
 
 S3_BUCKET = os.environ.get("S3_BUCKET")
 CLAUDE_MODEL_ARN = os.environ.get("CLAUDE_MODEL_ARN")
+INGEST_FILE_CONCURRENCY = int(os.environ.get("INGEST_FILE_CONCURRENCY", "4"))
+INGEST_PROGRESS_EVERY = int(os.environ.get("INGEST_PROGRESS_EVERY", "1000"))  # chunks between progress reports
+RECON_RULES_MAX_EXCEPTIONS = int(os.environ.get("RECON_RULES_MAX_EXCEPTIONS", "500"))
+RECON_LLM_MAX_EXCEPTIONS = int(os.environ.get("RECON_LLM_MAX_EXCEPTIONS", "50"))
+# Structured rows parsed at ingest are kept (as DataFrames built batch by batch) for the rules engine,
+# so a recon right after an ingest does not download and parse the sources again; files with more
+# rows are re-read on demand
+STRUCTURED_ROWS_CACHE_FILES = int(os.environ.get("STRUCTURED_ROWS_CACHE_FILES", "8"))
+STRUCTURED_ROWS_CACHE_MAX_ROWS = int(os.environ.get("STRUCTURED_ROWS_CACHE_MAX_ROWS", "20000"))
+STRUCTURED_EXTENSIONS = (".xlsx", ".xls", ".csv")
 
 
 class Orchestrator:
     def __init__(self):
         self.kb = BedrockKB()
         self.dyn = DynamoClient()
+        self.recon_cache = ReconCache.from_env()
+        self.rows_cache = ReconCache(max_entries=STRUCTURED_ROWS_CACHE_FILES)
+        self.snippets = SnippetIndex(self.dyn)
 
     def _generate_batch_id(self):
         return f"batch-{uuid.uuid4().hex[:8]}"
 
-    def ingest_file_and_sync(self, use_case: str, kb_id: str, local_path: str, filename: str, uploader: str, wait_build=True, poll_interval=15, timeout=600):
+    def ingest_file_and_sync(self, use_case: str, kb_id: str, source, filename: str, uploader: str, wait_build=True, poll_interval=15, timeout=600, sink_concurrency: int = None, dedup=True, structured_options: dict = None, incremental=False, doc_key: str = None):
         """
         Upload file, create chunks, upload to S3 for KB, trigger KB sync, and optionally poll until build completes.
+        The result's "metrics" is the stage breakdown (spans and counters, see app.metrics).
+        source is a local path, a seekable binary file object (e.g. a Streamlit UploadedFile) or a
+        bytes/memoryview buffer; it is read once for hashing, once for upload and once for parsing.
+        If dedup is set and the same content was already fully ingested for this use case, the new
+        file record is linked to the existing batch and upload, parsing and KB sync are skipped.
+        structured_options (sheets, columns, dtypes, block_rows) are passed to the spreadsheet/CSV adapter.
+        The build goes through the shared per-KB sync scheduler, which coalesces concurrent requests;
+        poll_interval is kept for compatibility, the scheduler polls every KB_SYNC_POLL_INTERVAL_S.
+        With incremental, the upload is a new version of the document the caller names with doc_key
+        (required: file names are not unique enough to decide that two uploads are the same document);
+        only the chunks that changed are rewritten and if nothing changed no KB sync is started.
+        Use the returned batch_ids to scope a recon to the whole current version.
         """
         batch_id = self._generate_batch_id()
-        file_and_meta = upload_file_with_metadata(S3_BUCKET, use_case, batch_id, local_path, filename, uploader)
+        with metrics.trace("ingest", use_case=use_case, batch_id=batch_id) as tr:
+            result = self._ingest_file(use_case, batch_id, source, filename, uploader, sink_concurrency, dedup, structured_options, incremental, doc_key)
+            if result["status"] not in ("duplicate", "unchanged"):
+                ticket = request_sync(kb_id)
+                if wait_build:
+                    with metrics.span("kb_sync_wait"):
+                        ticket.wait(timeout)
+                result["status"] = "uploaded_and_indexed"
+        result["metrics"] = tr.summary()
+        return result
+
+    def ingest_batch(self, use_case: str, kb_id: str, files, uploader: str, wait_build=True, timeout=600, max_workers: int = None, sink_concurrency: int = None, dedup=True, structured_options: dict = None, incremental=False, progress=None):
+        """
+        Ingest several files under one shared batch_id and trigger a single KB build at the end.
+        files is an iterable of (source, filename) or (source, filename, doc_key); sources are as for
+        ingest_file_and_sync. With incremental, files with a doc_key are re-ingested as new versions
+        of that document and files without one are ingested as new content; a doc_key may appear only
+        once per batch.
+        Files are uploaded, parsed and persisted concurrently (max_workers, default INGEST_FILE_CONCURRENCY).
+        A failing file does not abort the others; it is reported with status "error" and the batch
+        status is "partial" ("failed" if no file succeeded).
+        Returns {"status", "batch_id", "batch_ids", "files": [per-file result], "timings": {...}, "metrics": {...}}.
+        batch_ids also lists batches that duplicate files were linked to and, with incremental, the
+        batches still holding unchanged chunks of re-ingested documents, so a recon can be scoped
+        to the whole submission.
+        progress, if given, is called as progress(filename, stage, **info) as each file moves through
+        hashing / uploading / parsing (info: chunks parsed so far) / persisted, with info file_index
+        (the file's position in files, since names may repeat), and with filename None for the
+        batch-level syncing / synced stages (see app.jobs). "files" is in the order of files.
+        """
+        files = [tuple(f) if len(f) == 3 else (*f, None) for f in files]
+        doc_keys = [f[2] for f in files if f[2] is not None]
+        if len(doc_keys) != len(set(doc_keys)):
+            raise ValueError("a doc_key may appear only once per batch")
+        batch_id = self._generate_batch_id()
+        with metrics.trace("ingest_batch", use_case=use_case, batch_id=batch_id) as tr:
+            result = self._ingest_batch(use_case, kb_id, batch_id, files, uploader, wait_build, timeout, max_workers, sink_concurrency, dedup, structured_options, incremental, progress)
+        result["metrics"] = tr.summary()
+        return result
+
+    def _ingest_batch(self, use_case: str, kb_id: str, batch_id: str, files: list, uploader: str, wait_build, timeout, max_workers, sink_concurrency, dedup, structured_options, incremental, progress):
+        start = time.time()
+
+        def run(index, source, filename, doc_key):
+            t0 = time.time()
+            file_progress = (lambda name, stage, **info: progress(name, stage, file_index=index, **info)) if progress else None
+            try:
+                res = self._ingest_file(use_case, batch_id, source, filename, uploader, sink_concurrency, dedup, structured_options,
+                                        incremental and doc_key is not None, doc_key, progress=file_progress)
+            except Exception as e:
+                res = {"status": "error", "batch_id": batch_id, "error": str(e), "num_chunks": 0, "failed_chunks": []}
+            res["filename"] = filename
+            res["elapsed_s"] = round(time.time() - t0, 3)
+            return res
+
+        with ThreadPoolExecutor(max_workers=max_workers or min(INGEST_FILE_CONCURRENCY, max(len(files), 1))) as pool:
+            # each file runs in a copy of this context, so its spans and counters land on the batch trace
+            futures = [pool.submit(contextvars.copy_context().run, run, i, *f) for i, f in enumerate(files)]
+            results = [fut.result() for fut in futures]
+        ingest_s = time.time() - start
+
+        sync_wait_s = 0.0
+        new_files = [r for r in results if r["status"] == "ingested"]
+        if new_files:
+            ticket = request_sync(kb_id)
+            if progress:
+                progress(None, "syncing")
+            if wait_build:
+                t0 = time.time()
+                with metrics.span("kb_sync_wait"):
+                    ticket.wait(timeout)
+                sync_wait_s = time.time() - t0
+                if progress:
+                    progress(None, "synced")
+
+        linked = {r["batch_id"] for r in results if r["status"] == "duplicate"}
+        linked.update(b for r in results for b in r.get("batch_ids", ()))
+        batch_ids = [batch_id] + sorted(linked - {batch_id})
+        return {
+            "status": self._batch_status(results),
+            "batch_id": batch_id,
+            "batch_ids": batch_ids,
+            "num_chunks": sum(r["num_chunks"] for r in results),
+            "files": results,
+            "timings": {"ingest_s": round(ingest_s, 3), "sync_wait_s": round(sync_wait_s, 3), "total_s": round(time.time() - start, 3)}
+        }
+
+    def _ingest_file(self, use_case: str, batch_id: str, source, filename: str, uploader: str, sink_concurrency: int = None, dedup=True, structured_options: dict = None, incremental=False, doc_key: str = None, progress=None):
+        """
+        Upload, parse and persist one file into batch_id without touching the KB build.
+        Chunk ids are derived from the document key and each chunk's position and text. With incremental,
+        doc_key (required) names the document: a new version of it only writes new or changed chunks and
+        deletes the ones that disappeared; unchanged chunks stay in the batch they were written in.
+        Without it the key is scoped to batch_id, so nothing earlier is ever overwritten or deleted.
+        """
+        if incremental and not doc_key:
+            raise ValueError("incremental ingest needs an explicit doc_key")
+        report = (lambda stage, **info: progress(filename, stage, **info)) if progress else (lambda stage, **info: None)
+        report("hashing")
+        metrics.count("files")
+        with metrics.span("hash"):
+            sha256 = compute_sha256(source)
+        if dedup:
+            with metrics.span("dedup_lookup"):
+                existing = self.dyn.find_file_by_sha256(use_case, sha256)
+                current = existing and self._is_current_version(use_case, existing)
+            if current:
+                metrics.count("files_duplicate")
+                return self._link_duplicate(use_case, existing, filename, uploader)
+
+        report("uploading")
+        with metrics.span("upload"):
+            file_and_meta = upload_file_with_metadata(S3_BUCKET, use_case, batch_id, source, filename, uploader, sha256=sha256)
+        file_id = uuid.uuid4().hex
+        # the manifest is read, diffed and rewritten under the document's lock
+        with document_lock(use_case, doc_key) if incremental else nullcontext():
+            if incremental:
+                with metrics.span("manifest_load"):
+                    diff = ChunkDiff(S3_BUCKET, use_case, doc_key).load()
+            else:
+                # Ids stay deterministic but are scoped to this batch, so a plain re-ingest never overwrites older items
+                diff = None
+                doc_key = f"{batch_id}/{document_key(use_case, filename)}"
+
+            sink = ChunkSink(S3_BUCKET, use_case, batch_id, self.dyn, max_workers=sink_concurrency, pack_bytes=KB_PACK_TARGET_BYTES)
+            # Parsers come from the registry (imported on first use) and stream straight into the sink
+            parser = get_parser(filename, getattr(source, "type", None))
+            with open_source(source) as f:
+                ctx = ParseContext(f, filename, file_and_meta["s3_uri"], file_and_meta["key"], S3_BUCKET, use_case, batch_id, structured_options or {})
+                report("parsing", chunks=0)
+                # "parse" is the time spent producing chunks (Textract waits included), "parse_persist"
+                # the whole streamed pipeline; the difference is time spent persisting
+                chunks = assign_chunk_ids(self._counted(metrics.timed(parser(ctx), "parse"), report), diff.doc_key if diff else doc_key)
+                rows = None
+                if filename.lower().endswith(STRUCTURED_EXTENSIONS) and STRUCTURED_ROWS_CACHE_MAX_ROWS > 0:
+                    from app.recon_rules import RowsFrameBuilder
+                    rows = RowsFrameBuilder(STRUCTURED_ROWS_CACHE_MAX_ROWS)
+                    chunks = rows.tee(chunks)
+                if diff:
+                    chunks = diff.filter(chunks)
+                if ctx.post_process:
+                    chunks = ctx.post_process(chunks)
+                with metrics.span("parse_persist"):
+                    sink_result = sink.write(chunks)
+            failed = sink_result["failed"] + ctx.failed
+            num_chunks = sink_result["written"] + len(failed)
+            unchanged = removed = 0
+            batch_ids = [batch_id]
+            if diff:
+                with metrics.span("manifest_save"):
+                    prefixes = ctx.prefixes if sink.packer else ctx.prefixes + ["kb_chunks"]
+                    manifest = diff.save(batch_id, sha256, [f["chunk_id"] for f in failed], prefixes, sink_result["documents"])
+                with metrics.span("delete_removed"):
+                    deleted = diff.delete_removed(self.dyn)
+                failed.extend(deleted["failed"])
+                unchanged, removed = diff.unchanged(), deleted["removed"]
+                num_chunks += unchanged
+                batch_ids = sorted(set(manifest.values()) | {batch_id})
+
+        frame = rows.frame() if rows is not None and not failed else None
+        if frame is not None:
+            self.rows_cache.put(self._rows_key(use_case, sha256, diff.doc_key if diff else doc_key), frame)
+
+        # Record the file only once its chunks are persisted, so the dedup lookup never
+        # matches a partial ingest.
+        meta = {
+            "uploaded_by": uploader,
+            "filename": filename,
+            "num_chunks": num_chunks,
+            "complete": not failed
+        }
+        if diff:
+            meta["doc_key"] = diff.doc_key
+        self.dyn.put_file(use_case, file_id, file_and_meta["s3_uri"], sha256, batch_id, meta)
+        metrics.count("chunks_written", sink_result["written"])
+        metrics.count("chunks_failed", len(failed))
+        metrics.count("chunks_unchanged", unchanged)
+        metrics.count("chunks_removed", removed)
+        report("persisted", chunks=num_chunks)
+        changed = sink_result["written"] > 0 or removed > 0 or bool(failed)
+        return {
+            "status": "ingested" if changed else "unchanged",
+            "batch_id": batch_id,
+            "batch_ids": batch_ids,
+            "file_id": file_id,
+            "num_chunks": num_chunks,
+            "added": sink_result["written"],
+            "unchanged": unchanged,
+            "removed": removed,
+            "failed_chunks": failed
+        }
+
+    @staticmethod
+    def _batch_status(results: list) -> str:
+        """
+        "failed" when every file errored, "partial" when some did or some chunks were not persisted,
+        otherwise "uploaded_and_indexed" (new content) or "no_new_content".
+        """
+        errors = sum(r["status"] == "error" for r in results)
+        if results and errors == len(results):
+            return "failed"
+        if errors or any(r.get("failed_chunks") for r in results):
+            return "partial"
+        return "uploaded_and_indexed" if any(r["status"] == "ingested" for r in results) else "no_new_content"
+
+    @staticmethod
+    def _rows_key(use_case: str, sha256: str, doc_key: str) -> str:
+        return json.dumps([use_case, sha256, doc_key])
+
+    @staticmethod
+    def _counted(chunks, report, every: int = INGEST_PROGRESS_EVERY):
+        n = 0
+        for ch in chunks:
+            yield ch
+            n += 1
+            if n % every == 0:
+                report("parsing", chunks=n)
+
+    def _is_current_version(self, use_case: str, existing: dict) -> bool:
+        """
+        A file ingested incrementally is only a valid dedup target while it is still the current
+        version of its document; once a newer version replaced its chunks, re-uploading it is a change.
+        """
+        doc_key = existing["meta"].get("doc_key")
+        if not doc_key:
+            return True
+        current = ChunkDiff(S3_BUCKET, use_case, doc_key).load().sha256
+        return current is None or current == existing["sha256"]
+
+    def _link_duplicate(self, use_case: str, existing: dict, filename: str, uploader: str):
         file_id = uuid.uuid4().hex
-        self.dyn.put_file(use_case, file_id, file_and_meta["s3_uri"], file_and_meta["sha256"], file_and_meta["batch_id"], {"uploaded_by": uploader, "filename": filename})
-
-        s3_uri = file_and_meta["s3_uri"]
-        lower = filename.lower()
-        chunk_objs = []
-
-        if lower.endswith(".pdf") or lower.endswith(".png") or lower.endswith(".jpg") or lower.endswith(".jpeg"):
-            job_id = start_async_analysis_s3(S3_BUCKET, file_and_meta["key"])
-            tex_resp = get_async_analysis_result(job_id)
-            chunks = extract_chunks_from_textract_response(tex_resp, s3_uri)
-            chunk_objs.extend(chunks)
-        elif lower.endswith(".pptx"):
-            chunks = extract_chunks_from_pptx(local_path, s3_uri)
-            chunk_objs.extend(chunks)
-        elif lower.endswith(".xls") or lower.endswith(".xlsx") or lower.endswith(".csv"):
-            uploaded_rows = excel_to_row_chunks(local_path, S3_BUCKET, use_case, batch_id, upload_rows=True)
-            chunk_objs.extend(uploaded_rows)
-        else:
-            with open(local_path, "rb") as f:
-                b = f.read()
-            tx = detect_text_bytes(b)
-            for block in tx.get("Blocks", []):
-                if block.get("BlockType") == "LINE":
-                    chunk_objs.append({"chunk_id": uuid.uuid4().hex, "text": block.get("Text"), "metadata": {"doc_uri": s3_uri}})
-
-        s3 = boto3.client("s3", region_name=os.environ.get("AWS_REGION", "us-east-1"))
-        for ch in chunk_objs:
-            ch.setdefault("metadata", {})["batch_id"] = batch_id
-            key = f"usecase/{use_case}/kb_chunks/{batch_id}/{ch['chunk_id']}.json"
-            s3.put_object(Bucket=S3_BUCKET, Key=key, Body=json.dumps(ch).encode("utf-8"))
-            self.dyn.put_chunk(use_case, ch["chunk_id"], ch)
-
-        sync_resp = sync_kb(kb_id)
-
-        if wait_build:
-            start = time.time()
-            while True:
-                status_resp = get_sync_status(kb_id)
-                status = status_resp.get("status") or status_resp.get("buildStatus")
-                if status in ("COMPLETE", "SUCCEEDED"):
-                    break
-                if status in ("FAILED", "ERROR"):
-                    raise RuntimeError(f"KB build failed: {status_resp}")
-                if time.time() - start > timeout:
-                    raise TimeoutError("Timed out waiting for KB build")
-                time.sleep(poll_interval)
-
-        return {"status": "uploaded_and_indexed", "batch_id": batch_id, "num_chunks": len(chunk_objs)}
-
-    def query_kb_and_reconcile(self, use_case: str, kb_id: str, user_query: str, batch_id: str = None, global_template: str = None, usecase_template: str = None):
+        num_chunks = existing["meta"].get("num_chunks", 0)
+        original_id = existing["meta"].get("duplicate_of") or existing["file_id"]
+        self.dyn.put_file(use_case, file_id, existing["s3_uri"], existing["sha256"], existing["batch_id"], {
+            "uploaded_by": uploader,
+            "filename": filename,
+            "num_chunks": num_chunks,
+            "duplicate_of": original_id,
+            "complete": True
+        })
+        return {"status": "duplicate", "batch_id": existing["batch_id"], "num_chunks": int(num_chunks), "duplicate_of": original_id, "failed_chunks": []}
+
+    def query_kb_and_reconcile(self, use_case: str, kb_id: str, user_query: str, batch_id=None, global_template: str = None, usecase_template: str = None, use_cache=True):
+        """
+        batch_id is a single batch id or a list of them (e.g. ingest_batch's batch_ids).
+        With use_cache, an identical query (use case, prompt, filters, model) against the same completed KB build
+        returns the earlier recon ({"cached": True}) without calling Bedrock or writing a new record.
+        The result's "metrics" is this call's stage breakdown; the stored record keeps the breakdown
+        up to the point it was written.
+        """
+        with metrics.trace("recon", use_case=use_case, kb_id=kb_id) as tr:
+            prompt = self._compose_prompt(user_query, global_template, usecase_template)
+            filters = self._batch_filter(batch_id)
+            with metrics.span("cache_lookup"):
+                cache_key, cached = self._cached_recon(use_case, kb_id, prompt, filters, use_cache)
+            if cached is not None:
+                result = dict(cached, cached=True)
+            else:
+                with metrics.span("generate"):
+                    resp = self.kb.retrieve_and_generate(kb_id, prompt, model_arn=CLAUDE_MODEL_ARN, retrieval_filters=filters)
+                result = self._save_recon(use_case, kb_id, batch_id, prompt, resp, cache_key)
+        return dict(result, metrics=tr.summary())
+
+    def query_kb_and_reconcile_stream(self, use_case: str, kb_id: str, user_query: str, batch_id=None, global_template: str = None, usecase_template: str = None, use_cache=True):
+        """
+        Streaming variant of query_kb_and_reconcile. Yields {"type": "text", "text": delta} and
+        {"type": "citation", "citation": {...}} events as Bedrock produces them, then, once the stream
+        has closed and the assembled record is persisted, {"type": "done", "result": {"recon_id", "record"}}.
+        The record's timings hold ttft_s (time to the first text delta) and total_s. A cache hit is
+        replayed as a single text event plus its citations.
+        """
+        # the trace lives across yields, so it must not be set in the caller's context between events
+        return metrics.isolated(self._recon_stream(use_case, kb_id, user_query, batch_id, global_template, usecase_template, use_cache))
+
+    def _recon_stream(self, use_case: str, kb_id: str, user_query: str, batch_id, global_template: str, usecase_template: str, use_cache):
+        t0 = time.time()
+        with metrics.trace("recon_stream", use_case=use_case, kb_id=kb_id) as tr:
+            prompt = self._compose_prompt(user_query, global_template, usecase_template)
+            filters = self._batch_filter(batch_id)
+            with metrics.span("cache_lookup"):
+                cache_key, cached = self._cached_recon(use_case, kb_id, prompt, filters, use_cache)
+            if cached is not None:
+                resp = cached["record"].get("bedrock_raw_response") or {}
+                yield {"type": "text", "text": (resp.get("output") or {}).get("text", "")}
+                for citation in resp.get("citations", []):
+                    yield {"type": "citation", "citation": citation}
+                yield {"type": "done", "result": dict(cached, cached=True, metrics=tr.summary())}
+                return
+
+            text, citations, ttft = [], [], None
+            for event in metrics.timed(self.kb.retrieve_and_generate_stream(kb_id, prompt, model_arn=CLAUDE_MODEL_ARN, retrieval_filters=filters), "generate"):
+                if event["type"] == "text":
+                    if ttft is None:
+                        ttft = time.time() - t0
+                        tr.add_span("first_token", ttft)
+                    text.append(event["text"])
+                else:
+                    citations.append(event["citation"])
+                yield event
+
+            resp = {"output": {"text": "".join(text)}, "citations": citations}
+            timings = {"ttft_s": round(ttft, 3) if ttft is not None else None, "total_s": round(time.time() - t0, 3)}
+            result = self._save_recon(use_case, kb_id, batch_id, prompt, resp, cache_key, timings=timings)
+        yield {"type": "done", "result": dict(result, metrics=tr.summary())}
+
+    @staticmethod
+    def _compose_prompt(user_query: str, global_template: str = None, usecase_template: str = None) -> str:
         prompt = ""
         if global_template:
             prompt += global_template + "\n\n"
         if usecase_template:
             prompt += usecase_template + "\n\n"
         prompt += "User Query:\n" + user_query
+        return prompt
 
-        filters = None
-        if batch_id:
-            filters = {"equals": {"key": "batch_id", "value": batch_id}}
+    def _cached_recon(self, use_case: str, kb_id: str, prompt: str, filters, use_cache=True):
+        """
+        (cache_key, cached result or None). cache_key is None when caching is off or the KB has no completed build.
+        Entries are scoped to the use case: a hit is always a recon already stored for this use case.
+        """
+        if not use_cache:
+            return None, None
+        build_id = build_version(get_sync_status(kb_id))
+        if not build_id:
+            return None, None
+        cache_key = make_key(use_case, prompt, filters, CLAUDE_MODEL_ARN, f"{kb_id}:{build_id}")
+        cached = self.recon_cache.get(cache_key)
+        if cached is not None and cached.get("record", {}).get("use_case") != use_case:
+            cached = None
+        return cache_key, cached
 
-        resp = self.kb.retrieve_and_generate(kb_id, prompt, model_arn=CLAUDE_MODEL_ARN, retrieval_filters=filters)
+    def _save_recon(self, use_case: str, kb_id: str, batch_id, prompt: str, resp, cache_key: str = None, **extra):
         recon_id = uuid.uuid4().hex
         record = {
             "recon_id": recon_id,
@@ -102,58 +407,161 @@ class Orchestrator:
             "prompt": prompt,
             "llm_model": CLAUDE_MODEL_ARN,
             "bedrock_raw_response": resp,
+            **extra
         }
+        record["references"] = expand_references(self._references(resp))
+        if metrics.current():
+            record["metrics"] = metrics.current().summary()
+        with metrics.span("persist"):
+            self.dyn.put_recon_result(use_case, recon_id, record)
+        result = {"recon_id": recon_id, "record": record}
+        if cache_key:
+            self.recon_cache.put(cache_key, result)
+        return result
+
+    @staticmethod
+    def _batch_ids(batch_id) -> list:
+        return [batch_id] if isinstance(batch_id, str) else list(batch_id or [])
+
+    def _batch_filter(self, batch_id):
+        batch_ids = self._batch_ids(batch_id)
+        if len(batch_ids) == 1:
+            return {"equals": {"key": "batch_id", "value": batch_ids[0]}}
+        if batch_ids:
+            return {"in": {"key": "batch_id", "value": batch_ids}}
+        return None
+
+    @staticmethod
+    def _references(resp) -> list:
+        """
+        References of a generation: its retrievedItems, or the retrievedReferences of its citations
+        (the shape the streaming API produces). Cited passages are kept as "content" so references to
+        packed KB documents can be expanded to the chunks they cover (see kb_packer.expand_references).
+        """
+        if not isinstance(resp, dict):
+            return []
         refs = []
-        for item in resp.get("retrievedItems", []) if isinstance(resp, dict) else []:
+        for item in resp.get("retrievedItems", []):
             metadata = item.get("documentMetadata") or item.get("metadata") or {}
             refs.append({"kb_chunk_id": item.get("documentId") or item.get("id"), "metadata": metadata})
-        record["references"] = refs
-        self.dyn.put_recon_result(use_case, recon_id, record)
-        return {"recon_id": recon_id, "record": record}
+        seen = set()
+        for citation in resp.get("citations", []):
+            for item in citation.get("retrievedReferences", []):
+                metadata = item.get("metadata") or {}
+                doc_id = metadata.get("chunk_id") or ((item.get("location") or {}).get("s3Location") or {}).get("uri")
+                content = (item.get("content") or {}).get("text")
+                if (doc_id, content) in seen:
+                    continue
+                seen.add((doc_id, content))
+                refs.append({"kb_chunk_id": doc_id, "metadata": metadata, "content": content})
+        return refs
+
+    def load_structured_rows(self, use_case: str, batch_id) -> dict:
+        """
+        {filename: DataFrame} of the spreadsheet/CSV rows ingested in batch_id (str or list), with the
+        same chunk ids ingest produced. Rows kept from the ingest (or an earlier recon) of the same
+        content are reused; other files are re-read from the uploaded sources.
+        """
+        from app.structured_adapter import iter_row_chunks
+        from app.recon_rules import rows_frame
+        s3 = get_client("s3")
+        frames, seen = {}, set()
+        # originals before duplicates, so the recorded doc_key is the one the chunk ids were derived from
+        files = sorted(self.dyn.list_files(use_case, self._batch_ids(batch_id)), key=lambda it: bool(it["meta"].get("duplicate_of")))
+        for item in files:
+            filename = item["meta"].get("filename", "")
+            if item["s3_uri"] in seen or not filename.lower().endswith(STRUCTURED_EXTENSIONS):
+                continue
+            seen.add(item["s3_uri"])
+            doc_key = item["meta"].get("doc_key") or f"{item['batch_id']}/{document_key(use_case, filename)}"
+            cache_key = self._rows_key(use_case, item["sha256"], doc_key)
+            frame = self.rows_cache.get(cache_key)
+            if frame is None:
+                metrics.count("rows_cache_misses")
+                bucket, key = split_s3_uri(item["s3_uri"])
+                body = io.BytesIO(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+                rows = iter_row_chunks(body, bucket, use_case, item["batch_id"], file_name=filename, doc_uri=item["s3_uri"])
+                frame = rows_frame(assign_chunk_ids(rows, doc_key))
+                self.rows_cache.put(cache_key, frame)
+            else:
+                metrics.count("rows_cache_hits")
+            frames[filename] = frame
+        return frames
 
-    def list_recons(self, use_case: str, limit=10):
+    def reconcile_structured(self, use_case: str, kb_id: str, batch_id, rules: dict = None, user_query: str = None, global_template: str = None, usecase_template: str = None, explain=True):
         """
-        Return latest N recon results for replay mode.
+        Deterministic fast path: apply the use case's declarative rules (recon_rules; loaded from
+        RECON_RULES_DIR when not given) to the structured rows of batch_id with vectorised joins.
+        Only the residual exceptions (at most RECON_LLM_MAX_EXCEPTIONS) go to retrieve_and_generate,
+        and only when explain is set and there are any. The record (engine "rules") is stored through
+        put_recon_result, with one reference per exception row, so replay shows it like any recon.
         """
-        table = self.dyn.table_recon
-        resp = table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key("use_case").eq(use_case),
-            Limit=limit,
-            ScanIndexForward=False
-        )
-        return resp.get("Items", [])
+        from app.recon_rules import load_rules, select_side, reconcile_frames, exception_references
+        rules = rules or load_rules(use_case)
+        if not rules:
+            raise ValueError(f"No reconciliation rules for use case {use_case}")
+
+        with metrics.trace("recon_rules", use_case=use_case, kb_id=kb_id) as tr:
+            with metrics.span("load_rows"):
+                frames = self.load_structured_rows(use_case, batch_id)
+            with metrics.span("rules"):
+                result = reconcile_frames(select_side(frames, rules["left"]), select_side(frames, rules["right"]), rules, RECON_RULES_MAX_EXCEPTIONS)
+            recon_id = uuid.uuid4().hex
+            record = {
+                "recon_id": recon_id,
+                "use_case": use_case,
+                "kb_id": kb_id,
+                "batch_id": batch_id,
+                "engine": "rules",
+                "rules": rules,
+                "summary": result["summary"],
+                "exceptions": result["exceptions"],
+                "references": exception_references(result["exceptions"]),
+            }
+
+            residual = result["exceptions"][:RECON_LLM_MAX_EXCEPTIONS]
+            if explain and kb_id and residual:
+                instruction = ("A deterministic reconciliation already matched the structured rows. Explain the likely cause of each "
+                               "remaining exception below, citing the source documents:\n" + json.dumps(residual, default=str))
+                query = f"{user_query}\n\n{instruction}" if user_query else instruction
+                prompt = self._compose_prompt(query, global_template, usecase_template)
+                with metrics.span("generate"):
+                    resp = self.kb.retrieve_and_generate(kb_id, prompt, model_arn=CLAUDE_MODEL_ARN, retrieval_filters=self._batch_filter(batch_id))
+                record.update({"prompt": prompt, "llm_model": CLAUDE_MODEL_ARN, "bedrock_raw_response": resp})
+                record["references"] += expand_references(self._references(resp))
+
+            record["metrics"] = tr.summary()
+            with metrics.span("persist"):
+                self.dyn.put_recon_result(use_case, recon_id, record)
+        return {"recon_id": recon_id, "record": record, "metrics": tr.summary()}
 
-    def fetch_reference_snippet(self, ref: dict):
+    def list_recons(self, use_case: str, limit=10, cursor: str = None):
         """
-        Given a reference metadata, fetch relevant snippet from S3.
-        For Excel rows: download and show row values.
-        For PDF page/table references: return metadata stub.
+        Generator over recon summaries for replay mode (newest first), without payloads.
+        Yields at most limit items (None: all), fetched a page at a time; resume with the
+        "cursor" of the last item seen. Load a payload with load_recon when it is expanded.
+        """
+        items = self.dyn.iter_recons(use_case, page_size=limit or 25, cursor=cursor)
+        return islice(items, limit) if limit else items
+
+    def load_recon(self, use_case: str, item: dict) -> dict:
+        """
+        Full recon payload for a summary item from list_recons (S3 for offloaded payloads).
+        """
+        return self.dyn.get_recon_payload(use_case, item)
+
+    def fetch_reference_snippet(self, ref: dict, use_case: str = None):
+        """
+        Given a reference, return its snippet through the snippet index: a point lookup of the chunk's
+        compact record (row values for spreadsheet rows), falling back to the cached parsed source.
+        For PDF page/table references without an index record: return metadata stub.
         """
         meta = ref.get("metadata", {})
-        s3_uri = meta.get("doc_uri")
-        if not s3_uri:
+        if not meta.get("doc_uri") and not ref.get("kb_chunk_id"):
             return "No doc_uri in metadata"
-
-        bucket, key = s3_uri.replace("s3://", "").split("/", 1)
-        s3 = boto3.client("s3")
-        obj = s3.get_object(Bucket=bucket, Key=key)
-        if key.endswith(".xlsx") or key.endswith(".xls"):
-            import pandas as pd
-            import io
-            df = pd.read_excel(io.BytesIO(obj["Body"].read()), sheet_name=None)
-            sheet = meta.get("sheet")
-            row = meta.get("row")
-            if sheet in df and row is not None:
-                if row in df[sheet].index:
-                    return df[sheet].loc[row].to_dict()
-        elif key.endswith(".csv"):
-            import pandas as pd
-            import io
-            df = pd.read_csv(io.BytesIO(obj["Body"].read()))
-            row = meta.get("row")
-            if row is not None and row < len(df):
-                return df.iloc[row].to_dict()
-        else:
-            # For unstructured, return metadata (page, table, row, col)
+        snippet = self.snippets.resolve(ref, use_case)
+        if snippet is not None:
+            return snippet
+        if meta.get("doc_uri") and not meta["doc_uri"].lower().endswith((".xlsx", ".xls", ".csv")):
             return f"Reference snippet metadata: {meta}"
         return "Snippet not found"
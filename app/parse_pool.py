@@ -0,0 +1,143 @@
+# app/parse_pool.py
+"""
+Process-pool parse executor. CPU-bound extraction (python-pptx traversal, spreadsheet row
+serialisation) is split into shards -- slide ranges of a deck, sheets of a workbook -- that run
+in worker processes; shard results come back as ChunkBatches and are yielded in shard order,
+so the chunk stream is the same as the single-process parsers produce.
+
+PARSE_WORKERS=0 (the default) or 1 keeps parsing in the calling process. Workers are started
+with PARSE_START_METHOD ("spawn" by default: the ingest path is multi-threaded, which fork is not safe with).
+"""
+import io
+import os
+import re
+import shutil
+import zipfile
+import tempfile
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", "0"))
+PARSE_START_METHOD = os.environ.get("PARSE_START_METHOD", "spawn")
+PARSE_PPTX_SHARD_SLIDES = int(os.environ.get("PARSE_PPTX_SHARD_SLIDES", "20"))
+
+_lock = threading.Lock()
+_pool = None
+_pool_workers = 0
+
+
+def get_executor(workers: int = None):
+    """
+    Shared process pool with workers processes (default PARSE_WORKERS), or None when parsing
+    should stay in-process. Asking for a different size replaces the pool.
+    """
+    global _pool, _pool_workers
+    workers = PARSE_WORKERS if workers is None else workers
+    if workers <= 1:
+        return None
+    with _lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(PARSE_START_METHOD))
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+@contextmanager
+def local_path(f, suffix: str = ""):
+    """
+    A filesystem path for a binary file object, so worker processes can open it themselves
+    instead of receiving a pickled copy of the content per shard. Spooled to a temp file
+    unless f is already a regular file.
+    """
+    raw = getattr(f, "raw", f)
+    if isinstance(raw, io.FileIO) and isinstance(raw.name, str):
+        yield raw.name
+        return
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            if f.seekable():
+                f.seek(0)
+            shutil.copyfileobj(f, out, 1024 * 1024)
+        yield path
+    finally:
+        os.remove(path)
+
+
+def count_slides(path) -> int:
+    # The slide list in presentation.xml, without loading the deck
+    with zipfile.ZipFile(path) as z:
+        return len(re.findall(rb"<p:sldId\b", z.read("ppt/presentation.xml")))
+
+
+def _ordered(futures):
+    try:
+        for fut in futures:
+            yield from fut.result()
+    finally:
+        for fut in futures:
+            fut.cancel()
+
+
+def pptx_chunks(f, s3_uri: str, workers: int = None, shard_slides: int = PARSE_PPTX_SHARD_SLIDES):
+    """
+    Chunks of a deck, sharded by slide range over the process pool.
+    """
+    from app.pptx_parser import extract_chunks_from_pptx
+    pool = get_executor(workers)
+    if pool is None:
+        yield from extract_chunks_from_pptx(f, s3_uri)
+        return
+    with local_path(f, ".pptx") as path:
+        n = count_slides(path)
+        if n <= shard_slides:
+            yield from extract_chunks_from_pptx(path, s3_uri)
+            return
+        futures = [
+            pool.submit(extract_chunks_from_pptx, path, s3_uri, range(start, min(start + shard_slides, n + 1)))
+            for start in range(1, n + 1, shard_slides)
+        ]
+        yield from _ordered(futures)
+
+
+def _sheet_chunks(path, bucket: str, use_case: str, batch_id: str, sheet: str, options: dict):
+    from app.chunks import ChunkBatch
+    from app.structured_adapter import iter_row_chunks
+    return ChunkBatch.from_chunks(iter_row_chunks(path, bucket, use_case, batch_id, sheets=[sheet], **options))
+
+
+def workbook_chunks(f, bucket: str, use_case: str, batch_id: str, workers: int = None, sheets=None, **options):
+    """
+    Row chunks of a spreadsheet, one shard per xlsx sheet over the process pool. CSV, legacy xls
+    and single-sheet workbooks are streamed in-process. options are iter_row_chunks options
+    (file_name, columns, dtypes, block_rows, doc_uri).
+    """
+    from app.structured_adapter import iter_row_chunks, _detect_format
+    pool = get_executor(workers)
+    if pool is None or _detect_format(f, options.get("file_name")) != "xlsx":
+        yield from iter_row_chunks(f, bucket, use_case, batch_id, sheets=sheets, **options)
+        return
+    from openpyxl import load_workbook
+    with local_path(f, ".xlsx") as path:
+        wb = load_workbook(path, read_only=True)
+        try:
+            names = [name for name in wb.sheetnames if sheets is None or name in sheets]
+        finally:
+            wb.close()
+        if len(names) <= 1:
+            yield from iter_row_chunks(path, bucket, use_case, batch_id, sheets=sheets, **options)
+            return
+        futures = [pool.submit(_sheet_chunks, path, bucket, use_case, batch_id, name, options) for name in names]
+        yield from _ordered(futures)
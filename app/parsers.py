@@ -0,0 +1,128 @@
+# app/parsers.py
+"""
+Parser registry. File extensions and MIME types map to parser targets, either callables or
+"module:function" strings that are imported only the first time a matching file is ingested,
+so pandas / python-pptx are never loaded by a process that does not need them.
+
+A parser takes a ParseContext and returns an iterable of chunk dicts ({chunk_id, text, metadata}).
+Chunk ids are replaced with deterministic ones by the orchestrator, so parsers need not make them stable.
+Third-party formats plug in the same way:
+
+    register_parser("mypkg.docx_parser:parse", extensions=[".docx"])
+
+or through the environment: RECON_EXTRA_PARSERS=".docx=mypkg.docx_parser:parse;.eml=mypkg.eml:parse"
+"""
+import os
+import uuid
+import importlib
+import mimetypes
+import threading
+from dataclasses import dataclass, field
+
+RECON_EXTRA_PARSERS = os.environ.get("RECON_EXTRA_PARSERS", "")
+
+
+@dataclass
+class ParseContext:
+    f: object  # binary file object positioned at the start of the source
+    filename: str
+    s3_uri: str
+    s3_key: str
+    bucket: str
+    use_case: str
+    batch_id: str
+    options: dict = field(default_factory=dict)
+    failed: list = field(default_factory=list)  # chunks dropped before the sink
+    # Applied to the parser output after chunk ids are assigned and unchanged chunks are filtered out,
+    # for side effects that should only happen for new chunks; prefixes lists extra S3 chunk prefixes written.
+    post_process: object = None
+    prefixes: list = field(default_factory=list)
+
+
+_lock = threading.Lock()
+_by_extension = {}
+_by_mime = {}
+_resolved = {}
+_default = "app.parsers:parse_text_fallback"
+
+
+def register_parser(target, extensions=(), mime_types=()):
+    """
+    Register target (callable or "module:function") for the given extensions (".pdf") and MIME types.
+    Later registrations override earlier ones.
+    """
+    with _lock:
+        for ext in extensions:
+            _by_extension[ext.lower() if ext.startswith(".") else f".{ext.lower()}"] = target
+        for mime in mime_types:
+            _by_mime[mime.lower()] = target
+
+
+def _resolve(target):
+    if callable(target):
+        return target
+    fn = _resolved.get(target)
+    if fn is None:
+        module_name, attr = target.split(":", 1)
+        fn = getattr(importlib.import_module(module_name), attr)
+        with _lock:
+            _resolved[target] = fn
+    return fn
+
+
+def get_parser(filename: str, mime_type: str = None):
+    """
+    Parser for a file: by extension first, then by MIME type (given or guessed), else the text fallback.
+    """
+    ext = os.path.splitext(filename.lower())[1]
+    target = _by_extension.get(ext)
+    if target is None:
+        mime = (mime_type or mimetypes.guess_type(filename)[0] or "").lower()
+        target = _by_mime.get(mime, _default)
+    return _resolve(target)
+
+
+def parse_textract_async(ctx: ParseContext):
+    from app.textract_processor import (start_async_analysis_s3, iter_analysis_pages, iter_blocks, iter_chunks_from_textract,
+                                        iter_segmented_chunks, pdf_page_count, TEXTRACT_SEGMENT_PAGES)
+    # Long PDFs are analysed as concurrent page-range jobs
+    if TEXTRACT_SEGMENT_PAGES and ctx.filename.lower().endswith(".pdf") and (pdf_page_count(ctx.f) or 0) > TEXTRACT_SEGMENT_PAGES:
+        return iter_segmented_chunks(ctx.f, ctx.bucket, ctx.s3_key, ctx.s3_uri)
+    job_id = start_async_analysis_s3(ctx.bucket, ctx.s3_key)
+    return iter_chunks_from_textract(iter_blocks(iter_analysis_pages(job_id)), ctx.s3_uri)
+
+
+def parse_pptx(ctx: ParseContext):
+    from app.parse_pool import pptx_chunks
+    return pptx_chunks(ctx.f, ctx.s3_uri)
+
+
+def parse_structured(ctx: ParseContext):
+    from app.structured_adapter import upload_row_chunks
+    from app.parse_pool import workbook_chunks
+    # Row JSONs are mirrored under structured_rows/ only for rows that are new in this version
+    ctx.post_process = lambda chunks: upload_row_chunks(chunks, ctx.bucket, ctx.use_case, ctx.batch_id, ctx.failed)
+    ctx.prefixes.append("structured_rows")
+    return workbook_chunks(ctx.f, ctx.bucket, ctx.use_case, ctx.batch_id, file_name=ctx.filename, doc_uri=ctx.s3_uri, **ctx.options)
+
+
+def parse_text_fallback(ctx: ParseContext):
+    from app.textract_processor import detect_text_bytes
+    tx = detect_text_bytes(ctx.f.read())
+    return [
+        {"chunk_id": uuid.uuid4().hex, "text": block.get("Text"), "metadata": {"doc_uri": ctx.s3_uri}}
+        for block in tx.get("Blocks", []) if block.get("BlockType") == "LINE"
+    ]
+
+
+register_parser("app.parsers:parse_textract_async", [".pdf", ".png", ".jpg", ".jpeg"], ["application/pdf", "image/png", "image/jpeg"])
+register_parser("app.parsers:parse_pptx", [".pptx"], ["application/vnd.openxmlformats-officedocument.presentationml.presentation"])
+register_parser("app.parsers:parse_structured", [".xls", ".xlsx", ".csv"], [
+    "application/vnd.ms-excel",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "text/csv",
+])
+
+for _spec in filter(None, (s.strip() for s in RECON_EXTRA_PARSERS.split(";"))):
+    _ext, _target = _spec.split("=", 1)
+    register_parser(_target.strip(), [_ext.strip()])
@@ -1,13 +1,23 @@
 # app/pptx_parser.py
 from pptx import Presentation
-import uuid
+from app.chunks import ChunkBatch
 
-def extract_chunks_from_pptx(path: str, s3_uri: str):
+def extract_chunks_from_pptx(path, s3_uri: str, slides: range = None):
+    """
+    path is a filesystem path or a binary file object.
+    slides optionally restricts extraction to a range of 1-based slide numbers (a shard of the deck);
+    slide numbers in the metadata stay absolute.
+    Returns a ChunkBatch (list-like; yields the usual chunk dicts).
+    """
     prs = Presentation(path)
-    chunks = []
+    chunks = ChunkBatch()
     slide_idx = 0
     for slide in prs.slides:
         slide_idx += 1
+        if slides is not None and slide_idx not in slides:
+            if slide_idx >= slides.stop:
+                break
+            continue
         # text from shapes
         text_blocks = []
         for shape in slide.shapes:
@@ -22,21 +32,10 @@ def extract_chunks_from_pptx(path: str, s3_uri: str):
                     for c, cell in enumerate(row.cells, start=1):
                         txt = cell.text.strip()
                         cells.append(txt)
-                        chunk_cell = {
-                            "chunk_id": uuid.uuid4().hex,
-                            "text": txt,
-                            "metadata": {"doc_uri": s3_uri, "slide": slide_idx, "table": True, "row": r, "col": c}
-                        }
-                        chunks.append(chunk_cell)
+                        chunks.append(txt, {"doc_uri": s3_uri, "slide": slide_idx, "table": True, "row": r, "col": c})
                     # add row-level chunk
-                    chunk_row = {
-                        "chunk_id": uuid.uuid4().hex,
-                        "text": " | ".join(cells),
-                        "metadata": {"doc_uri": s3_uri, "slide": slide_idx, "table": True, "row": r}
-                    }
-                    chunks.append(chunk_row)
+                    chunks.append(" | ".join(cells), {"doc_uri": s3_uri, "slide": slide_idx, "table": True, "row": r})
         # add slide-level text chunk
         if text_blocks:
-            chunk = {"chunk_id": uuid.uuid4().hex, "text": "\n".join(text_blocks), "metadata": {"doc_uri": s3_uri, "slide": slide_idx}}
-            chunks.append(chunk)
+            chunks.append("\n".join(text_blocks), {"doc_uri": s3_uri, "slide": slide_idx})
     return chunks
@@ -0,0 +1,206 @@
+# app/rate_limit.py
+"""
+Process-wide rate limiting and throttling-aware retries for AWS calls. Every client from the
+registry (app.aws_clients) is wrapped in a LimitedClient: each API call first takes a token from
+the token buckets configured for its service and operation, and a call rejected with a throttling
+or transient error (5xx, timeouts, dropped connections) is retried with full-jitter exponential
+backoff. This is the only retry layer -- the registry turns botocore's retries off. Buckets are
+shared by every thread, so concurrent ingestion paces itself against one quota instead of each
+path retrying on its own.
+
+AWS_RATE_LIMITS is a comma-separated list of name=rate[/burst] in calls per second, where name is
+a service or service.Operation; both apply when both are set. Services without a limit are not paced.
+
+    AWS_RATE_LIMITS="textract.StartDocumentAnalysis=2,textract.GetDocumentAnalysis=10,dynamodb=1000/200"
+
+Time spent waiting for tokens and backing off is counted on the active metrics trace
+(rate_wait_s.{service}, backoff_s.{service}, throttled.{service}, retried.{service}) and
+process-wide in stats().
+Managed transfers (upload_fileobj & co.), paginators and waiters are not wrapped: they are paced by
+their TransferConfig and cannot be replayed from a partially read stream, so a LimitedClient hands
+them to its passthrough client, which keeps botocore's own retries.
+"""
+import os
+import time
+import random
+import threading
+from functools import partial
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, ConnectionClosedError, ReadTimeoutError
+from app.metrics import count
+
+AWS_RATE_LIMITS = os.environ.get("AWS_RATE_LIMITS", "")
+AWS_THROTTLE_MAX_RETRIES = int(os.environ.get("AWS_THROTTLE_MAX_RETRIES", "5"))
+AWS_THROTTLE_BACKOFF_BASE = float(os.environ.get("AWS_THROTTLE_BACKOFF_BASE", "0.2"))
+AWS_THROTTLE_BACKOFF_MAX = float(os.environ.get("AWS_THROTTLE_BACKOFF_MAX", "20"))
+
+THROTTLING_CODES = {
+    "Throttling", "ThrottlingException", "ThrottledException", "RequestThrottledException", "TooManyRequestsException",
+    "ProvisionedThroughputExceededException", "RequestLimitExceeded", "SlowDown", "RequestThrottled",
+    "LimitExceededException",  # Textract: too many concurrent jobs
+}
+TRANSIENT_CODES = {
+    "RequestTimeout", "RequestTimeoutException", "InternalError", "InternalFailure", "InternalServerError",
+    "InternalServerException", "ServiceUnavailable", "ServiceUnavailableException",
+}
+TRANSIENT_STATUS = {500, 502, 503, 504}
+
+# Methods that are not single API calls (managed transfers, helpers) are passed through untouched
+NOT_WRAPPED = {
+    "upload_file", "upload_fileobj", "download_file", "download_fileobj", "copy",
+    "get_paginator", "get_waiter", "can_paginate", "generate_presigned_url", "generate_presigned_post", "close",
+}
+
+
+class TokenBucket:
+    """
+    rate tokens per second, up to burst banked. acquire() reserves a token and sleeps until it is
+    due, so waiters are served in arrival order without holding the lock while they sleep.
+    """
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n: float = 1.0) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+def parse_limits(spec: str) -> dict:
+    """{name: TokenBucket} from an AWS_RATE_LIMITS string."""
+    buckets = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        name, _, value = item.partition("=")
+        rate, _, burst = value.partition("/")
+        buckets[name.strip()] = TokenBucket(float(rate), float(burst) if burst else None)
+    return buckets
+
+
+_buckets = parse_limits(AWS_RATE_LIMITS)
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def set_limit(name: str, rate: float, burst: float = None):
+    """
+    Set (or with rate None remove) the limit of a service or service.Operation at runtime.
+    """
+    if rate is None:
+        _buckets.pop(name, None)
+    else:
+        _buckets[name] = TokenBucket(rate, burst)
+
+
+def _record(service: str, **values):
+    with _stats_lock:
+        s = _stats.setdefault(service, {"calls": 0, "rate_wait_s": 0.0, "throttled": 0, "retried": 0, "backoff_s": 0.0, "gave_up": 0})
+        for k, v in values.items():
+            s[k] += v
+    for k, v in values.items():
+        if k != "calls" and v:
+            count(f"{k}.{service}", v)
+
+
+def stats() -> dict:
+    """
+    Process-wide totals per service: calls, rate_wait_s, throttled, retried (transient errors),
+    backoff_s and gave_up (calls still failing after AWS_THROTTLE_MAX_RETRIES).
+    """
+    with _stats_lock:
+        return {service: dict(s) for service, s in _stats.items()}
+
+
+def is_throttling(e: Exception) -> bool:
+    return isinstance(e, ClientError) and e.response.get("Error", {}).get("Code") in THROTTLING_CODES
+
+
+def is_transient(e: Exception) -> bool:
+    if isinstance(e, (BotoConnectionError, ConnectionClosedError, ReadTimeoutError)):
+        return True
+    if not isinstance(e, ClientError):
+        return False
+    return (e.response.get("Error", {}).get("Code") in TRANSIENT_CODES
+            or e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") in TRANSIENT_STATUS)
+
+
+def call(service: str, operation: str, fn, *args, **kwargs):
+    """
+    fn(*args, **kwargs) as one paced API call of service/operation, retried on throttling and
+    transient errors.
+    """
+    attempt = 0
+    while True:
+        waited = 0.0
+        for name in (service, f"{service}.{operation}"):
+            bucket = _buckets.get(name)
+            if bucket is not None:
+                waited += bucket.acquire()
+        _record(service, calls=1, rate_wait_s=waited)
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if is_throttling(e):
+                kind = "throttled"
+            elif is_transient(e):
+                kind = "retried"
+            else:
+                raise
+            if attempt >= AWS_THROTTLE_MAX_RETRIES:
+                _record(service, gave_up=1, **{kind: 1})
+                raise
+            delay = random.uniform(0, min(AWS_THROTTLE_BACKOFF_MAX, AWS_THROTTLE_BACKOFF_BASE * 2 ** attempt))
+            _record(service, backoff_s=delay, **{kind: 1})
+            count("retries")
+            time.sleep(delay)
+            attempt += 1
+
+
+def _operation_name(method: str) -> str:
+    return "".join(part.capitalize() for part in method.split("_"))
+
+
+class LimitedClient:
+    """
+    Wraps a boto3 client (or a stand-in with the same methods) so its API methods go through call();
+    everything else (meta, exceptions) is passed through. Managed transfers, paginators and waiters
+    come from passthrough (default: the client itself), a client configured to retry on its own.
+    """
+    def __init__(self, client, service: str, passthrough=None):
+        self._client = client
+        self._service = service
+        self._passthrough = passthrough or client
+        meta = getattr(client, "meta", None)
+        self._api_names = getattr(meta, "method_to_api_mapping", None)
+
+    @property
+    def wrapped(self):
+        return self._client
+
+    def __getattr__(self, name: str):
+        if name in NOT_WRAPPED:
+            return getattr(self._passthrough, name)
+        attr = getattr(self._client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        if self._api_names is not None:
+            operation = self._api_names.get(name)
+            if operation is None:
+                return attr
+        else:
+            operation = _operation_name(name)
+        method = partial(call, self._service, operation, attr)
+        self.__dict__[name] = method
+        return method
+
+
+def limited(client, service: str, passthrough=None):
+    return client if isinstance(client, LimitedClient) else LimitedClient(client, service, passthrough)
@@ -0,0 +1,139 @@
+# app/recon_cache.py
+"""
+Recon result cache. Entries are keyed on a hash of the use case, composed prompt, retrieval filters,
+model ARN and the id of the last completed KB build, so any new sync invalidates them.
+Tier 1 is an in-process LRU with TTL; tier 2 (optional) is a DynamoDB table or a local directory.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from app.aws_clients import get_resource
+
+RECON_CACHE_MAX_ENTRIES = int(os.environ.get("RECON_CACHE_MAX_ENTRIES", "256"))
+RECON_CACHE_TTL_S = float(os.environ.get("RECON_CACHE_TTL_S", "3600"))
+RECON_CACHE_TABLE = os.environ.get("RECON_CACHE_TABLE")
+RECON_CACHE_DIR = os.environ.get("RECON_CACHE_DIR")
+
+BUILD_ID_KEYS = ("buildId", "knowledgeBaseBuildId", "ingestionJobId")
+BUILD_TIME_KEYS = ("completedAt", "endTime", "updatedAt")
+
+
+def build_version(status_resp: dict):
+    """
+    Identify a completed KB build from a get_sync_status response, or None if the KB
+    is not in a completed state (then results are not cached).
+    """
+    if not status_resp or (status_resp.get("status") or status_resp.get("buildStatus")) not in ("COMPLETE", "SUCCEEDED"):
+        return None
+    for k in BUILD_ID_KEYS + BUILD_TIME_KEYS:
+        if status_resp.get(k):
+            return str(status_resp[k])
+    return None
+
+
+def make_key(use_case: str, prompt: str, filters, model_arn: str, build_id: str) -> str:
+    raw = json.dumps({"use_case": use_case, "prompt": prompt, "filters": filters, "model": model_arn, "build": build_id}, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class DiskTier:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry["expires_at"] < time.time():
+            return None
+        return entry["value"]
+
+    def put(self, key: str, value, ttl: float):
+        tmp = self._path(key) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"expires_at": time.time() + ttl, "value": value}, f, default=str)
+        os.replace(tmp, self._path(key))
+
+
+class DynamoTier:
+    """
+    Table with partition key cache_key; expires_at can be enabled as the table's TTL attribute.
+    Values are stored as JSON strings, which sidesteps DynamoDB's float/Decimal restrictions.
+    """
+    def __init__(self, table):
+        self.table = table
+
+    def get(self, key: str):
+        item = self.table.get_item(Key={"cache_key": key}).get("Item")
+        if not item or int(item["expires_at"]) < time.time():
+            return None
+        return json.loads(item["value"])
+
+    def put(self, key: str, value, ttl: float):
+        self.table.put_item(Item={"cache_key": key, "value": json.dumps(value, default=str), "expires_at": int(time.time() + ttl)})
+
+
+class ReconCache:
+    def __init__(self, max_entries: int = RECON_CACHE_MAX_ENTRIES, ttl: float = RECON_CACHE_TTL_S, tier2=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.tier2 = tier2
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls):
+        tier2 = None
+        if RECON_CACHE_TABLE:
+            tier2 = DynamoTier(get_resource("dynamodb").Table(RECON_CACHE_TABLE))
+        elif RECON_CACHE_DIR:
+            tier2 = DiskTier(RECON_CACHE_DIR)
+        return cls(tier2=tier2)
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+        value = self.tier2.get(key) if self.tier2 else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._put_local(key, value)
+        return value
+
+    def put(self, key: str, value):
+        self._put_local(key, value)
+        if self.tier2:
+            self.tier2.put(key, value, self.ttl)
+
+    def discard(self, key: str):
+        """Drop an entry from the in-process tier."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _put_local(self, key: str, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
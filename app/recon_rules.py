@@ -0,0 +1,298 @@
+# app/recon_rules.py
+"""
+Deterministic reconciliation of structured rows. A use case declares its rules as JSON
+(RECON_RULES_DIR/{use_case}.json, or passed in directly):
+
+    {
+      "left":  {"file": "ledger*.xlsx", "sheet": "Payments", "key": ["txn_id"], "amount": "amount", "currency": "ccy"},
+      "right": {"file": "bank*.csv", "key": ["reference"], "amount": "value", "currency": "currency"},
+      "tolerance": 0.01,
+      "rel_tolerance": 0.0,
+      "normalise_keys": true,
+      "amount_format": {"decimal": ".", "thousands": ","},
+      "currency": {"base": "USD", "rates": {"EUR": 1.08, "GBP": 1.27}, "aliases": {"€": "EUR", "£": "GBP"}}
+    }
+
+Text amounts are read with the amount_format separators (a side may override it with its own
+"amount_format"); "(1,234.56)" and "1,234.56-" are negative. Text that still does not parse counts
+as an invalid amount and is logged.
+
+Both sides are built from the same row chunks the ingest path produces (one JSON object per
+sheet row), matched with one vectorised outer join on the key columns, and every row that does
+not reconcile becomes an exception carrying exact chunk/sheet/row references.
+Exception types: missing_key, duplicate_key, missing_in_left, missing_in_right, invalid_amount,
+unknown_currency, currency_mismatch, amount_mismatch.
+"""
+import io
+import os
+import re
+import json
+import logging
+from fnmatch import fnmatch
+import pandas as pd
+
+RECON_RULES_DIR = os.environ.get("RECON_RULES_DIR", "recon_rules")
+ROWS_FRAME_BATCH = int(os.environ.get("ROWS_FRAME_BATCH", "2048"))
+
+REF_COLUMNS = ("_chunk_id", "_doc_uri", "_sheet", "_row")
+AMOUNT_FORMAT = {"decimal": ".", "thousands": ","}
+
+logger = logging.getLogger("recon.rules")
+
+
+def load_rules(use_case: str):
+    """
+    Rules of a use case from RECON_RULES_DIR, or None if it has none.
+    """
+    path = os.path.join(RECON_RULES_DIR, f"{use_case}.json")
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def rows_frame(chunks) -> pd.DataFrame:
+    """
+    DataFrame of row chunks: the row JSON parsed column-wise, plus _chunk_id/_doc_uri/_sheet/_row.
+    """
+    texts, refs = [], []
+    for ch in chunks:
+        meta = ch.get("metadata", {})
+        texts.append(ch["text"])
+        refs.append((ch["chunk_id"], meta.get("doc_uri"), meta.get("sheet"), meta.get("row")))
+    if not texts:
+        return pd.DataFrame(columns=list(REF_COLUMNS))
+    df = pd.read_json(io.StringIO("\n".join(texts)), lines=True, dtype=False, convert_dates=False)
+    return pd.concat([df, pd.DataFrame(refs, columns=list(REF_COLUMNS))], axis=1)
+
+
+class RowsFrameBuilder:
+    """
+    Builds the rows_frame of a stream of row chunks while it flows past (tee): chunks are turned
+    into DataFrame parts every batch rows, so at most one batch of chunk dicts is buffered. A file
+    with more than max_rows rows is dropped; frame() then returns None.
+    """
+    def __init__(self, max_rows: int, batch: int = ROWS_FRAME_BATCH):
+        self.max_rows = max_rows
+        self.batch = batch
+        self.rows = 0
+        self._pending = []
+        self._parts = []
+
+    def tee(self, chunks):
+        for ch in chunks:
+            if self.rows <= self.max_rows:
+                self.rows += 1
+                meta = ch.get("metadata", {})
+                self._pending.append({"chunk_id": ch["chunk_id"], "text": ch["text"],
+                                      "metadata": {k: meta.get(k) for k in ("doc_uri", "sheet", "row")}})
+                if self.rows > self.max_rows:
+                    self._pending, self._parts = [], []
+                elif len(self._pending) >= self.batch:
+                    self._flush()
+            yield ch
+
+    def _flush(self):
+        if self._pending:
+            self._parts.append(rows_frame(self._pending))
+            self._pending = []
+
+    def frame(self):
+        if self.rows > self.max_rows:
+            return None
+        self._flush()
+        if len(self._parts) <= 1:
+            return self._parts[0] if self._parts else rows_frame([])
+        return pd.concat(self._parts, ignore_index=True)
+
+
+def select_side(frames: dict, side: dict) -> pd.DataFrame:
+    """
+    Rows of one side: frames is {filename: DataFrame}; side["file"] is a glob on the file name,
+    side["sheet"] an optional sheet name.
+    """
+    parts = [df for name, df in frames.items() if fnmatch(name, side["file"])]
+    if not parts:
+        return pd.DataFrame(columns=list(REF_COLUMNS))
+    df = pd.concat(parts, ignore_index=True)
+    if side.get("sheet") is not None:
+        df = df[df["_sheet"] == side["sheet"]]
+    return df.reset_index(drop=True)
+
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    if name not in df.columns:
+        return pd.Series(pd.NA, index=df.index, dtype="object")
+    return df[name]
+
+
+def _key_series(s: pd.Series, normalise: bool) -> pd.Series:
+    # 1001, 1001.0 and "1001" must meet in the join
+    if pd.api.types.is_numeric_dtype(s):
+        f = s.astype("Float64")
+        if ((f.dropna() % 1) == 0).all():
+            s = f.astype("Int64")
+    s = s.astype("string")
+    if normalise:
+        s = s.str.strip().str.upper()
+    return s.replace("", pd.NA)
+
+
+def _amount_series(s: pd.Series, decimal: str = ".", thousands: str = ",") -> pd.Series:
+    """
+    Amounts as float64. Numbers pass through; text is read with the given separators, with
+    parenthesised or trailing-minus values negative and currency symbols or spaces ignored.
+    Text that does not parse (e.g. "1-234") becomes NaN.
+    """
+    if pd.api.types.is_numeric_dtype(s):
+        return s.astype("float64")
+    is_text = s.map(type) == str
+    out = pd.to_numeric(s.where(~is_text), errors="coerce").astype("float64")
+    if not is_text.any():
+        return out
+    text = s[is_text].astype("string").str.strip()
+    negative = (text.str.match(r"^\(.*\)$") | text.str.endswith("-")).fillna(False)
+    text = text.str.replace(r"^\((.*)\)$", r"\1", regex=True).str.replace(r"-$", "", regex=True)
+    text = text.str.replace(f"[^0-9\\-{re.escape(decimal)}{re.escape(thousands or '')}]", "", regex=True)
+    if thousands:
+        text = text.str.replace(thousands, "", regex=False)
+    if decimal != ".":
+        text = text.str.replace(decimal, ".", regex=False)
+    values = pd.to_numeric(text, errors="coerce").astype("float64")
+    out[is_text] = values.where(~negative, -values)
+    return out
+
+
+def prepare_side(df: pd.DataFrame, side: dict, rules: dict) -> pd.DataFrame:
+    """
+    Normalised view of one side: k0..kN key columns, amount (in the base currency when rates are
+    configured), raw_amount, currency, rate and the row reference (chunk_id, doc_uri, sheet, row).
+    """
+    normalise = rules.get("normalise_keys", True)
+    out = pd.DataFrame({c[1:]: df[c] if c in df.columns else pd.NA for c in REF_COLUMNS}, index=df.index)
+    for i, k in enumerate(side["key"]):
+        out[f"k{i}"] = _key_series(_column(df, k), normalise)
+    fmt = {**AMOUNT_FORMAT, **(rules.get("amount_format") or {}), **(side.get("amount_format") or {})}
+    raw = _column(df, side["amount"])
+    out["raw_amount"] = _amount_series(raw, fmt["decimal"], fmt["thousands"])
+    unparsed = int((out["raw_amount"].isna() & raw.notna() & (raw.astype("string").str.strip() != "")).sum())
+    if unparsed:
+        logger.warning("%d value(s) of amount column %r could not be parsed (format %s)", unparsed, side["amount"], fmt)
+
+    ccy_rules = rules.get("currency") or {}
+    base = ccy_rules.get("base")
+    if side.get("currency"):
+        ccy = _column(df, side["currency"]).astype("string").str.strip()
+        ccy = ccy.replace(ccy_rules.get("aliases", {})).str.upper()
+        out["currency"] = ccy.fillna(base) if base else ccy
+    else:
+        out["currency"] = pd.Series(base, index=df.index, dtype="string")
+    rates = ccy_rules.get("rates")
+    if rates:
+        rate_map = dict(rates)
+        if base:
+            rate_map.setdefault(base, 1.0)
+        out["rate"] = out["currency"].map(rate_map).astype("float64")
+        out["amount"] = out["raw_amount"] * out["rate"]
+    else:
+        out["rate"] = 1.0
+        out["amount"] = out["raw_amount"]
+    return out
+
+
+def _ref(row: dict, prefix: str):
+    chunk_id = row.get(f"{prefix}_chunk_id")
+    if pd.isna(chunk_id):
+        return None
+    sheet, r = row.get(f"{prefix}_sheet"), row.get(f"{prefix}_row")
+    return {
+        "chunk_id": chunk_id,
+        "doc_uri": row.get(f"{prefix}_doc_uri"),
+        "sheet": None if pd.isna(sheet) else sheet,
+        "row": None if pd.isna(r) else int(r),
+    }
+
+
+def _num(v):
+    return None if pd.isna(v) else round(float(v), 6)
+
+
+def _exceptions(df: pd.DataFrame, kind: str, keys: list, max_items: int) -> list:
+    out = []
+    for row in df.head(max_items).to_dict("records"):
+        out.append({
+            "type": kind,
+            "key": {k: (None if pd.isna(row.get(f"k{i}")) else row.get(f"k{i}")) for i, k in enumerate(keys)},
+            "left": _ref(row, "l"),
+            "right": _ref(row, "r"),
+            "left_amount": _num(row.get("l_raw_amount")),
+            "right_amount": _num(row.get("r_raw_amount")),
+            "left_currency": None if pd.isna(row.get("l_currency")) else row.get("l_currency"),
+            "right_currency": None if pd.isna(row.get("r_currency")) else row.get("r_currency"),
+            "difference": _num(row.get("difference")),
+        })
+    return out
+
+
+def reconcile_frames(left: pd.DataFrame, right: pd.DataFrame, rules: dict, max_exceptions: int = 500) -> dict:
+    """
+    Reconcile two row frames under rules. Returns {"summary": {counts by outcome}, "exceptions": [...]};
+    at most max_exceptions exceptions per type are listed, the summary counts all of them.
+    """
+    keys = [f"k{i}" for i in range(len(rules["left"]["key"]))]
+    if len(rules["right"]["key"]) != len(keys):
+        raise ValueError("left and right must declare the same number of key columns")
+    lhs = prepare_side(left, rules["left"], rules).add_prefix("l_").rename(columns={f"l_{k}": k for k in keys})
+    rhs = prepare_side(right, rules["right"], rules).add_prefix("r_").rename(columns={f"r_{k}": k for k in keys})
+
+    groups = {}
+    l_nokey = lhs[keys].isna().any(axis=1)
+    r_nokey = rhs[keys].isna().any(axis=1)
+    l_dup = ~l_nokey & lhs.duplicated(keys, keep=False)
+    r_dup = ~r_nokey & rhs.duplicated(keys, keep=False)
+    groups["missing_key"] = pd.concat([lhs[l_nokey], rhs[r_nokey]], ignore_index=True)
+    groups["duplicate_key"] = pd.concat([lhs[l_dup], rhs[r_dup]], ignore_index=True)
+
+    merged = lhs[~l_nokey & ~l_dup].merge(rhs[~r_nokey & ~r_dup], on=keys, how="outer", indicator=True)
+    groups["missing_in_right"] = merged[merged["_merge"] == "left_only"]
+    groups["missing_in_left"] = merged[merged["_merge"] == "right_only"]
+
+    both = merged[merged["_merge"] == "both"].copy()
+    both["difference"] = both["l_amount"] - both["r_amount"]
+    tolerance = float(rules.get("tolerance", 0.0))
+    rel_tolerance = float(rules.get("rel_tolerance", 0.0))
+    allowed = (both["l_amount"].abs() * rel_tolerance).clip(lower=tolerance)
+
+    invalid = both["l_raw_amount"].isna() | both["r_raw_amount"].isna()
+    unknown_ccy = ~invalid & (both["l_rate"].isna() | both["r_rate"].isna())
+    ccy_mismatch = ~invalid & ~unknown_ccy & (both["l_currency"].fillna("") != both["r_currency"].fillna(""))
+    if (rules.get("currency") or {}).get("rates"):
+        # amounts were converted to the base currency, so differing currencies still compare
+        ccy_mismatch = pd.Series(False, index=both.index)
+    checked = ~invalid & ~unknown_ccy & ~ccy_mismatch
+    amount_mismatch = checked & (both["difference"].abs() > allowed + 1e-9)
+    groups["invalid_amount"] = both[invalid]
+    groups["unknown_currency"] = both[unknown_ccy]
+    groups["currency_mismatch"] = both[ccy_mismatch]
+    groups["amount_mismatch"] = both[amount_mismatch]
+
+    summary = {"left_rows": len(lhs), "right_rows": len(rhs), "matched": int((checked & ~amount_mismatch).sum())}
+    exceptions = []
+    for kind, df in groups.items():
+        summary[kind] = len(df)
+        exceptions.extend(_exceptions(df, kind, rules["left"]["key"], max_exceptions))
+    summary["exceptions"] = sum(summary[kind] for kind in groups)
+    return {"summary": summary, "exceptions": exceptions}
+
+
+def exception_references(exceptions: list) -> list:
+    """
+    Exception rows as recon references ({kb_chunk_id, metadata}), the shape replay resolves snippets for.
+    """
+    refs, seen = [], set()
+    for exc in exceptions:
+        for ref in (exc["left"], exc["right"]):
+            if ref and ref["chunk_id"] not in seen:
+                seen.add(ref["chunk_id"])
+                refs.append({"kb_chunk_id": ref["chunk_id"], "metadata": dict(ref)})
+    return refs
@@ -1,38 +1,98 @@
 # app/s3_ingest.py
 import os
-import boto3
 import hashlib
 import time
-from botocore.exceptions import ClientError
+from boto3.s3.transfer import TransferConfig
+from app.sources import open_source
+from app.aws_clients import get_client
+from app.metrics import count
 
-REGION = os.environ.get("AWS_REGION", "us-east-1")
-S3 = boto3.client("s3", region_name=REGION)
 SSE = "aws:kms"
 KMS_KEY_ID = os.environ.get("KMS_KEY_ID")
 
+MB = 1024 * 1024
+HASH_BLOCK_SIZE = MB
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=int(os.environ.get("S3_MULTIPART_THRESHOLD_MB", "16")) * MB,
+    multipart_chunksize=int(os.environ.get("S3_MULTIPART_CHUNKSIZE_MB", "16")) * MB,
+    max_concurrency=int(os.environ.get("S3_MULTIPART_CONCURRENCY", "8")),
+)
+
 
 def compute_sha256_bytes(b: bytes) -> str:
     return hashlib.sha256(b).hexdigest()
 
 
-def upload_file_with_metadata(bucket: str, use_case: str, batch_id: str, file_path: str, file_name: str, uploader: str):
+def compute_sha256(source, block_size: int = HASH_BLOCK_SIZE) -> str:
+    """
+    Hash a path, file object or buffer in fixed-size blocks, so memory use does not grow with file size.
+    """
+    h = hashlib.sha256()
+    size = 0
+    with open_source(source) as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+            size += len(block)
+    count("source_bytes", size)
+    return h.hexdigest()
+
+
+def compute_sha256_file(file_path: str, block_size: int = HASH_BLOCK_SIZE) -> str:
+    return compute_sha256(file_path, block_size)
+
+
+class _HashingReader:
+    """
+    Read-only wrapper that hashes a non-seekable stream as S3 consumes it.
+    """
+    def __init__(self, f):
+        self._f = f
+        self._h = hashlib.sha256()
+
+    def read(self, size=-1):
+        b = self._f.read(size)
+        self._h.update(b)
+        return b
+
+    def hexdigest(self) -> str:
+        return self._h.hexdigest()
+
+
+def sse_args() -> dict:
+    """
+    Server-side encryption arguments for every object holding customer data (originals and copies).
+    """
+    args = {"ServerSideEncryption": SSE}
+    if KMS_KEY_ID:
+        args["SSEKMSKeyId"] = KMS_KEY_ID
+    return args
+
+
+def upload_file_with_metadata(bucket: str, use_case: str, batch_id: str, source, file_name: str, uploader: str, sha256: str = None):
     """
     Uploads original file to S3 under usecase prefix with metadata including batch_id and sha256.
+    source is a path, binary file object or buffer; it is streamed through a (parallel) multipart
+    upload, so peak memory is bounded by TRANSFER_CONFIG rather than by the file size.
+    Pass sha256 if the caller already hashed the source (e.g. for the dedup lookup). A non-seekable
+    stream without sha256 is hashed while it uploads; its S3 object then carries no sha256 metadata.
     Returns dict with s3_uri, key, sha256, batch_id.
     """
     key = f"usecase/{use_case}/incoming/{batch_id}/{int(time.time())}-{file_name}"
-    extra_args = {"ServerSideEncryption": SSE}
-    if KMS_KEY_ID:
-        extra_args["SSEKMSKeyId"] = KMS_KEY_ID
-
-    with open(file_path, "rb") as f:
-        content = f.read()
+    extra_args = sse_args()
 
-    sha256 = compute_sha256_bytes(content)
-    metadata = {"sha256": sha256, "uploaded_by": uploader, "batch_id": batch_id}
-    try:
-        S3.put_object(Bucket=bucket, Key=key, Body=content, Metadata=metadata, **extra_args)
-    except ClientError as e:
-        raise
+    with open_source(source) as f:
+        body = f
+        if sha256 is None and f.seekable():
+            sha256 = compute_sha256(f)
+            f.seek(0)
+        elif sha256 is None:
+            body = _HashingReader(f)
+        metadata = {"uploaded_by": uploader, "batch_id": batch_id}
+        if sha256:
+            metadata["sha256"] = sha256
+        extra_args["Metadata"] = metadata
+        get_client("s3").upload_fileobj(body, bucket, key, ExtraArgs=extra_args, Config=TRANSFER_CONFIG)
+        if isinstance(body, _HashingReader):
+            sha256 = body.hexdigest()
 
     return {"s3_uri": f"s3://{bucket}/{key}", "key": key, "sha256": sha256, "batch_id": batch_id}
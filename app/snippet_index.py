@@ -0,0 +1,158 @@
+# app/snippet_index.py
+"""
+Reference snippet index. At ingest time every chunk item in the chunks table gets a compact
+"snippet" record (kind + source file URI + sheet/row, page/table/row/col or slide locator);
+replay resolves a reference with one point lookup on that record instead of downloading and
+re-parsing the source. Both the lookups and any source parse that is still needed are LRU-cached.
+Only found records are cached; writing or deleting chunk items (DynamoClient.put_chunks /
+delete_chunks) drops their lookups in every index of the process, and SNIPPET_LOOKUP_TTL_S bounds
+how long another process's changes can go unseen.
+"""
+import io
+import os
+import json
+import weakref
+from functools import lru_cache
+from app.aws_clients import get_client
+from app.recon_cache import ReconCache
+
+SNIPPET_LOOKUP_CACHE_SIZE = int(os.environ.get("SNIPPET_LOOKUP_CACHE_SIZE", "4096"))
+SNIPPET_LOOKUP_TTL_S = float(os.environ.get("SNIPPET_LOOKUP_TTL_S", "300"))
+SNIPPET_SOURCE_CACHE_SIZE = int(os.environ.get("SNIPPET_SOURCE_CACHE_SIZE", "8"))
+
+LOCATOR_KEYS = ("sheet", "row", "col", "page", "table", "slide")
+
+_indexes = weakref.WeakSet()
+
+
+def snippet_record(chunk: dict) -> dict:
+    meta = chunk.get("metadata", {})
+    rec = {k: meta[k] for k in LOCATOR_KEYS if meta.get(k) is not None}
+    if "col" in rec:
+        kind = "cell"
+    elif "row" in rec:
+        kind = "row"
+    elif "slide" in rec:
+        kind = "slide"
+    elif "page" in rec:
+        kind = "page"
+    else:
+        kind = "text"
+    rec["kind"] = kind
+    rec["source_uri"] = meta.get("doc_uri")
+    return rec
+
+
+def chunk_id_from_ref(ref: dict):
+    """
+    Our chunk id for a retrieval reference: explicit metadata, or the kb_chunks/.../{chunk_id}.json object name.
+    """
+    meta = ref.get("metadata", {}) or {}
+    if meta.get("chunk_id"):
+        return meta["chunk_id"]
+    doc = ref.get("kb_chunk_id") or ""
+    name = doc.rsplit("/", 1)[-1]
+    return name[:-len(".json")] if name.endswith(".json") else None
+
+
+def use_case_from_uri(s3_uri: str):
+    parts = (s3_uri or "").replace("s3://", "").split("/")
+    if len(parts) > 2 and parts[1] == "usecase":
+        return parts[2]
+    return None
+
+
+def split_s3_uri(s3_uri: str):
+    bucket, key = s3_uri.replace("s3://", "").split("/", 1)
+    return bucket, key
+
+
+@lru_cache(maxsize=SNIPPET_SOURCE_CACHE_SIZE)
+def load_structured_source(s3_uri: str):
+    """
+    Download and parse a spreadsheet/CSV once; returns {sheet_name: DataFrame} ({None: df} for CSV).
+    """
+    import pandas as pd
+    bucket, key = split_s3_uri(s3_uri)
+    body = io.BytesIO(get_client("s3").get_object(Bucket=bucket, Key=key)["Body"].read())
+    if key.lower().endswith(".csv"):
+        return {None: pd.read_csv(body)}
+    return pd.read_excel(body, sheet_name=None)
+
+
+def forget(use_case: str, chunk_ids):
+    """Drop cached lookups of chunks that were rewritten or deleted, in every SnippetIndex of the process."""
+    for index in list(_indexes):
+        index.invalidate(use_case, chunk_ids)
+
+
+class SnippetIndex:
+    def __init__(self, dyn, cache_size: int = SNIPPET_LOOKUP_CACHE_SIZE, ttl: float = SNIPPET_LOOKUP_TTL_S):
+        self.dyn = dyn
+        self.cache = ReconCache(max_entries=cache_size, ttl=ttl)
+        _indexes.add(self)
+
+    def lookup(self, use_case: str, chunk_id: str):
+        """Snippet record of a chunk, or None; misses are not cached, so a chunk written later is found."""
+        key = json.dumps([use_case, chunk_id])
+        rec = self.cache.get(key)
+        if rec is None:
+            rec = self._lookup(use_case, chunk_id)
+            if rec is not None:
+                self.cache.put(key, rec)
+        return rec
+
+    def invalidate(self, use_case: str, chunk_ids):
+        for chunk_id in chunk_ids:
+            self.cache.discard(json.dumps([use_case, chunk_id]))
+
+    def _lookup(self, use_case: str, chunk_id: str):
+        item = self.dyn.get_chunk(use_case, chunk_id)
+        if not item:
+            return None
+        rec = dict(item.get("snippet") or snippet_record(item.get("chunk", {})))
+        rec["text"] = item.get("chunk", {}).get("text")
+        return rec
+
+    def resolve(self, ref: dict, use_case: str = None):
+        """
+        Snippet for a recon reference: the indexed record when the chunk is known, otherwise the row
+        located in the (cached) parsed source file. Returns None if it cannot be resolved.
+        """
+        meta = ref.get("metadata", {}) or {}
+        chunk_id = chunk_id_from_ref(ref)
+        use_case = use_case or use_case_from_uri(meta.get("doc_uri"))
+        if chunk_id and use_case:
+            rec = self.lookup(use_case, chunk_id)
+            if rec:
+                return render(rec)
+        return self.resolve_from_source(meta)
+
+    @staticmethod
+    def resolve_from_source(meta: dict):
+        s3_uri = meta.get("doc_uri")
+        row = meta.get("row")
+        if not s3_uri or s3_uri.endswith("/") or row is None:
+            return None
+        if not s3_uri.lower().endswith((".xlsx", ".xls", ".csv")):
+            return None
+        sheets = load_structured_source(s3_uri)
+        df = sheets.get(meta.get("sheet"))
+        if df is None and len(sheets) == 1:
+            df = next(iter(sheets.values()))
+        if df is not None and int(row) in df.index:
+            return df.loc[int(row)].to_dict()
+        return None
+
+
+def render(rec: dict):
+    """
+    Row records of spreadsheets carry the row JSON as text; return its values. Everything else is
+    returned as the compact record itself (text plus locator).
+    """
+    if rec.get("kind") == "row" and (rec.get("text") or "").startswith("{"):
+        try:
+            return json.loads(rec["text"])
+        except ValueError:
+            pass
+    return rec
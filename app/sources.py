@@ -0,0 +1,26 @@
+# app/sources.py
+"""
+Ingestion sources. Anything the ingest path accepts as a "source" is one of:
+a filesystem path, a binary file object (e.g. a Streamlit UploadedFile) or an
+in-memory buffer (bytes / bytearray / memoryview).
+"""
+import io
+import os
+from contextlib import contextmanager
+
+
+@contextmanager
+def open_source(source):
+    """
+    Yield a readable binary file object positioned at the start of source.
+    Paths are opened and closed here; caller-owned file objects are rewound but left open.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield f
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        yield io.BytesIO(source)
+    else:
+        if source.seekable():
+            source.seek(0)
+        yield source
@@ -1,38 +1,142 @@
 # app/structured_adapter.py
-import pandas as pd
-import json
-import uuid
-from app.s3_ingest import S3
 import os
+import uuid
+from typing import Dict, Iterator, List, Tuple
+import pandas as pd
+from app.chunk_sink import ChunkSink
+from app.chunks import ChunkBatch
+
+# rows per DataFrame block read from CSV / xlsx before serialisation
+STRUCTURED_BLOCK_ROWS = int(os.environ.get("STRUCTURED_BLOCK_ROWS", "5000"))
 
-# boto3 S3 client for uploading small JSON rows (reuse same client)
-import boto3
-REGION = os.environ.get("AWS_REGION", "us-east-1")
-S3 = boto3.client("s3", region_name=REGION)
 
+def _detect_format(path, file_name: str = None) -> str:
+    name = str(file_name or (path if isinstance(path, (str, os.PathLike)) else "")).lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith(".xls"):
+        return "xls"
+    return "xlsx"
 
-def excel_to_row_chunks(path: str, s3_bucket: str, use_case: str, batch_id: str, upload_rows: bool = True):
+
+def _header_names(header) -> List[str]:
+    # Same naming pandas uses for blank / repeated header cells
+    names, seen = [], {}
+    for i, h in enumerate(header):
+        name = f"Unnamed: {i}" if h is None or h == "" else str(h)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _iter_xlsx_frames(f, sheets=None, columns=None, dtypes=None, block_rows=STRUCTURED_BLOCK_ROWS) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """
+    Read xlsx through openpyxl in read-only mode, yielding DataFrame blocks of block_rows rows.
+    The index is the 0-based data-row position in the sheet, matching pd.read_excel.
+    """
+    from openpyxl import load_workbook
+    wb = load_workbook(f, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            if sheets is not None and ws.title not in sheets:
+                continue
+            rows = ws.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                continue
+            names = _header_names(header)
+            keep = [i for i, n in enumerate(names) if columns is None or n in columns]
+            names = [names[i] for i in keep]
+            start, block = 0, []
+            for values in rows:
+                block.append([values[i] if i < len(values) else None for i in keep])
+                if len(block) >= block_rows:
+                    yield ws.title, _frame(block, names, start, dtypes)
+                    start += len(block)
+                    block = []
+            if block:
+                yield ws.title, _frame(block, names, start, dtypes)
+    finally:
+        wb.close()
+
+
+def _frame(block: list, names: List[str], start: int, dtypes=None) -> pd.DataFrame:
+    df = pd.DataFrame(block, columns=names, index=pd.RangeIndex(start, start + len(block)))
+    if dtypes:
+        df = df.astype({k: v for k, v in dtypes.items() if k in df.columns})
+    return df
+
+
+def iter_frames(path, file_name: str = None, sheets=None, columns=None, dtypes: Dict = None, block_rows: int = STRUCTURED_BLOCK_ROWS) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """
+    Yield (sheet_name, DataFrame block) pairs without loading whole workbooks.
+    CSV is read with a chunked reader (sheet_name is None), xlsx through openpyxl read-only mode
+    and legacy xls through pd.read_excel. sheets / columns project the input; dtypes maps
+    column -> dtype. Block indexes continue across blocks so they stay sheet row numbers.
+    """
+    fmt = _detect_format(path, file_name)
+    if fmt == "csv":
+        for df in pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=block_rows):
+            yield None, df
+    elif fmt == "xlsx":
+        yield from _iter_xlsx_frames(path, sheets, columns, dtypes, block_rows)
+    else:
+        wb = pd.read_excel(path, sheet_name=list(sheets) if sheets else None, usecols=columns, dtype=dtypes)
+        for sheet_name, df in wb.items():
+            yield sheet_name, df
+
+
+def serialise_rows(df: pd.DataFrame) -> List[str]:
+    """
+    Vectorised row serialisation: one JSON object per row via DataFrame.to_json.
+    """
+    if df.empty:
+        return []
+    lines = df.to_json(orient="records", lines=True, date_format="iso", default_handler=str)
+    return lines.replace("\\/", "/").splitlines()
+
+
+def iter_row_chunks(path, s3_bucket: str, use_case: str, batch_id: str, file_name: str = None, sheets=None, columns=None,
+                    dtypes: Dict = None, block_rows: int = STRUCTURED_BLOCK_ROWS, doc_uri: str = None) -> Iterator[Dict]:
+    """
+    Streaming variant of excel_to_row_chunks: yields one chunk per non-empty row, block by block.
+    doc_uri should be the uploaded source object; without it chunks point at the batch folder.
+    """
+    doc_uri = doc_uri or f"s3://{s3_bucket}/usecase/{use_case}/incoming/{batch_id}/"
+    for sheet_name, df in iter_frames(path, file_name, sheets, columns, dtypes, block_rows):
+        df = df.dropna(how="all")
+        for idx, row_text in zip(df.index.tolist(), serialise_rows(df)):
+            yield {
+                "chunk_id": uuid.uuid4().hex,
+                "text": row_text,
+                "metadata": {"doc_uri": doc_uri, "sheet": sheet_name, "row": int(idx)}
+            }
+
+
+def upload_row_chunks(chunks, s3_bucket: str, use_case: str, batch_id: str, failed: list = None) -> Iterator[Dict]:
+    """
+    Upload row chunks under usecase/{use_case}/structured_rows/{batch_id}/ from a bounded
+    thread pool, yielding each chunk with its s3_uri once uploaded.
+    """
+    sink = ChunkSink(s3_bucket, use_case, batch_id, dyn=None, prefix="structured_rows")
+    for ch in sink.upload(chunks, failed if failed is not None else []):
+        ch["s3_uri"] = f"s3://{s3_bucket}/{sink.chunk_key(ch['chunk_id'])}"
+        yield ch
+
+
+def excel_to_row_chunks(path, s3_bucket: str, use_case: str, batch_id: str, upload_rows: bool = True, **options):
     """
     Convert each row/cell into JSON chunk objects with metadata and optionally upload each JSON to S3
     under usecase/{use_case}/structured_rows/{batch_id}/
-    Returns list of dicts: {chunk_id, text, metadata, s3_uri (optional)}
-    """
-    wb = pd.read_excel(path, sheet_name=None)
-    uploaded = []
-    for sheet_name, df in wb.items():
-        for idx, row in df.iterrows():
-            # row-level text (serialized)
-            row_text = json.dumps(row.dropna().to_dict(), default=str)
-            chunk_id = uuid.uuid4().hex
-            metadata = {
-                "doc_uri": f"s3://{s3_bucket}/usecase/{use_case}/incoming/{batch_id}/",  # points to source folder
-                "sheet": sheet_name,
-                "row": int(idx)
-            }
-            chunk = {"chunk_id": chunk_id, "text": row_text, "metadata": metadata}
-            if upload_rows:
-                key = f"usecase/{use_case}/structured_rows/{batch_id}/{chunk_id}.json"
-                S3.put_object(Bucket=s3_bucket, Key=key, Body=json.dumps(chunk).encode("utf-8"))
-                chunk["s3_uri"] = f"s3://{s3_bucket}/{key}"
-            uploaded.append(chunk)
-    return uploaded
+    path is a filesystem path or a binary file object; options are passed to iter_row_chunks
+    (file_name, sheets, columns, dtypes, block_rows, doc_uri).
+    Returns a ChunkBatch: list-like, yielding dicts {chunk_id, text, metadata, s3_uri (optional)}
+    """
+    chunks = iter_row_chunks(path, s3_bucket, use_case, batch_id, **options)
+    if upload_rows:
+        chunks = upload_row_chunks(chunks, s3_bucket, use_case, batch_id)
+    return ChunkBatch.from_chunks(chunks)
@@ -0,0 +1,142 @@
+# app/sync_scheduler.py
+"""
+Per-KB sync scheduler. Ingestion paths call request_sync(kb_id) instead of firing
+sync_kb directly: requests arriving within the debounce window are coalesced into
+one build, at most one build per KB is in flight (requests made meanwhile are
+folded into the next build), and a single poller per KB resolves every waiter.
+A build still running after KB_SYNC_TIMEOUT_S resolves its waiters as failed, so one stuck
+ingestion job cannot hold back every later sync.
+"""
+import os
+import threading
+import time
+from app.kb_sync import sync_kb, get_sync_status
+
+KB_SYNC_DEBOUNCE_S = float(os.environ.get("KB_SYNC_DEBOUNCE_S", "5"))
+KB_SYNC_POLL_INTERVAL_S = float(os.environ.get("KB_SYNC_POLL_INTERVAL_S", "15"))
+KB_SYNC_TIMEOUT_S = float(os.environ.get("KB_SYNC_TIMEOUT_S", "3600"))
+
+DONE_STATUSES = ("COMPLETE", "SUCCEEDED")
+FAILED_STATUSES = ("FAILED", "ERROR")
+
+
+def _status(resp: dict):
+    return resp.get("status") or resp.get("buildStatus")
+
+
+class SyncTicket:
+    """
+    Handle for one sync request; resolved when the build that covers it finishes.
+    """
+    def __init__(self, kb_id: str):
+        self.kb_id = kb_id
+        self.requested_at = time.time()
+        self._done = threading.Event()
+        self.status_resp = None
+        self.error = None
+
+    def _resolve(self, status_resp: dict = None, error: str = None):
+        self.status_resp = status_resp
+        self.error = error
+        self._done.set()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> dict:
+        if not self._done.wait(timeout):
+            raise TimeoutError("Timed out waiting for KB build")
+        if self.error:
+            raise RuntimeError(f"KB build failed: {self.error}")
+        return self.status_resp
+
+
+class KBSyncScheduler:
+    def __init__(self, kb_id: str, start_fn=sync_kb, status_fn=get_sync_status, debounce: float = None, poll_interval: float = None,
+                 timeout: float = None):
+        self.kb_id = kb_id
+        self.start_fn = start_fn
+        self.status_fn = status_fn
+        self.debounce = KB_SYNC_DEBOUNCE_S if debounce is None else debounce
+        self.poll_interval = KB_SYNC_POLL_INTERVAL_S if poll_interval is None else poll_interval
+        self.timeout = KB_SYNC_TIMEOUT_S if timeout is None else timeout
+        self._cond = threading.Condition()
+        self._pending = []
+        self._last_request = 0.0
+        self._worker = None
+        self.builds_started = 0
+        self.last_status = None
+
+    def request(self) -> SyncTicket:
+        ticket = SyncTicket(self.kb_id)
+        with self._cond:
+            self._pending.append(ticket)
+            self._last_request = ticket.requested_at
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=f"kb-sync-{self.kb_id}", daemon=True)
+                self._worker.start()
+            self._cond.notify_all()
+        return ticket
+
+    def _take_pending(self):
+        """
+        Wait out the debounce window, then hand over every pending ticket.
+        Returns None (and retires the worker) when nothing is pending.
+        """
+        with self._cond:
+            if not self._pending:
+                self._worker = None
+                return None
+            while True:
+                remaining = self._last_request + self.debounce - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            tickets, self._pending = self._pending, []
+            return tickets
+
+    def _run(self):
+        while True:
+            tickets = self._take_pending()
+            if tickets is None:
+                return
+            status_resp, error = self._build()
+            self.last_status = status_resp
+            for t in tickets:
+                t._resolve(status_resp, error)
+
+    def _build(self):
+        try:
+            resp = self.start_fn(self.kb_id)
+            self.builds_started += 1
+            if "error" in resp:
+                return resp, resp["error"]
+            deadline = time.time() + self.timeout
+            while True:
+                status_resp = self.status_fn(self.kb_id)
+                status = _status(status_resp)
+                if status in DONE_STATUSES:
+                    return status_resp, None
+                if status in FAILED_STATUSES or "error" in status_resp:
+                    return status_resp, str(status_resp)
+                if time.time() >= deadline:
+                    return status_resp, f"build still {status} after {self.timeout:g}s"
+                time.sleep(min(self.poll_interval, max(deadline - time.time(), 0)))
+        except Exception as e:
+            return None, str(e)
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(kb_id: str) -> KBSyncScheduler:
+    with _schedulers_lock:
+        sched = _schedulers.get(kb_id)
+        if sched is None:
+            sched = _schedulers[kb_id] = KBSyncScheduler(kb_id)
+        return sched
+
+
+def request_sync(kb_id: str) -> SyncTicket:
+    return get_scheduler(kb_id).request()
@@ -2,19 +2,38 @@
 """
 Textract-based extraction to get pages, tables, and cell-level references and produce chunk objects with metadata.
 
-This uses synchronous calls for simple docs; for large PDFs you'd switch to start_document_analysis + polling.
+This uses synchronous calls for simple docs; large PDFs go through start_document_analysis and
+iter_analysis_pages, which polls with backoff and follows NextToken across result pages.
+PDFs longer than TEXTRACT_SEGMENT_PAGES are split into page-range segments (pypdf) analysed as
+concurrent jobs, at most TEXTRACT_MAX_CONCURRENT_JOBS at a time (iter_segmented_chunks).
 """
-import boto3
+import io
+import os
 import time
+import logging
 import uuid
-from typing import List, Dict
+from collections import deque
+from itertools import chain, count as counter, islice
+from typing import Dict, Iterable, Iterator
+from botocore.exceptions import ClientError, BotoCoreError
+from app.aws_clients import get_client
+from app.chunks import ChunkBatch
+from app.metrics import span, count
 
-textract = boto3.client("textract")
+POLL_INITIAL_INTERVAL = 0.5
+POLL_MAX_INTERVAL = 10
+POLL_BACKOFF = 1.6
+
+TEXTRACT_SEGMENT_PAGES = int(os.environ.get("TEXTRACT_SEGMENT_PAGES", "50"))  # 0 disables splitting
+TEXTRACT_MAX_CONCURRENT_JOBS = int(os.environ.get("TEXTRACT_MAX_CONCURRENT_JOBS", "4"))
+S3_DELETE_BATCH = 1000
+
+logger = logging.getLogger("recon.textract")
 
 
 def detect_text_bytes(b: bytes) -> Dict:
     # For single images or very small PDFs: detect_document_text
-    return textract.detect_document_text(Document={"Bytes": b})
+    return get_client("textract").detect_document_text(Document={"Bytes": b})
 
 
 def start_async_analysis_s3(bucket: str, key: str, feature_types=["TABLES", "FORMS"]):
@@ -22,109 +41,235 @@ def start_async_analysis_s3(bucket: str, key: str, feature_types=["TABLES", "FOR
     For larger PDFs, start async analysis using S3 object reference.
     Returns JobId.
     """
-    resp = textract.start_document_analysis(
+    resp = get_client("textract").start_document_analysis(
         DocumentLocation={"S3Object": {"Bucket": bucket, "Name": key}},
         FeatureTypes=feature_types
     )
     return resp["JobId"]
 
 
-def get_async_analysis_result(job_id: str, poll_interval=5):
-    while True:
-        resp = textract.get_document_analysis(JobId=job_id)
-        status = resp.get("JobStatus")
-        if status in ("SUCCEEDED", "FAILED"):
-            return resp
-        time.sleep(poll_interval)
+def iter_analysis_pages(job_id: str, poll_initial: float = POLL_INITIAL_INTERVAL, poll_max: float = POLL_MAX_INTERVAL, timeout: float = None) -> Iterator[Dict]:
+    """
+    Poll get_document_analysis with adaptive backoff (poll_initial, growing by POLL_BACKOFF
+    up to poll_max) until the job finishes, then yield every result page by following NextToken.
+    """
+    start = time.time()
+    delay = poll_initial
+    with span("textract_wait"):
+        while True:
+            resp = get_client("textract").get_document_analysis(JobId=job_id)
+            status = resp.get("JobStatus")
+            if status in ("SUCCEEDED", "PARTIAL_SUCCESS"):
+                break
+            if status == "FAILED":
+                raise RuntimeError(f"Textract job {job_id} failed: {resp.get('StatusMessage')}")
+            if timeout is not None and time.time() - start > timeout:
+                raise TimeoutError(f"Timed out waiting for Textract job {job_id}")
+            time.sleep(delay)
+            delay = min(delay * POLL_BACKOFF, poll_max)
+
+    count("textract_pages")
+    yield resp
+    token = resp.get("NextToken")
+    while token:
+        resp = get_client("textract").get_document_analysis(JobId=job_id, NextToken=token)
+        count("textract_pages")
+        yield resp
+        token = resp.get("NextToken")
+
 
+def iter_blocks(pages: Iterable[Dict]) -> Iterator[Dict]:
+    for page in pages:
+        yield from page.get("Blocks", [])
 
-def extract_chunks_from_textract_response(textract_resp: Dict, s3_uri: str) -> List[Dict]:
+
+def get_async_analysis_result(job_id: str, poll_interval=POLL_MAX_INTERVAL):
     """
-    Parse Textract blocks and build chunks with metadata for page, table, row, column.
-    For tables, Textract provides Table blocks; we reconstruct row/col relationships.
-    Returns a list of chunk dicts: {chunk_id, text, metadata}
+    Wait for the job and return a single response holding the Blocks of every result page.
+    Prefer iter_analysis_pages for large documents.
     """
-    blocks = textract_resp.get("Blocks", [])
-    # Index blocks by id
-    by_id = {b["Id"]: b for b in blocks}
+    result = None
+    for page in iter_analysis_pages(job_id, poll_max=poll_interval):
+        if result is None:
+            result = {k: v for k, v in page.items() if k not in ("Blocks", "NextToken")}
+            result["Blocks"] = []
+        result["Blocks"].extend(page.get("Blocks", []))
+    return result
 
-    # Build pages mapping
-    pages = {}
-    for b in blocks:
-        if b["BlockType"] == "PAGE":
-            pages[b["Id"]] = b
 
-    chunks = []
+def _child_ids(block: Dict) -> tuple:
+    ids = ()
+    for rel in block.get("Relationships", ()):
+        if rel["Type"] == "CHILD":
+            ids += tuple(rel.get("Ids", ()))
+    return ids
+
+
+def iter_chunks_from_textract(blocks: Iterable[Dict], s3_uri: str, page_offset: int = 0, table_ids: Iterator[int] = None) -> Iterator[Dict]:
+    """
+    Streaming variant of extract_chunks_from_textract_response over an iterable of blocks.
+
+    Single pass: LINE chunks are yielded as their blocks arrive, while a compact index is built
+    for table reconstruction (WORD/LINE id -> text, CELL id -> (row, col, child ids),
+    TABLE -> (page, cell ids)). Full blocks (geometry etc.) are never retained.
+    For a segment of a larger document, page_offset is added to page numbers and table_ids
+    (an iterator shared by all segments) continues the document's table numbering.
+    """
+    text_by_id = {}
+    cells = {}
+    tables = []
+
+    def page_of(b):
+        page = b.get("Page")
+        return page + page_offset if page is not None and page_offset else page
 
-    # Extract LINE blocks for plain text, attach page number if possible
     for b in blocks:
-        if b["BlockType"] == "LINE":
-            page = None
-            if "Page" in b:
-                page = b.get("Page")
+        btype = b["BlockType"]
+        if btype == "LINE":
             text = b.get("Text", "")
-            chunk = {
+            text_by_id[b["Id"]] = text
+            yield {
                 "chunk_id": uuid.uuid4().hex,
                 "text": text,
-                "metadata": {"doc_uri": s3_uri, "page": page}
+                "metadata": {"doc_uri": s3_uri, "page": page_of(b)}
             }
-            chunks.append(chunk)
+        elif btype == "WORD":
+            text_by_id[b["Id"]] = b.get("Text", "")
+        elif btype == "CELL":
+            cells[b["Id"]] = (b.get("RowIndex", 0), b.get("ColumnIndex", 0), _child_ids(b))
+        elif btype == "TABLE":
+            tables.append((page_of(b), _child_ids(b)))
 
-    # Extract TABLES -> reconstruct rows and cells
-    # Textract provides TABLE blocks with Relationships -> CHILD referencing CELL blocks.
-    table_count = 0
-    for b in blocks:
-        if b["BlockType"] == "TABLE":
-            table_count += 1
-            table_id = table_count
-            # gather cell blocks
-            cell_blocks = []
-            for rel in b.get("Relationships", []):
-                if rel["Type"] == "CHILD":
-                    for cid in rel.get("Ids", []):
-                        cb = by_id.get(cid)
-                        if cb and cb["BlockType"] == "CELL":
-                            cell_blocks.append(cb)
-            # Build rows based on RowIndex
-            rows = {}
-            for cell in cell_blocks:
-                row_index = cell.get("RowIndex", 0)
-                col_index = cell.get("ColumnIndex", 0)
-                # get text inside this cell by following its child relationships
-                cell_text = ""
-                for rel in cell.get("Relationships", []):
-                    if rel["Type"] == "CHILD":
-                        for child_id in rel.get("Ids", []):
-                            child = by_id.get(child_id)
-                            if child and child.get("BlockType") in ("WORD", "LINE"):
-                                cell_text += (child.get("Text", "") + " ")
-                rows.setdefault(row_index, {})[col_index] = cell_text.strip()
-            # create chunk per row (row-level chunk) and cell-level chunks
-            for r_idx, cols in rows.items():
-                row_text = " | ".join([cols[c] for c in sorted(cols.keys())])
-                chunk_row = {
+    # Rebuild each table from the index: rows keep the order in which their cells are listed
+    # (tables first in zip, so a shared table_ids iterator is not advanced past the last table)
+    for (page, cell_ids), table_id in zip(tables, table_ids or counter(1)):
+        rows = {}
+        for cid in cell_ids:
+            cell = cells.get(cid)
+            if cell is None:
+                continue
+            row_index, col_index, child_ids = cell
+            cell_text = " ".join([text_by_id[w] for w in child_ids if w in text_by_id]).strip()
+            rows.setdefault(row_index, {})[col_index] = cell_text
+        for r_idx, cols in rows.items():
+            yield {
+                "chunk_id": uuid.uuid4().hex,
+                "text": " | ".join([cols[c] for c in sorted(cols)]),
+                "metadata": {"doc_uri": s3_uri, "page": page, "table": table_id, "row": r_idx}
+            }
+            for c_idx, c_text in cols.items():
+                yield {
                     "chunk_id": uuid.uuid4().hex,
-                    "text": row_text,
-                    "metadata": {
-                        "doc_uri": s3_uri,
-                        "page": b.get("Page", None),
-                        "table": table_id,
-                        "row": r_idx
-                    }
+                    "text": c_text,
+                    "metadata": {"doc_uri": s3_uri, "page": page, "table": table_id, "row": r_idx, "col": c_idx}
                 }
-                chunks.append(chunk_row)
-                for c_idx, c_text in cols.items():
-                    chunk_cell = {
-                        "chunk_id": uuid.uuid4().hex,
-                        "text": c_text,
-                        "metadata": {
-                            "doc_uri": s3_uri,
-                            "page": b.get("Page", None),
-                            "table": table_id,
-                            "row": r_idx,
-                            "col": c_idx
-                        }
-                    }
-                    chunks.append(chunk_cell)
-
-    return chunks
+
+
+def extract_chunks_from_textract_response(textract_resp, s3_uri: str) -> ChunkBatch:
+    """
+    Parse Textract blocks and build chunks with metadata for page, table, row, column.
+    textract_resp is either a single response dict or an iterable of response pages
+    (e.g. iter_analysis_pages), which is consumed incrementally.
+    Returns a ChunkBatch: list-like, yielding chunk dicts {chunk_id, text, metadata}.
+    """
+    pages = [textract_resp] if isinstance(textract_resp, dict) else textract_resp
+    return ChunkBatch.from_chunks(iter_chunks_from_textract(iter_blocks(pages), s3_uri))
+
+
+def pdf_page_count(f):
+    """
+    Number of pages of a PDF file object, or None when it cannot be read locally
+    (pypdf not installed, not a PDF, encrypted); such documents go to Textract as one job.
+    """
+    try:
+        from pypdf import PdfReader
+        from pypdf.errors import PyPdfError
+    except ImportError:
+        return None
+    try:
+        f.seek(0)
+        return len(PdfReader(f).pages)
+    except (PyPdfError, ValueError):
+        return None
+    finally:
+        f.seek(0)
+
+
+def page_ranges(pages: int, segment_pages: int) -> list:
+    """1-based inclusive (first, last) page ranges of at most segment_pages pages."""
+    return [(first, min(first + segment_pages - 1, pages)) for first in range(1, pages + 1, segment_pages)]
+
+
+def _segment_pdf(reader, first: int, last: int) -> bytes:
+    from pypdf import PdfWriter
+    writer = PdfWriter()
+    for i in range(first - 1, last):
+        writer.add_page(reader.pages[i])
+    buf = io.BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+
+def iter_segmented_chunks(f, bucket: str, key: str, s3_uri: str, segment_pages: int = TEXTRACT_SEGMENT_PAGES,
+                          max_jobs: int = TEXTRACT_MAX_CONCURRENT_JOBS) -> Iterator[Dict]:
+    """
+    Chunks of a large PDF analysed as page-range segments. Each segment of segment_pages pages is
+    written as its own PDF (encrypted like the original) under {key}.segments/ and submitted as a separate Textract job, with up to
+    max_jobs jobs running at once; as soon as the oldest job finishes the next segment is submitted.
+    Results are consumed in page order, page numbers are shifted back to absolute pages and tables are
+    numbered across the whole document, so the chunks match a single-job analysis.
+    The segment objects are deleted afterwards, also when the analysis fails.
+    """
+    from pypdf import PdfReader
+    from app.s3_ingest import sse_args
+    f.seek(0)
+    reader = PdfReader(f)
+    ranges = iter(page_ranges(len(reader.pages), segment_pages))
+    s3 = get_client("s3")
+    segment_keys = []
+
+    def submit(first, last):
+        segment_key = f"{key}.segments/p{first:05d}-{last:05d}.pdf"
+        segment_keys.append(segment_key)
+        s3.put_object(Bucket=bucket, Key=segment_key, Body=_segment_pdf(reader, first, last), **sse_args())
+        count("textract_segments")
+        return first, start_async_analysis_s3(bucket, segment_key)
+
+    jobs = deque()
+    table_ids = counter(1)
+    try:
+        for first, last in islice(ranges, max(max_jobs, 1)):
+            jobs.append(submit(first, last))
+        while jobs:
+            first, job_id = jobs.popleft()
+            pages = iter_analysis_pages(job_id)
+            head = next(pages)  # the oldest job has finished: its slot goes to the next segment
+            nxt = next(ranges, None)
+            if nxt:
+                jobs.append(submit(*nxt))
+            yield from iter_chunks_from_textract(iter_blocks(chain([head], pages)), s3_uri, page_offset=first - 1, table_ids=table_ids)
+    finally:
+        delete_segments(s3, bucket, segment_keys)
+
+
+def delete_segments(s3, bucket: str, keys: list) -> list:
+    """
+    Delete segment copies of a source PDF. Keys a batch delete reports (or fails on) are retried one
+    by one; those still present are logged and returned.
+    """
+    retry = []
+    for i in range(0, len(keys), S3_DELETE_BATCH):
+        batch = keys[i:i + S3_DELETE_BATCH]
+        try:
+            resp = s3.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True})
+            retry.extend(e["Key"] for e in resp.get("Errors", []))
+        except (ClientError, BotoCoreError):
+            retry.extend(batch)
+    leftover = []
+    for k in retry:
+        try:
+            s3.delete_object(Bucket=bucket, Key=k)
+        except (ClientError, BotoCoreError) as e:
+            leftover.append(k)
+            logger.warning("could not delete textract segment s3://%s/%s: %s", bucket, k, e)
+    return leftover
@@ -0,0 +1,69 @@
+# bench/compare.py
+"""
+Compare two bench.suite runs. Lists throughput, p50/p99 latency and peak memory per scenario
+with the relative change, and exits non-zero when any of them regressed by more than
+--threshold, so it can gate a deploy.
+
+    python -m bench.compare base.json new.json --threshold 0.10
+"""
+import sys
+import json
+import argparse
+
+# metric -> True when higher is better
+METRICS = {"throughput": True, "p50_ms": False, "p99_ms": False, "peak_mem_mb": False}
+
+
+def load(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(base: dict, new: dict, threshold: float = 0.10) -> list:
+    """
+    Rows of {scenario, metric, base, new, change, regression}; change is relative (new / base - 1).
+    Scenarios or metrics missing on either side are skipped.
+    """
+    rows = []
+    for scenario, b in base["scenarios"].items():
+        n = new["scenarios"].get(scenario)
+        if n is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            bv, nv = b.get(metric), n.get(metric)
+            if bv is None or nv is None:
+                continue
+            change = nv / bv - 1 if bv else 0.0
+            worse = -change if higher_is_better else change
+            rows.append({"scenario": scenario, "metric": metric, "base": bv, "new": nv, "change": change, "regression": worse > threshold})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change that counts as a regression")
+    args = parser.parse_args()
+
+    base, new = load(args.base), load(args.new)
+    for label, run in (("base", base), ("new", new)):
+        meta = run.get("meta", {})
+        print(f"{label}: rev={meta.get('git_rev')} python={meta.get('python')} cpus={meta.get('cpus')} scale={meta.get('args', {}).get('scale')}")
+    only = sorted(set(base["scenarios"]) ^ set(new["scenarios"]))
+    if only:
+        print(f"not in both runs: {', '.join(only)}")
+
+    rows = compare(base, new, args.threshold)
+    print(f"{'scenario':<16}{'metric':<13}{'base':>12}{'new':>12}{'change':>9}")
+    for r in rows:
+        flag = "  REGRESSION" if r["regression"] else ""
+        print(f"{r['scenario']:<16}{r['metric']:<13}{r['base']:>12,.1f}{r['new']:>12,.1f}{r['change']:>+9.1%}{flag}")
+    regressions = [r for r in rows if r["regression"]]
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
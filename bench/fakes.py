@@ -0,0 +1,468 @@
+# bench/fakes.py
+"""
+In-process stand-ins for the AWS services the app calls -- S3, DynamoDB, Textract and
+bedrock-agent -- so ingest and recon can be benchmarked without an account. Every call sleeps
+for its service's latency and may be throttled, at random (throttle_rate) or once the service
+sees more than max_rps calls in a second; a throttled call raises the ClientError the real
+service returns. The stand-ins sit where botocore would be, so a throttle reaches the app the
+way it does once the SDK's own retries are used up.
+
+    stand_ins = install(Profile(latency_ms=5), {"dynamodb": Profile(latency_ms=8, max_rps=2000)})
+    ...
+    stand_ins.stats()  # calls and throttles per service and operation
+"""
+import io
+import time
+import uuid
+import random
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass
+from botocore.exceptions import ClientError
+from app import aws_clients
+
+
+@dataclass
+class Profile:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    throttle_rate: float = 0.0  # probability that a call is throttled
+    max_rps: float = 0.0  # calls per second before throttling; 0 is unlimited
+
+
+def _error(code: str, op: str, message: str = "", status: int = 400):
+    return ClientError({"Error": {"Code": code, "Message": message or code}, "ResponseMetadata": {"HTTPStatusCode": status}}, op)
+
+
+class _Service:
+    throttle_code = "ThrottlingException"
+
+    def __init__(self, profile: Profile = None, seed: int = 0):
+        self.profile = profile or Profile()
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = deque()  # admitted call times within the last second (max_rps)
+        self.calls = Counter()
+        self.throttled = Counter()
+
+    def _call(self, op: str):
+        p = self.profile
+        with self._lock:
+            self.calls[op] += 1
+            throttle = bool(p.throttle_rate) and self._rnd.random() < p.throttle_rate
+            if p.max_rps and not throttle:
+                now = time.monotonic()
+                while self._window and now - self._window[0] >= 1.0:
+                    self._window.popleft()
+                if len(self._window) >= p.max_rps:
+                    throttle = True
+                else:
+                    self._window.append(now)
+            if throttle:
+                self.throttled[op] += 1
+            delay = max(p.latency_ms + self._rnd.uniform(-p.jitter_ms, p.jitter_ms), 0.0) / 1000
+        if delay:
+            time.sleep(delay)
+        if throttle:
+            raise _error(self.throttle_code, op, "Rate exceeded")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": sum(self.calls.values()), "throttled": sum(self.throttled.values()), "by_operation": dict(self.calls)}
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls.clear()
+            self.throttled.clear()
+
+
+class FakeS3(_Service):
+    """
+    Objects in a dict. retain(key) decides whether an object's body is kept; objects it rejects
+    (e.g. write-only chunk uploads) are counted but dropped, so they do not inflate peak memory.
+    object_args keeps the extra put arguments (encryption, metadata) of every object written.
+    """
+    throttle_code = "SlowDown"
+
+    def __init__(self, profile: Profile = None, retain=None, seed: int = 0):
+        super().__init__(profile, seed)
+        self.retain = retain
+        self.objects = {}
+        self.object_args = {}
+        self.bytes_written = 0
+
+    def _store(self, bucket: str, key: str, body):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        elif not isinstance(body, (bytes, bytearray)):
+            body = body.read()
+        with self._lock:
+            self.bytes_written += len(body)
+            if self.retain is None or self.retain(key):
+                self.objects[(bucket, key)] = bytes(body)
+
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        self._call("PutObject")
+        self._store(Bucket, Key, Body)
+        self.object_args[(Bucket, Key)] = kwargs
+        return {"ETag": uuid.uuid4().hex}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        self._call("PutObject")
+        self._store(Bucket, Key, Fileobj)
+        self.object_args[(Bucket, Key)] = dict(ExtraArgs or {})
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._call("GetObject")
+        body = self.objects.get((Bucket, Key))
+        if body is None:
+            raise _error("NoSuchKey", "GetObject", "The specified key does not exist.", 404)
+        return {"Body": io.BytesIO(body), "ContentLength": len(body)}
+
+    def delete_objects(self, Bucket, Delete):
+        self._call("DeleteObjects")
+        with self._lock:
+            for obj in Delete["Objects"]:
+                self.objects.pop((Bucket, obj["Key"]), None)
+                self.object_args.pop((Bucket, obj["Key"]), None)
+        return {} if Delete.get("Quiet") else {"Deleted": [{"Key": obj["Key"]} for obj in Delete["Objects"]]}
+
+    def delete_object(self, Bucket, Key):
+        self._call("DeleteObject")
+        with self._lock:
+            self.objects.pop((Bucket, Key), None)
+            self.object_args.pop((Bucket, Key), None)
+        return {}
+
+
+def _matches(cond, item: dict) -> bool:
+    # Evaluate a boto3.dynamodb.conditions expression (Key / Attr) against an item
+    if cond is None:
+        return True
+    expr = cond.get_expression()
+    op, values = expr["operator"], expr["values"]
+    if op == "AND":
+        return all(_matches(v, item) for v in values)
+    if op == "OR":
+        return any(_matches(v, item) for v in values)
+    if op == "NOT":
+        return not _matches(values[0], item)
+    name = values[0].name
+    if op == "attribute_exists":
+        return name in item
+    if op == "attribute_not_exists":
+        return name not in item
+    if name not in item:
+        return False
+    v = item[name]
+    if op == "=":
+        return v == values[1]
+    if op == "<>":
+        return v != values[1]
+    if op == "<":
+        return v < values[1]
+    if op == "<=":
+        return v <= values[1]
+    if op == ">":
+        return v > values[1]
+    if op == ">=":
+        return v >= values[1]
+    if op == "BETWEEN":
+        return values[1] <= v <= values[2]
+    if op == "IN":
+        return v in values[1]
+    if op == "begins_with":
+        return str(v).startswith(values[1])
+    if op == "contains":
+        return values[1] in v
+    raise NotImplementedError(f"condition operator {op}")
+
+
+class FakeTable:
+    """
+    Table handle: like a boto3 Table, every operation goes through the resource's meta.client
+    (the registry's rate-limited wrapper once installed), which stores into this table.
+    """
+    def __init__(self, db, name: str, key: tuple, indexes: dict = None, retain: bool = True):
+        self.db = db
+        self.name = name
+        self.key = key  # (hash key, range key)
+        self.indexes = indexes or {}  # index name -> (hash key, range key)
+        self.retain = retain
+        self.items = {}
+
+    @property
+    def meta(self):
+        return self.db.meta
+
+    def _item_key(self, item: dict) -> tuple:
+        try:
+            return tuple(item[k] for k in self.key)
+        except KeyError:
+            raise _error("ValidationException", "PutItem", "The provided key element does not match the schema")
+
+    def _put(self, item: dict):
+        key = self._item_key(item)
+        if self.retain:
+            with self.db._lock:
+                self.items[key] = item
+
+    def _delete(self, key: dict):
+        with self.db._lock:
+            self.items.pop(self._item_key(key), None)
+
+    def _query(self, KeyConditionExpression, IndexName=None, FilterExpression=None, ScanIndexForward=True, Limit=None, ExclusiveStartKey=None, **kwargs):
+        # Key condition, filter, sort-key order and Limit / ExclusiveStartKey paging as DynamoDB applies
+        # them (Limit counts items read before the filter). Projections are ignored.
+        if IndexName and IndexName not in self.indexes:
+            raise _error("ValidationException", "Query", "The table does not have the specified index: " + IndexName)
+        hash_key, range_key = self.indexes[IndexName] if IndexName else self.key
+        with self.db._lock:
+            items = [it for it in self.items.values() if _matches(KeyConditionExpression, it)]
+        items.sort(key=lambda it: (str(it.get(hash_key)), str(it.get(range_key))), reverse=not ScanIndexForward)
+        if ExclusiveStartKey:
+            start = self._item_key(ExclusiveStartKey)
+            pos = next((i for i, it in enumerate(items) if self._item_key(it) == start), None)
+            items = items[pos + 1:] if pos is not None else items
+        resp = {}
+        if Limit and len(items) > Limit:
+            items = items[:Limit]
+            resp["LastEvaluatedKey"] = {k: items[-1][k] for k in set(self.key) | {hash_key, range_key} if k in items[-1]}
+        resp["Items"] = [dict(it) for it in items if _matches(FilterExpression, it)]
+        resp["Count"] = len(resp["Items"])
+        return resp
+
+    def put_item(self, **kwargs):
+        return self.meta.client.put_item(TableName=self.name, **kwargs)
+
+    def get_item(self, **kwargs):
+        return self.meta.client.get_item(TableName=self.name, **kwargs)
+
+    def delete_item(self, **kwargs):
+        return self.meta.client.delete_item(TableName=self.name, **kwargs)
+
+    def query(self, **kwargs):
+        return self.meta.client.query(TableName=self.name, **kwargs)
+
+
+class FakeDynamoDB(_Service):
+    """
+    Resource and client in one: Table(name) returns a FakeTable, and it is its own initial
+    .meta.client. tables maps table name -> {"key": (hash, range), "indexes": {name: (hash, range)},
+    "retain": bool}; a table with retain False validates and counts writes but keeps no items.
+    """
+    throttle_code = "ProvisionedThroughputExceededException"
+
+    def __init__(self, tables: dict, profile: Profile = None, seed: int = 0):
+        super().__init__(profile, seed)
+        self.tables = {name: FakeTable(self, name, spec["key"], spec.get("indexes"), spec.get("retain", True)) for name, spec in tables.items()}
+        self.meta = type("Meta", (), {"client": self})()
+
+    def Table(self, name: str):
+        table = self.tables.get(name)
+        if table is None:
+            raise _error("ResourceNotFoundException", "DescribeTable", f"Requested resource not found: Table: {name}")
+        return table
+
+    def put_item(self, TableName, Item, **kwargs):
+        self._call("PutItem")
+        self.Table(TableName)._put(Item)
+        return {}
+
+    def get_item(self, TableName, Key, **kwargs):
+        self._call("GetItem")
+        table = self.Table(TableName)
+        item = table.items.get(table._item_key(Key))
+        return {"Item": dict(item)} if item is not None else {}
+
+    def delete_item(self, TableName, Key, **kwargs):
+        self._call("DeleteItem")
+        self.Table(TableName)._delete(Key)
+        return {}
+
+    def query(self, TableName, **kwargs):
+        self._call("Query")
+        return self.Table(TableName)._query(**kwargs)
+
+    def batch_write_item(self, RequestItems):
+        if sum(len(reqs) for reqs in RequestItems.values()) > 25:
+            raise _error("ValidationException", "BatchWriteItem", "Too many items requested for the BatchWriteItem call")
+        self._call("BatchWriteItem")
+        for name, requests in RequestItems.items():
+            table = self.Table(name)
+            for req in requests:
+                if "PutRequest" in req:
+                    table._put(req["PutRequest"]["Item"])
+                else:
+                    table._delete(req["DeleteRequest"]["Key"])
+        return {"UnprocessedItems": {}}
+
+
+class FakeTextract(_Service):
+    """
+    Async document analysis. Every job serves one prepared response (e.g.
+    bench.synthetic.make_textract_response) -- or, given make_response and the S3 stand-in, a
+    response with as many pages as the submitted PDF has -- and reports IN_PROGRESS for
+    job_s + job_s_per_page * pages seconds, then returns the blocks in result pages of blocks_per_page.
+    """
+    def __init__(self, response: dict, profile: Profile = None, job_s: float = 0.0, job_s_per_page: float = 0.0,
+                 blocks_per_page: int = 1000, s3: FakeS3 = None, make_response=None, seed: int = 0):
+        super().__init__(profile, seed)
+        self.response = response
+        self.job_s = job_s
+        self.job_s_per_page = job_s_per_page
+        self.blocks_per_page = blocks_per_page
+        self.s3 = s3
+        self.make_response = make_response
+        self._responses = {}
+        self.jobs = {}
+
+    def _response_for(self, location: dict) -> dict:
+        obj = location.get("S3Object", {})
+        body = self.s3.objects.get((obj.get("Bucket"), obj.get("Name"))) if self.s3 is not None and self.make_response else None
+        if not body:
+            return self.response
+        from app.textract_processor import pdf_page_count
+        pages = pdf_page_count(io.BytesIO(body))
+        if not pages:
+            return self.response
+        with self._lock:
+            if pages not in self._responses:
+                self._responses[pages] = self.make_response(pages)
+            return self._responses[pages]
+
+    def start_document_analysis(self, DocumentLocation, FeatureTypes=None, **kwargs):
+        self._call("StartDocumentAnalysis")
+        resp = self._response_for(DocumentLocation)
+        pages = resp.get("DocumentMetadata", {}).get("Pages", 1)
+        job_id = uuid.uuid4().hex
+        self.jobs[job_id] = (time.monotonic() + self.job_s + self.job_s_per_page * pages, resp)
+        return {"JobId": job_id}
+
+    def get_document_analysis(self, JobId, NextToken=None, MaxResults=None):
+        self._call("GetDocumentAnalysis")
+        if JobId not in self.jobs:
+            raise _error("InvalidJobIdException", "GetDocumentAnalysis", f"Unknown job {JobId}")
+        done_at, response = self.jobs[JobId]
+        if time.monotonic() < done_at:
+            return {"JobStatus": "IN_PROGRESS"}
+        blocks = response["Blocks"]
+        start = int(NextToken or 0)
+        end = start + (MaxResults or self.blocks_per_page)
+        resp = {"JobStatus": "SUCCEEDED", "DocumentMetadata": response.get("DocumentMetadata", {}), "Blocks": blocks[start:end]}
+        if end < len(blocks):
+            resp["NextToken"] = str(end)
+        return resp
+
+    def detect_document_text(self, Document):
+        self._call("DetectDocumentText")
+        return {"Blocks": [b for b in self.response["Blocks"] if b["BlockType"] in ("PAGE", "LINE", "WORD") and b.get("Page", 1) == 1]}
+
+
+class FakeBedrockAgent(_Service):
+    """
+    KB builds that complete build_s seconds after they start, and generations of answer_tokens
+    tokens taking token_ms each (streamed token by token by retrieve_and_generate_stream) with
+    references citations. Registered for both bedrock-agent and bedrock-agent-runtime.
+    """
+    def __init__(self, profile: Profile = None, build_s: float = 0.0, answer_tokens: int = 100, token_ms: float = 0.0, references: int = 5, seed: int = 0):
+        super().__init__(profile, seed)
+        self.build_s = build_s
+        self.answer_tokens = answer_tokens
+        self.token_ms = token_ms
+        self.references = references
+        self.builds = {}
+
+    def start_knowledge_base_build(self, knowledgeBaseId):
+        self._call("StartKnowledgeBaseBuild")
+        build_id = uuid.uuid4().hex
+        self.builds[knowledgeBaseId] = (build_id, time.monotonic())
+        return {"buildId": build_id, "status": "IN_PROGRESS"}
+
+    def get_knowledge_base_build(self, knowledgeBaseId):
+        self._call("GetKnowledgeBaseBuild")
+        build_id, started = self.builds.get(knowledgeBaseId, ("initial", float("-inf")))
+        status = "COMPLETE" if time.monotonic() - started >= self.build_s else "IN_PROGRESS"
+        return {"buildId": build_id, "status": status}
+
+    def _answer(self, params: dict):
+        tokens = [f"token{i} " for i in range(self.answer_tokens)]
+        batch_filter = ((params.get("retrievalConfiguration") or {}).get("filters") or {})
+        batch_id = (batch_filter.get("equals") or {}).get("value")
+        citations = [{
+            "generatedResponsePart": {"textResponsePart": {"text": tokens[0] if tokens else ""}},
+            "retrievedReferences": [{
+                "content": {"text": f"reference {i}"},
+                "location": {"s3Location": {"uri": f"s3://bench/kb_chunks/{i}.json"}},
+                "metadata": {"chunk_id": f"chunk-{i}", "batch_id": batch_id},
+            }],
+        } for i in range(self.references)]
+        return tokens, citations
+
+    def retrieve_and_generate(self, **params):
+        self._call("RetrieveAndGenerate")
+        tokens, citations = self._answer(params)
+        if self.token_ms:
+            time.sleep(len(tokens) * self.token_ms / 1000)
+        return {"output": {"text": "".join(tokens)}, "citations": citations, "sessionId": uuid.uuid4().hex}
+
+    def retrieve_and_generate_stream(self, **params):
+        self._call("RetrieveAndGenerateStream")
+        tokens, citations = self._answer(params)
+
+        def stream():
+            for tok in tokens:
+                if self.token_ms:
+                    time.sleep(self.token_ms / 1000)
+                yield {"output": {"text": tok}}
+            for citation in citations:
+                yield {"citation": {"citation": citation}}
+        return {"stream": stream(), "sessionId": uuid.uuid4().hex}
+
+
+class StandIns:
+    def __init__(self, s3: FakeS3, dynamodb: FakeDynamoDB, textract: FakeTextract, bedrock_agent: FakeBedrockAgent):
+        self.services = {"s3": s3, "dynamodb": dynamodb, "textract": textract, "bedrock-agent": bedrock_agent}
+
+    def __getitem__(self, service: str):
+        return self.services[service]
+
+    def stats(self) -> dict:
+        return {name: svc.stats() for name, svc in self.services.items()}
+
+    def reset_stats(self):
+        for svc in self.services.values():
+            svc.reset_stats()
+
+
+def install(default: Profile = None, profiles: dict = None, tables: dict = None, textract_response: dict = None,
+            s3_retain=None, textract_job_s: float = 0.0, textract_job_s_per_page: float = 0.0, kb_build_s: float = 0.0,
+            answer_tokens: int = 100, token_ms: float = 0.0, seed: int = 0) -> StandIns:
+    """
+    Create stand-ins and register them in the app's client registry (app.aws_clients), replacing
+    any real clients. profiles overrides default per service ("s3", "dynamodb", "textract", "bedrock-agent").
+    Textract jobs on real PDFs get a synthetic response with the PDF's page count, with the per-page
+    density of textract_response.
+    """
+    from bench.synthetic import make_textract_response, page_density
+    profiles = profiles or {}
+
+    def profile(service):
+        return profiles.get(service) or default or Profile()
+
+    textract_response = textract_response or make_textract_response(seed=seed)
+    density = page_density(textract_response)
+    s3 = FakeS3(profile("s3"), retain=s3_retain, seed=seed)
+    stand_ins = StandIns(
+        s3,
+        FakeDynamoDB(tables or {}, profile("dynamodb"), seed=seed),
+        FakeTextract(textract_response, profile("textract"), job_s=textract_job_s, job_s_per_page=textract_job_s_per_page,
+                     s3=s3, make_response=lambda pages: make_textract_response(pages=pages, seed=seed, **density), seed=seed),
+        FakeBedrockAgent(profile("bedrock-agent"), build_s=kb_build_s, answer_tokens=answer_tokens, token_ms=token_ms, seed=seed),
+    )
+    for service in ("s3", "textract", "bedrock-agent"):
+        aws_clients.set_client(service, stand_ins[service])
+    aws_clients.set_client("bedrock-agent-runtime", stand_ins["bedrock-agent"])
+    aws_clients.set_client("dynamodb", stand_ins["dynamodb"])
+    aws_clients.set_resource("dynamodb", stand_ins["dynamodb"])
+    return stand_ins
@@ -0,0 +1,49 @@
+# bench/startup.py
+"""
+Cold-start benchmark: time to import app.orchestrator and construct an Orchestrator in a fresh
+interpreter (what a Streamlit session pays), and which heavy modules that pulls in.
+
+    python -m bench.startup --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("pandas", "pptx", "openpyxl", "numpy")
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import app.orchestrator
+t1 = time.perf_counter()
+app.orchestrator.Orchestrator()
+t2 = time.perf_counter()
+print(json.dumps({"import_s": t1 - t0, "construct_s": t2 - t1, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    samples = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, "-c", PROBE], cwd=root, env=env, capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    imports = [s["import_s"] * 1000 for s in samples]
+    constructs = [s["construct_s"] * 1000 for s in samples]
+    print(f"runs={args.runs}")
+    print(f"import   median={statistics.median(imports):.1f} ms min={min(imports):.1f} ms")
+    print(f"construct median={statistics.median(constructs):.1f} ms min={min(constructs):.1f} ms")
+    print(f"heavy modules loaded: {', '.join(samples[-1]['loaded']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
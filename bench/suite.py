@@ -0,0 +1,325 @@
+# bench/suite.py
+"""
+Offline benchmark suite: the parsers, batch ingest and recon run against the in-process AWS
+stand-ins (bench.fakes) on synthetic workloads (bench.synthetic) whose size scales with --scale.
+Per scenario it reports throughput, p50/p99 latency over the timed iterations and peak traced
+memory -- measured in one extra iteration under tracemalloc, so its overhead stays out of the
+timings -- and writes the run as JSON for bench.compare.
+
+    python -m bench.suite --scale 1 --repeat 5 --out base.json
+    python -m bench.suite --only ingest_batch,recon --latency-ms 20 --service dynamodb=8:0.01 --out new.json
+    python -m bench.compare base.json new.json
+
+--service SERVICE=LATENCY_MS[:THROTTLE_RATE[:MAX_RPS]] overrides the default profile of one service;
+the app's own limits come from AWS_RATE_LIMITS as in production (see app.rate_limit).
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("S3_BUCKET", "bench-bucket")
+os.environ.setdefault("DYNAMODB_TABLE_FILES", "bench-files")
+os.environ.setdefault("DYNAMODB_TABLE_CHUNKS", "bench-chunks")
+os.environ.setdefault("DYNAMODB_TABLE_RECON", "bench-recon")
+os.environ.setdefault("KB_SYNC_DEBOUNCE_S", "0")
+os.environ.setdefault("KB_SYNC_POLL_INTERVAL_S", "0.05")
+os.environ.setdefault("METRICS_EXPORTERS", "")
+
+from app import rate_limit
+from bench import fakes
+from bench.synthetic import make_textract_response, write_xlsx, write_csv, write_pptx, write_pdf, write_recon_pair
+
+BUCKET = os.environ["S3_BUCKET"]
+KB_ID = "kb-bench"
+
+
+def tables() -> dict:
+    from app import dynamo_client
+    return {
+        dynamo_client.TABLE_FILES: {"key": ("use_case", "file_id"), "indexes": {dynamo_client.FILES_SHA256_INDEX: ("sha256", "use_case")}},
+        # chunk items are write-only for the benchmarks; keeping them would only measure the stand-in
+        dynamo_client.TABLE_CHUNKS: {"key": ("use_case", "chunk_id"), "retain": False},
+        dynamo_client.TABLE_RECON: {"key": ("use_case", "recon_id")},
+    }
+
+
+def _retain(key: str) -> bool:
+    return "/kb_chunks/" not in key and "/kb_offsets/" not in key and "/structured_rows/" not in key
+
+
+def _check(res: dict):
+    errors = [f"{r['filename']}: {r['error']}" for r in res["files"] if r["status"] == "error"]
+    if errors:
+        raise RuntimeError("ingest failed: " + "; ".join(errors))
+
+
+# Scenarios: setup(args, workdir) -> (run, unit). run() performs one iteration and returns the
+# number of units it processed, or (units, {name: value}) for extra per-iteration measurements.
+
+def xlsx_parse(args, workdir):
+    from app.structured_adapter import excel_to_row_chunks
+    path = write_xlsx(os.path.join(workdir, "rows.xlsx"), rows=int(10000 * args.scale), cols=10, sheets=2)
+    return (lambda: len(excel_to_row_chunks(path, BUCKET, "bench", "batch-bench", upload_rows=False))), "rows"
+
+
+def csv_parse(args, workdir):
+    from app.structured_adapter import excel_to_row_chunks
+    path = write_csv(os.path.join(workdir, "rows.csv"), rows=int(50000 * args.scale), cols=10)
+    return (lambda: len(excel_to_row_chunks(path, BUCKET, "bench", "batch-bench", upload_rows=False))), "rows"
+
+
+def pptx_parse(args, workdir):
+    from app.pptx_parser import extract_chunks_from_pptx
+    path = write_pptx(os.path.join(workdir, "deck.pptx"), slides=int(50 * args.scale))
+    return (lambda: len(extract_chunks_from_pptx(path, f"s3://{BUCKET}/deck.pptx"))), "chunks"
+
+
+def textract_parse(args, workdir):
+    from app.textract_processor import extract_chunks_from_textract_response
+    resp = make_textract_response(pages=max(int(20 * args.scale), 1))
+
+    def run():
+        extract_chunks_from_textract_response(resp, f"s3://{BUCKET}/doc.pdf")
+        return len(resp["Blocks"])
+    return run, "blocks"
+
+
+def ingest_batch(args, workdir):
+    from app.orchestrator import Orchestrator
+    files = [
+        (write_xlsx(os.path.join(workdir, "ingest.xlsx"), rows=int(2000 * args.scale), cols=8, sheets=2), "ingest.xlsx"),
+        (write_csv(os.path.join(workdir, "ingest.csv"), rows=int(5000 * args.scale), cols=8), "ingest.csv"),
+        (write_pptx(os.path.join(workdir, "ingest.pptx"), slides=int(20 * args.scale)), "ingest.pptx"),
+        (write_pdf(os.path.join(workdir, "ingest.pdf"), pages=max(int(10 * args.scale), 1)), "ingest.pdf"),
+    ]
+    orc = Orchestrator()
+    n = iter(range(sys.maxsize))
+
+    def run():
+        # a fresh use case per iteration, so dedup and incremental re-ingest do not short-circuit
+        # under throttling files and chunks may fail; they are reported, not fatal
+        res = orc.ingest_batch(f"bench-ingest-{next(n)}", KB_ID, files, "bench")
+        return res["num_chunks"], {
+            "failed_files": sum(r["status"] == "error" for r in res["files"]),
+            "failed_chunks": sum(len(r["failed_chunks"]) for r in res["files"]),
+            "kb_sync_wait_ms": res["timings"]["sync_wait_s"] * 1000,
+        }
+    return run, "chunks"
+
+
+# A long scanned PDF: compare TEXTRACT_SEGMENT_PAGES / TEXTRACT_MAX_CONCURRENT_JOBS settings
+# (TEXTRACT_SEGMENT_PAGES=0 is a single job); Textract time grows with --textract-job-s-per-page.
+def pdf_ingest(args, workdir):
+    from app.orchestrator import Orchestrator
+    path = write_pdf(os.path.join(workdir, "statement.pdf"), pages=max(int(200 * args.scale), 1))
+    orc = Orchestrator()
+    n = iter(range(sys.maxsize))
+
+    def run():
+        res = orc.ingest_batch(f"bench-pdf-{next(n)}", KB_ID, [(path, "statement.pdf")], "bench", wait_build=False)
+        _check(res)
+        return res["num_chunks"]
+    return run, "chunks"
+
+
+def _ingested_use_case(args, workdir, orc, files):
+    use_case = "bench-recon"
+    res = orc.ingest_batch(use_case, KB_ID, files, "bench")
+    _check(res)
+    return use_case, res["batch_ids"]
+
+
+def recon(args, workdir):
+    from app.orchestrator import Orchestrator
+    orc = Orchestrator()
+    path = write_csv(os.path.join(workdir, "recon.csv"), rows=int(1000 * args.scale), cols=6)
+    use_case, batch_ids = _ingested_use_case(args, workdir, orc, [(path, "recon.csv")])
+
+    def run():
+        orc.query_kb_and_reconcile(use_case, KB_ID, "Reconcile the ledger against the bank statement", batch_ids, use_cache=False)
+        return 1
+    return run, "queries"
+
+
+def recon_stream(args, workdir):
+    from app.orchestrator import Orchestrator
+    orc = Orchestrator()
+    path = write_csv(os.path.join(workdir, "recon.csv"), rows=int(1000 * args.scale), cols=6)
+    use_case, batch_ids = _ingested_use_case(args, workdir, orc, [(path, "recon.csv")])
+
+    def run():
+        t0 = time.perf_counter()
+        ttft = None
+        for event in orc.query_kb_and_reconcile_stream(use_case, KB_ID, "Reconcile the ledger against the bank statement", batch_ids, use_cache=False):
+            if ttft is None and event["type"] == "text":
+                ttft = time.perf_counter() - t0
+        return 1, {"ttft_ms": (ttft or 0.0) * 1000}
+    return run, "queries"
+
+
+def recon_rules(args, workdir):
+    from app.orchestrator import Orchestrator
+    orc = Orchestrator()
+    ledger, bank, rules = write_recon_pair(workdir, rows=int(5000 * args.scale))
+    use_case, batch_ids = _ingested_use_case(args, workdir, orc, [(ledger, "ledger.xlsx"), (bank, "bank.csv")])
+
+    def run():
+        res = orc.reconcile_structured(use_case, KB_ID, batch_ids, rules)
+        summary = res["record"]["summary"]
+        return summary["left_rows"] + summary["right_rows"], {"exceptions": summary["exceptions"]}
+    return run, "rows"
+
+
+SCENARIOS = {
+    "xlsx_parse": xlsx_parse,
+    "csv_parse": csv_parse,
+    "pptx_parse": pptx_parse,
+    "textract_parse": textract_parse,
+    "ingest_batch": ingest_batch,
+    "pdf_ingest": pdf_ingest,
+    "recon": recon,
+    "recon_stream": recon_stream,
+    "recon_rules": recon_rules,
+}
+
+
+def percentile(values: list, q: float) -> float:
+    # nearest rank, so p99 of a handful of runs is their maximum rather than an interpolation
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+def _split(out):
+    return out if isinstance(out, tuple) else (out, {})
+
+
+def run_scenario(name: str, args, stand_ins_factory) -> dict:
+    with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as workdir:
+        stand_ins = stand_ins_factory()
+        run, unit = SCENARIOS[name](args, workdir)
+        for _ in range(args.warmup):
+            run()
+        stand_ins.reset_stats()
+        limits_before = rate_limit.stats()
+
+        times, units, extras = [], [], {}
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            n, extra = _split(run())
+            times.append(time.perf_counter() - t0)
+            units.append(n)
+            for k, v in extra.items():
+                extras.setdefault(k, []).append(v)
+        api = {svc: {k: v for k, v in s.items() if k != "by_operation"} for svc, s in stand_ins.stats().items() if s["calls"]}
+        # time the app spent pacing itself (AWS_RATE_LIMITS) and backing off from throttles
+        for svc, s in rate_limit.stats().items():
+            if svc in api:
+                before = limits_before.get(svc, {})
+                api[svc].update({k: round(s[k] - before.get(k, 0), 3) for k in ("rate_wait_s", "backoff_s", "gave_up")})
+
+        peak = None
+        if args.memory:
+            tracemalloc.start()
+            try:
+                run()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+    ms = [t * 1000 for t in times]
+    return {
+        "unit": unit,
+        "iterations": len(times),
+        "units_per_iteration": statistics.mean(units),
+        "throughput": sum(units) / sum(times) if sum(times) else 0.0,
+        "p50_ms": percentile(ms, 50),
+        "p99_ms": percentile(ms, 99),
+        "mean_ms": statistics.mean(ms),
+        "min_ms": min(ms),
+        "peak_mem_mb": round(peak / 2 ** 20, 2) if peak is not None else None,
+        "api": api,
+        "extra": {k: {"p50": percentile(v, 50), "p99": percentile(v, 99)} for k, v in extras.items()},
+    }
+
+
+def _service_profile(spec: str):
+    service, _, values = spec.partition("=")
+    parts = [float(v) for v in values.split(":")] if values else []
+    return service, fakes.Profile(*parts[:1], 0.0, *parts[1:3])
+
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", help=f"comma-separated scenarios ({', '.join(SCENARIOS)})")
+    parser.add_argument("--scale", type=float, default=1.0, help="workload size multiplier")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the traced peak-memory iteration")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="default per-call latency of every service")
+    parser.add_argument("--jitter-ms", type=float, default=1.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--service", action="append", default=[], help="SERVICE=LATENCY_MS[:THROTTLE_RATE[:MAX_RPS]]")
+    parser.add_argument("--textract-job-s", type=float, default=0.0, help="time a Textract job stays IN_PROGRESS")
+    parser.add_argument("--textract-job-s-per-page", type=float, default=0.005, help="additional job time per analysed page")
+    parser.add_argument("--kb-build-s", type=float, default=0.0)
+    parser.add_argument("--token-ms", type=float, default=1.0, help="generation time per answer token")
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.only.split(",")] if args.only else list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    default = fakes.Profile(args.latency_ms, args.jitter_ms, args.throttle_rate)
+    profiles = dict(_service_profile(s) for s in args.service)
+    for p in profiles.values():
+        p.jitter_ms = args.jitter_ms
+    # served for PDFs the stand-in cannot read; its per-page density is reused for real PDFs
+    textract_response = make_textract_response(pages=max(int(10 * args.scale), 1), lines_per_page=20, tables_per_page=1, rows=10, cols=5)
+
+    def stand_ins_factory():
+        return fakes.install(default, profiles, tables(), textract_response, s3_retain=_retain,
+                             textract_job_s=args.textract_job_s, textract_job_s_per_page=args.textract_job_s_per_page, kb_build_s=args.kb_build_s, token_ms=args.token_ms)
+
+    results = {}
+    print(f"{'scenario':<16}{'throughput':>16} {'unit':<8}{'p50 ms':>10}{'p99 ms':>10}{'peak MB':>10}")
+    for name in names:
+        r = results[name] = run_scenario(name, args, stand_ins_factory)
+        peak = f"{r['peak_mem_mb']:.1f}" if r["peak_mem_mb"] is not None else "-"
+        print(f"{name:<16}{r['throughput']:>16,.1f} {r['unit'] + '/s':<8}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{peak:>10}")
+
+    if args.out:
+        run = {
+            "meta": {
+                "created_at": int(time.time()),
+                "git_rev": _git_rev(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "args": vars(args),
+            },
+            "scenarios": results,
+        }
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# bench/synthetic.py
+"""
+Synthetic workloads for the benchmarks. Sizes are parameters so the same generators
+serve quick local runs and large-document runs.
+"""
+import random
+
+
+def make_textract_response(pages: int = 10, lines_per_page: int = 40, tables_per_page: int = 2,
+                           rows: int = 30, cols: int = 8, words_per_cell: int = 2, seed: int = 0) -> dict:
+    """
+    Build a get_document_analysis-shaped response: PAGE, LINE and WORD blocks plus TABLE/CELL
+    blocks whose CHILD relationships point at WORD blocks. Cell order inside a table is shuffled,
+    as it is in real responses.
+    """
+    rnd = random.Random(seed)
+    blocks = []
+    counter = 0
+
+    def next_id():
+        nonlocal counter
+        counter += 1
+        return f"b-{counter:08d}"
+
+    def geometry():
+        return {"BoundingBox": {"Width": rnd.random(), "Height": rnd.random(), "Left": rnd.random(), "Top": rnd.random()}}
+
+    for page in range(1, pages + 1):
+        page_block = {"Id": next_id(), "BlockType": "PAGE", "Page": page, "Geometry": geometry(), "Relationships": [{"Type": "CHILD", "Ids": []}]}
+        blocks.append(page_block)
+        for i in range(lines_per_page):
+            words = [{"Id": next_id(), "BlockType": "WORD", "Text": f"word{page}-{i}-{k}", "Page": page, "Confidence": 99.0, "Geometry": geometry()} for k in range(3)]
+            line = {"Id": next_id(), "BlockType": "LINE", "Text": " ".join(w["Text"] for w in words), "Page": page,
+                    "Confidence": 99.0, "Geometry": geometry(), "Relationships": [{"Type": "CHILD", "Ids": [w["Id"] for w in words]}]}
+            page_block["Relationships"][0]["Ids"].append(line["Id"])
+            blocks.append(line)
+            blocks.extend(words)
+        for _ in range(tables_per_page):
+            cells = []
+            for r in range(1, rows + 1):
+                for c in range(1, cols + 1):
+                    words = [{"Id": next_id(), "BlockType": "WORD", "Text": f"{r * 1000 + c}.{k}", "Page": page, "Geometry": geometry()} for k in range(words_per_cell)]
+                    blocks.extend(words)
+                    cells.append({"Id": next_id(), "BlockType": "CELL", "RowIndex": r, "ColumnIndex": c, "Page": page, "Geometry": geometry(),
+                                  "Relationships": [{"Type": "CHILD", "Ids": [w["Id"] for w in words]}]})
+            rnd.shuffle(cells)
+            blocks.append({"Id": next_id(), "BlockType": "TABLE", "Page": page, "Geometry": geometry(),
+                           "Relationships": [{"Type": "CHILD", "Ids": [cell["Id"] for cell in cells]}]})
+            blocks.extend(cells)
+    return {"JobStatus": "SUCCEEDED", "DocumentMetadata": {"Pages": pages}, "Blocks": blocks}
+
+
+def page_density(resp: dict) -> dict:
+    """make_textract_response size arguments that reproduce the per-page content of a response made by it."""
+    blocks = resp["Blocks"]
+    pages = max(resp.get("DocumentMetadata", {}).get("Pages", 1), 1)
+    tables = [b for b in blocks if b["BlockType"] == "TABLE"]
+    cells = [b for b in blocks if b["BlockType"] == "CELL"]
+    density = {"lines_per_page": sum(b["BlockType"] == "LINE" for b in blocks) // pages, "tables_per_page": len(tables) // pages}
+    if cells:
+        density.update(rows=max(c["RowIndex"] for c in cells), cols=max(c["ColumnIndex"] for c in cells),
+                       words_per_cell=len(cells[0]["Relationships"][0]["Ids"]))
+    return density
+
+
+def paginate_response(resp: dict, blocks_per_page: int = 1000):
+    """Split a response into NextToken-style result pages."""
+    blocks = resp["Blocks"]
+    for i in range(0, len(blocks), blocks_per_page):
+        yield {"JobStatus": resp["JobStatus"], "Blocks": blocks[i:i + blocks_per_page]}
+
+
+CURRENCIES = ("USD", "EUR", "GBP")
+
+
+def make_rows(rows: int = 1000, cols: int = 8, seed: int = 0) -> list:
+    """Header plus rows of a ledger-like table: id, date, currency, amount and free-text columns."""
+    rnd = random.Random(seed)
+    header = ["txn_id", "date", "ccy", "amount"] + [f"field_{c}" for c in range(max(cols - 4, 0))]
+    out = [header]
+    for r in range(rows):
+        out.append([f"T{r:08d}", f"2024-{r % 12 + 1:02d}-{r % 28 + 1:02d}", CURRENCIES[r % 3], round(rnd.uniform(1, 100000), 2)]
+                   + [f"text {rnd.randrange(10 ** 6)}" for _ in range(len(header) - 4)])
+    return out
+
+
+def write_xlsx(path: str, rows: int = 1000, cols: int = 8, sheets: int = 1, seed: int = 0) -> str:
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    for s in range(sheets):
+        ws = wb.create_sheet(f"Sheet{s + 1}")
+        for values in make_rows(rows, cols, seed + s):
+            ws.append(values)
+    wb.save(path)
+    return path
+
+
+def write_csv(path: str, rows: int = 1000, cols: int = 8, seed: int = 0) -> str:
+    import csv
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(make_rows(rows, cols, seed))
+    return path
+
+
+def write_pdf(path: str, pages: int = 100) -> str:
+    """A PDF of blank pages: the Textract stand-in only needs its page count."""
+    from pypdf import PdfWriter
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=612, height=792)
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+
+def write_pptx(path: str, slides: int = 20, text_boxes: int = 3, table_rows: int = 8, table_cols: int = 4, seed: int = 0) -> str:
+    """A deck whose slides each hold text boxes and one table_rows x table_cols table (no table when table_rows is 0)."""
+    from pptx import Presentation
+    from pptx.util import Inches
+    rnd = random.Random(seed)
+    prs = Presentation()
+    layout = prs.slide_layouts[6]  # blank
+    for s in range(slides):
+        slide = prs.slides.add_slide(layout)
+        for t in range(text_boxes):
+            box = slide.shapes.add_textbox(Inches(0.5), Inches(0.3 + t * 0.6), Inches(9), Inches(0.5))
+            box.text_frame.text = f"Slide {s + 1} note {t}: balance {rnd.uniform(1, 10 ** 6):,.2f}"
+        if table_rows:
+            table = slide.shapes.add_table(table_rows, table_cols, Inches(0.5), Inches(2.5), Inches(9), Inches(4)).table
+            for r in range(table_rows):
+                for c in range(table_cols):
+                    table.cell(r, c).text = f"{r * 100 + c}.{rnd.randrange(100)}"
+    prs.save(path)
+    return path
+
+
+def write_recon_pair(directory: str, rows: int = 1000, mismatch_rate: float = 0.02, seed: int = 0):
+    """
+    ledger.xlsx (txn_id, amount, ccy) and bank.csv (reference, value, currency) covering the same
+    transactions, with mismatch_rate of them changed (amount off, or missing from the bank side).
+    Returns (ledger path, bank path, rules) for recon_rules.
+    """
+    import os
+    import csv
+    from openpyxl import Workbook
+    rnd = random.Random(seed)
+    ledger, bank = [["txn_id", "amount", "ccy"]], [["reference", "value", "currency"]]
+    for r in range(rows):
+        amount = round(rnd.uniform(1, 100000), 2)
+        ccy = CURRENCIES[r % 3]
+        ledger.append([f"T{r:08d}", amount, ccy])
+        if rnd.random() < mismatch_rate:
+            if rnd.random() < 0.5:
+                continue
+            amount += 10
+        bank.append([f"t{r:08d}", amount, ccy])
+    ledger_path, bank_path = os.path.join(directory, "ledger.xlsx"), os.path.join(directory, "bank.csv")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Payments")
+    for values in ledger:
+        ws.append(values)
+    wb.save(ledger_path)
+    with open(bank_path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(bank)
+    rules = {
+        "left": {"file": "ledger*.xlsx", "sheet": "Payments", "key": ["txn_id"], "amount": "amount", "currency": "ccy"},
+        "right": {"file": "bank*.csv", "key": ["reference"], "amount": "value", "currency": "currency"},
+        "tolerance": 0.01,
+    }
+    return ledger_path, bank_path, rules
@@ -0,0 +1,45 @@
+# bench/textract_parse.py
+"""
+Micro-benchmark for extract_chunks_from_textract_response on synthetic Textract JSON.
+
+    python -m bench.textract_parse --pages 50 --rows 40 --repeat 5
+"""
+import os
+import argparse
+import statistics
+import time
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from app.textract_processor import extract_chunks_from_textract_response
+from bench.synthetic import make_textract_response, paginate_response
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--lines", type=int, default=40)
+    parser.add_argument("--tables", type=int, default=2)
+    parser.add_argument("--rows", type=int, default=30)
+    parser.add_argument("--cols", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--paged", action="store_true", help="feed the parser NextToken-style pages instead of one response")
+    args = parser.parse_args()
+
+    resp = make_textract_response(args.pages, args.lines, args.tables, args.rows, args.cols)
+    n_blocks = len(resp["Blocks"])
+    timings = []
+    n_chunks = 0
+    for _ in range(args.repeat):
+        source = paginate_response(resp) if args.paged else resp
+        start = time.perf_counter()
+        n_chunks = len(extract_chunks_from_textract_response(source, "s3://bench/doc.pdf"))
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    print(f"blocks={n_blocks} chunks={n_chunks} repeat={args.repeat}")
+    print(f"best={best * 1000:.1f} ms median={statistics.median(timings) * 1000:.1f} ms blocks/s={n_blocks / best:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,24 @@
 # streamlit_app.py
 import os
 import streamlit as st
-import tempfile
 from app.orchestrator import (Orchestrator)
+from app.jobs import JobQueue, file_rows
 
-orc = Orchestrator()
+
+@st.cache_resource
+def get_orchestrator():
+    # One Orchestrator per server process, reused across reruns and sessions
+    return Orchestrator()
+
+
+@st.cache_resource
+def get_job_queue():
+    # Ingestion runs on the queue's workers, never in a session's script thread
+    return JobQueue(get_orchestrator())
+
+
+orc = get_orchestrator()
+jobs = get_job_queue()
 
 st.title("Recon POC — Bedrock KB with chunk metadata (page/table/row/col)")
 
@@ -21,15 +35,25 @@ if uploaded:
         if len(uploaded) > 4:
             st.error("Max 4 files")
         else:
-            out = []
-            for f in uploaded:
-                tmp = tempfile.NamedTemporaryFile(delete=False)
-                tmp.write(f.getbuffer())
-                tmp.flush()
-                res = orc.ingest_file_and_sync(use_case, kb_id, tmp.name, f.name, uploader)
-                out.append(res)
-                tmp.close()
-            st.write(out)
+            # Submit each selection once; widget reruns must not queue it again
+            selection = tuple(f.file_id for f in uploaded)
+            if st.session_state.get("submitted") != selection:
+                st.session_state["submitted"] = selection
+                jobs.submit(use_case, kb_id, [(f, f.name) for f in uploaded], uploader)
+
+
+@st.fragment(run_every="3s")
+def show_jobs():
+    # Progress is read back from the job store, so it survives page refreshes
+    for job in jobs.list_jobs(use_case, limit=5):
+        st.markdown(f"**Job {job['job_id'][:8]}** {job['status']} / {job['stage']} (batch: {job.get('batch_id', '-')})")
+        st.table(file_rows(job))
+        if job.get("error"):
+            st.error(job["error"])
+
+
+st.subheader("Ingestion jobs")
+show_jobs()
 
 st.subheader("Run recon (retrieve & generate via Claude)")
 batch_id = st.text_input("Batch id (leave empty to search whole KB)")
@@ -41,5 +65,23 @@ if st.button("Run Recon"):
     if not kb_id:
         st.error("Provide KB id")
     else:
-        res = orc.query_kb_and_reconcile(use_case, kb_id, user_query, batch_id=batch_id or None, global_template=global_template, usecase_template=usecase_template)
+        # Render the answer as it streams; citations are listed as they arrive
+        events = orc.query_kb_and_reconcile_stream(use_case, kb_id, user_query, batch_id=batch_id or None, global_template=global_template, usecase_template=usecase_template)
+        answer_box, citations_box = st.empty(), st.container()
+        answer = ""
+        for event in events:
+            if event["type"] == "text":
+                answer += event["text"]
+                answer_box.markdown(answer)
+            elif event["type"] == "citation":
+                for ref in event["citation"].get("retrievedReferences", []):
+                    citations_box.caption(((ref.get("location") or {}).get("s3Location") or {}).get("uri") or ref.get("metadata"))
+            elif event["type"] == "done":
+                st.json(event["result"])
+
+if st.button("Run Rules Recon"):
+    if not batch_id:
+        st.error("Provide the batch id of the structured files")
+    else:
+        res = orc.reconcile_structured(use_case, kb_id, batch_id, user_query=user_query, global_template=global_template, usecase_template=usecase_template)
         st.json(res)
@@ -1,8 +1,23 @@
 # streamlit_app.py
 import streamlit as st
 from app.orchestrator import Orchestrator
+from app.jobs import JobQueue, file_rows
 
-orc = Orchestrator()
+
+@st.cache_resource
+def get_orchestrator():
+    # One Orchestrator per server process, reused across reruns and sessions
+    return Orchestrator()
+
+
+@st.cache_resource
+def get_job_queue():
+    # Ingestion runs on the queue's workers, never in a session's script thread
+    return JobQueue(get_orchestrator())
+
+
+orc = get_orchestrator()
+jobs = get_job_queue()
 
 st.title("Recon POC — Bedrock KB")
 
@@ -16,14 +31,22 @@ with tab1:
 
     uploaded = st.file_uploader("Files", accept_multiple_files=True, type=["pdf","pptx","csv","xlsx","png","jpg","jpeg"])
     if uploaded and kb_id:
-        for f in uploaded:
-            import tempfile
-            tmp = tempfile.NamedTemporaryFile(delete=False)
-            tmp.write(f.getbuffer())
-            tmp.flush()
-            res = orc.ingest_file_and_sync(use_case, kb_id, tmp.name, f.name, uploader)
-            st.json(res)
-            tmp.close()
+        # Submit each selection once; widget reruns must not queue it again
+        selection = tuple(f.file_id for f in uploaded)
+        if st.session_state.get("submitted") != selection:
+            st.session_state["submitted"] = selection
+            jobs.submit(use_case, kb_id, [(f, f.name) for f in uploaded], uploader)
+
+    @st.fragment(run_every="3s")
+    def show_jobs():
+        # Progress is read back from the job store, so it survives page refreshes
+        for job in jobs.list_jobs(use_case, limit=5):
+            st.markdown(f"**Job {job['job_id'][:8]}** {job['status']} / {job['stage']} (batch: {job.get('batch_id', '-')})")
+            st.table(file_rows(job))
+            if job.get("error"):
+                st.error(job["error"])
+
+    show_jobs()
 
     st.subheader("Run Recon")
     batch_id = st.text_input("Batch id for recon (optional)")
@@ -31,22 +54,53 @@ with tab1:
     global_template = st.text_area("Global template", value="Always normalize currency.")
     usecase_template = st.text_area("Use-case template", value="Apply payment rules.")
     if st.button("Run Recon"):
-        res = orc.query_kb_and_reconcile(use_case, kb_id, user_query, batch_id or None, global_template, usecase_template)
-        st.json(res)
+        # Render the answer as it streams; citations are listed as they arrive
+        events = orc.query_kb_and_reconcile_stream(use_case, kb_id, user_query, batch_id or None, global_template, usecase_template)
+        answer_box, citations_box = st.empty(), st.container()
+        answer = ""
+        for event in events:
+            if event["type"] == "text":
+                answer += event["text"]
+                answer_box.markdown(answer)
+            elif event["type"] == "citation":
+                for ref in event["citation"].get("retrievedReferences", []):
+                    citations_box.caption(((ref.get("location") or {}).get("s3Location") or {}).get("uri") or ref.get("metadata"))
+            elif event["type"] == "done":
+                st.json(event["result"])
+    if st.button("Run Rules Recon", help="Deterministic rules from RECON_RULES_DIR; the LLM only explains the residual exceptions"):
+        if not batch_id:
+            st.error("Provide the batch id of the structured files")
+        else:
+            res = orc.reconcile_structured(use_case, kb_id, batch_id, user_query=user_query, global_template=global_template, usecase_template=usecase_template)
+            st.json(res)
 
 with tab2:
     st.subheader("Replay Recon Results")
     use_case_replay = st.text_input("Use case id for replay", value="payments_recon")
+    # The listing lives in session state so expanding a recon (a rerun) keeps it on screen
     if st.button("List Recons"):
-        recons = orc.list_recons(use_case_replay)
-        if recons:
-            for rec in recons:
-                st.markdown(f"**Recon {rec['recon_id']}** (Batch: {rec.get('batch_id')})")
-                st.json(rec.get("payload", {}))
-                if "references" in rec.get("payload", {}):
-                    for ref in rec["payload"]["references"]:
-                        if st.button(f"View snippet {ref['kb_chunk_id']}", key=f"{rec['recon_id']}-{ref['kb_chunk_id']}"):
-                            snippet = orc.fetch_reference_snippet(ref)
-                            st.write(snippet)
-        else:
-            st.info("No recon results found.")
+        st.session_state["recons"] = list(orc.list_recons(use_case_replay))
+    recons = st.session_state.get("recons")
+    if recons:
+        for rec in recons:
+            summary = rec.get("summary", {})
+            st.markdown(f"**Recon {rec['recon_id']}** (Batch: {rec.get('batch_id')}, {summary.get('engine', 'llm')}, {summary.get('num_references', '?')} refs)")
+            if summary.get("answer") or summary.get("counts"):
+                st.caption(summary.get("answer") or summary.get("counts"))
+            if st.toggle("Details", key=f"details-{rec['recon_id']}"):
+                payloads = st.session_state.setdefault("recon_payloads", {})
+                if rec["recon_id"] not in payloads:
+                    payloads[rec["recon_id"]] = orc.load_recon(use_case_replay, rec)
+                payload = payloads[rec["recon_id"]]
+                st.json(payload)
+                # rule and LLM references can repeat a chunk (or have none), so keys carry the position
+                for i, ref in enumerate(payload.get("references", [])):
+                    label = ref.get("kb_chunk_id") or (ref.get("metadata") or {}).get("doc_uri") or "reference"
+                    if st.button(f"View snippet {label}", key=f"{rec['recon_id']}-{i}"):
+                        snippet = orc.fetch_reference_snippet(ref, use_case_replay)
+                        st.write(snippet)
+        if st.button("More"):
+            st.session_state["recons"] += list(orc.list_recons(use_case_replay, cursor=recons[-1]["cursor"]))
+            st.rerun()
+    elif recons is not None:
+        st.info("No recon results found.")
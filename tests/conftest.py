@@ -0,0 +1,71 @@
+# tests/conftest.py
+"""
+Tests run offline against the in-process AWS stand-ins from bench.fakes; the aws fixture installs
+a fresh set (tables keep their items) in the client registry for each test.
+"""
+import os
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("S3_BUCKET", "test-bucket")
+os.environ.setdefault("DYNAMODB_TABLE_FILES", "test-files")
+os.environ.setdefault("DYNAMODB_TABLE_CHUNKS", "test-chunks")
+os.environ.setdefault("DYNAMODB_TABLE_RECON", "test-recon")
+os.environ.setdefault("KB_SYNC_DEBOUNCE_S", "0")
+os.environ.setdefault("KB_SYNC_POLL_INTERVAL_S", "0.01")
+os.environ.setdefault("METRICS_EXPORTERS", "")
+
+import pytest
+from botocore.exceptions import EndpointConnectionError
+from bench import fakes
+
+BUCKET = os.environ["S3_BUCKET"]
+KB_ID = "kb-test"
+
+
+def tables() -> dict:
+    from app import dynamo_client
+    return {
+        dynamo_client.TABLE_FILES: {"key": ("use_case", "file_id"), "indexes": {dynamo_client.FILES_SHA256_INDEX: ("sha256", "use_case")}},
+        dynamo_client.TABLE_CHUNKS: {"key": ("use_case", "chunk_id")},
+        dynamo_client.TABLE_RECON: {"key": ("use_case", "recon_id")},
+    }
+
+
+@pytest.fixture
+def aws():
+    from app.kb_packer import load_document
+    load_document.cache_clear()
+    return fakes.install(tables=tables())
+
+
+@pytest.fixture
+def no_retries(monkeypatch):
+    from app import rate_limit
+    monkeypatch.setattr(rate_limit, "AWS_THROTTLE_MAX_RETRIES", 0)
+
+
+@pytest.fixture
+def orc(aws):
+    from app.orchestrator import Orchestrator
+    return Orchestrator()
+
+
+def s3_keys(aws, part: str) -> list:
+    return sorted(k for (_, k) in aws["s3"].objects if f"/{part}/" in k)
+
+
+def chunk_items(aws, use_case: str) -> dict:
+    from app import dynamo_client
+    items = aws["dynamodb"].tables[dynamo_client.TABLE_CHUNKS].items
+    return {cid: it for (uc, cid), it in items.items() if uc == use_case}
+
+
+def unreachable_for(s3, chunk_ids: set):
+    """Make S3 puts of these chunks' objects (and of any packed document) fail with a connection error."""
+    put = s3.put_object
+
+    def put_object(Bucket, Key, **kwargs):
+        if any(Key.endswith(f"/{cid}.json") for cid in chunk_ids) or (chunk_ids and Key.endswith(".txt")):
+            raise EndpointConnectionError(endpoint_url="https://s3.example")
+        return put(Bucket=Bucket, Key=Key, **kwargs)
+    s3.put_object = put_object
@@ -0,0 +1,30 @@
+from conftest import KB_ID
+
+GOOD = b"a,b\n1,x\n2,y\n"
+
+
+def ingest(orc, files):
+    return orc.ingest_batch("uc", KB_ID, files, "me", dedup=False)
+
+
+def test_all_files_ingested(orc):
+    res = ingest(orc, [(GOOD, "a.csv"), (b"a,b\n3,z\n", "b.csv")])
+    assert res["status"] == "uploaded_and_indexed"
+
+
+def test_every_file_errored_is_failed(orc):
+    res = ingest(orc, [(b"not a workbook", "bad.xlsx"), (b"not a deck", "bad.pptx")])
+    assert [r["status"] for r in res["files"]] == ["error", "error"]
+    assert res["status"] == "failed"
+
+
+def test_some_files_errored_is_partial(orc):
+    res = ingest(orc, [(GOOD, "a.csv"), (b"not a deck", "bad.pptx")])
+    assert [r["status"] for r in res["files"]] == ["ingested", "error"]
+    assert res["status"] == "partial"
+
+
+def test_only_duplicates_is_no_new_content(orc):
+    orc.ingest_batch("uc", KB_ID, [(GOOD, "a.csv")], "me")
+    res = orc.ingest_batch("uc", KB_ID, [(GOOD, "a.csv")], "me")
+    assert res["status"] == "no_new_content"
@@ -0,0 +1,29 @@
+from conftest import KB_ID
+from app import aws_clients
+from app.bedrock_kb import BedrockKB
+
+
+class BlockingOnlyRuntime:
+    """A runtime client from a botocore without retrieve_and_generate_stream."""
+    def retrieve_and_generate(self, **params):
+        self.params = params
+        return {"output": {"text": "answer"}, "citations": [{"retrievedReferences": [{"metadata": {"chunk_id": "c1"}}]}]}
+
+
+def test_generation_uses_runtime_client(aws):
+    aws_clients.set_client("bedrock-agent", object())  # the control-plane client has no generation APIs
+    events = list(BedrockKB().retrieve_and_generate_stream(KB_ID, "prompt"))
+    assert events[0]["type"] == "text"
+    assert any(e["type"] == "citation" for e in events)
+    assert aws["bedrock-agent"].stats()["by_operation"]["RetrieveAndGenerateStream"] == 1
+    assert "output" in BedrockKB().retrieve_and_generate(KB_ID, "prompt")
+
+
+def test_stream_falls_back_to_blocking_call():
+    runtime = BlockingOnlyRuntime()
+    events = list(BedrockKB(runtime_client=runtime).retrieve_and_generate_stream(KB_ID, "prompt", retrieval_filters={"equals": {"key": "batch_id", "value": "b"}}))
+    assert events == [
+        {"type": "text", "text": "answer"},
+        {"type": "citation", "citation": {"retrievedReferences": [{"metadata": {"chunk_id": "c1"}}]}},
+    ]
+    assert runtime.params["knowledgeBaseId"] == KB_ID
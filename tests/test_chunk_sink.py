@@ -0,0 +1,33 @@
+from conftest import BUCKET, chunk_items, unreachable_for
+from app.chunk_sink import ChunkSink
+from app.dynamo_client import DynamoClient
+
+
+def chunks(n: int) -> list:
+    return [{"chunk_id": f"c{i}", "text": f"row {i}", "metadata": {"row": i}} for i in range(n)]
+
+
+def test_connection_errors_are_per_chunk_failures(aws, no_retries):
+    unreachable_for(aws["s3"], {"c3"})
+    res = ChunkSink(BUCKET, "uc", "b1", DynamoClient(), max_workers=2).write(chunks(10))
+    assert res["written"] == 9
+    assert [(f["chunk_id"], f["stage"]) for f in res["failed"]] == [("c3", "s3")]
+    assert "c3" not in chunk_items(aws, "uc")
+
+
+def test_dynamodb_connection_errors_are_per_chunk_failures(aws, no_retries):
+    from botocore.exceptions import ReadTimeoutError
+    dynamodb = aws["dynamodb"]
+    batch_write_item = dynamodb.batch_write_item
+
+    def flaky_batch_write_item(RequestItems):
+        ids = {r["PutRequest"]["Item"]["chunk_id"] for reqs in RequestItems.values() for r in reqs}
+        if "c3" in ids:
+            raise ReadTimeoutError(endpoint_url="https://dynamodb.example")
+        return batch_write_item(RequestItems=RequestItems)
+    dynamodb.batch_write_item = flaky_batch_write_item
+    res = ChunkSink(BUCKET, "uc", "b1", DynamoClient(), max_workers=2).write(chunks(30))
+    failed = {f["chunk_id"] for f in res["failed"]}
+    assert "c3" in failed and {f["stage"] for f in res["failed"]} == {"dynamodb"}
+    assert res["written"] == 30 - len(failed)
+    assert set(chunk_items(aws, "uc")) == {f"c{i}" for i in range(30)} - failed
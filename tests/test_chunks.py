@@ -0,0 +1,46 @@
+import pytest
+from app.chunks import ChunkBatch, assign_chunk_ids
+
+CHUNKS = [
+    {"chunk_id": None, "text": f"row {i}", "metadata": {"doc_uri": "s3://b/k.csv", "sheet": "S", "row": i, "note": i % 2 == 0}}
+    for i in range(5)
+]
+
+
+def sample() -> list:
+    return list(assign_chunk_ids([{**c, "metadata": dict(c["metadata"])} for c in CHUNKS], "uc/k.csv"))
+
+
+def test_batch_round_trips_chunks():
+    chunks = sample()
+    batch = ChunkBatch.from_chunks(chunks)
+    assert len(batch) == 5
+    assert list(batch) == chunks
+    assert batch[-1] == chunks[-1]
+    with pytest.raises(IndexError):
+        batch[5]
+
+
+def test_batch_slices_like_a_list():
+    chunks = sample()
+    batch = ChunkBatch.from_chunks(chunks)
+    assert batch[1:3] == chunks[1:3]
+    assert batch[::-2] == chunks[::-2]
+    assert batch[10:] == []
+
+
+def test_batch_stores_chunks_column_wise():
+    batch = ChunkBatch.from_chunks(sample())
+    assert len(batch._ids) == 5 * 16 and len(batch._layouts) == 1
+    assert batch._str_table == [None, "s3://b/k.csv", "S"]
+    assert batch._extras == {i: ({"note": i % 2 == 0}, None) for i in range(5)}
+
+
+def test_batch_keeps_irregular_chunks_exact():
+    odd = [
+        {"chunk_id": "not-hex", "text": "a", "metadata": {"row": None, "flag": True, "sheet": 3}, "s3_uri": "s3://b/a.json"},
+        {"chunk_id": "ab" * 16, "text": "b", "metadata": {"page": True, "doc_uri": None}},
+    ]
+    batch = ChunkBatch.from_chunks(odd)
+    assert list(batch) == odd
+    assert len(batch._layouts) == 2
@@ -0,0 +1,26 @@
+import logging
+from bench import fakes
+from conftest import KB_ID, tables
+from app import dynamo_client
+
+BODY = b"a,b\n1,x\n"
+
+
+def test_duplicate_content_is_linked(orc):
+    first = orc.ingest_file_and_sync("uc", KB_ID, BODY, "a.csv", "me")
+    again = orc.ingest_file_and_sync("uc", KB_ID, BODY, "copy.csv", "me")
+    assert again["status"] == "duplicate"
+    assert again["batch_id"] == first["batch_id"]
+
+
+def test_missing_sha256_index_skips_dedup(aws, caplog):
+    spec = tables()
+    del spec[dynamo_client.TABLE_FILES]["indexes"]
+    fakes.install(tables=spec)
+    from app.orchestrator import Orchestrator
+    orc = Orchestrator()
+    with caplog.at_level(logging.WARNING, logger="recon.dynamo"):
+        first = orc.ingest_file_and_sync("uc", KB_ID, BODY, "a.csv", "me")
+        again = orc.ingest_file_and_sync("uc", KB_ID, BODY, "a.csv", "me")
+    assert first["status"] == again["status"] == "uploaded_and_indexed"
+    assert len([r for r in caplog.records if "dedup disabled" in r.getMessage()]) == 1
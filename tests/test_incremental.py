@@ -0,0 +1,72 @@
+import pytest
+from conftest import BUCKET, KB_ID, s3_keys, chunk_items
+from app.incremental import ChunkDiff
+
+V1 = b"a,b\n1,x\n2,y\n3,z\n"
+V2 = b"a,b\n1,x\n2,Y\n3,z\n4,w\n"
+
+
+def ingest(orc, body, filename="t.csv", **kwargs):
+    return orc.ingest_file_and_sync("uc", KB_ID, body, filename, "me", dedup=False, **kwargs)
+
+
+def test_new_version_diffs_against_manifest(orc, aws):
+    first = ingest(orc, V1, incremental=True, doc_key="statement")
+    assert (first["added"], first["unchanged"], first["removed"]) == (3, 0, 0)
+    second = ingest(orc, V2, incremental=True, doc_key="statement")
+    assert (second["added"], second["unchanged"], second["removed"]) == (2, 2, 1)
+    assert second["num_chunks"] == 4
+    assert len(chunk_items(aws, "uc")) == 4
+    assert set(second["batch_ids"]) == {first["batch_id"], second["batch_id"]}
+
+    same = ingest(orc, V2, incremental=True, doc_key="statement")
+    assert same["status"] == "unchanged"
+    assert (same["added"], same["removed"]) == (0, 0)
+
+
+def test_same_filename_is_not_a_new_version_by_default(orc, aws):
+    alice = ingest(orc, V1)
+    bob = ingest(orc, b"a,b\n9,q\n")
+    assert bob["removed"] == 0
+    assert len(chunk_items(aws, "uc")) == alice["num_chunks"] + bob["num_chunks"]
+
+
+def test_incremental_requires_doc_key(orc):
+    with pytest.raises(ValueError):
+        ingest(orc, V1, incremental=True)
+
+
+def test_batch_threads_doc_key_per_file(orc, aws):
+    orc.ingest_batch("uc", KB_ID, [(V1, "t.csv", "statement")], "me", dedup=False, incremental=True)
+    res = orc.ingest_batch("uc", KB_ID, [(V2, "t.csv", "statement"), (b"a,b\n9,q\n", "t.csv")], "me", dedup=False, incremental=True)
+    versioned, unrelated = res["files"]
+    assert (versioned["added"], versioned["unchanged"], versioned["removed"]) == (2, 2, 1)
+    assert (unrelated["added"], unrelated["removed"]) == (1, 0)
+    with pytest.raises(ValueError):
+        orc.ingest_batch("uc", KB_ID, [(V1, "a.csv", "k"), (V2, "b.csv", "k")], "me", incremental=True)
+
+
+def test_filter_and_delete_removed(aws):
+    from app.dynamo_client import DynamoClient
+    dyn = DynamoClient()
+    s3 = aws["s3"]
+    diff = ChunkDiff(BUCKET, "uc", "doc").load()
+    chunks = [{"chunk_id": c, "text": c, "metadata": {}} for c in ("a", "b", "c")]
+    assert [ch["chunk_id"] for ch in diff.filter(chunks)] == ["a", "b", "c"]
+    for cid in "abc":
+        s3.put_object(Bucket=BUCKET, Key=f"usecase/uc/kb_chunks/b1/{cid}.json", Body=b"{}")
+    dyn.put_chunks("uc", chunks)
+    diff.save("b1", "sha-1", prefixes=["kb_chunks"])
+
+    diff = ChunkDiff(BUCKET, "uc", "doc").load()
+    assert diff.sha256 == "sha-1"
+    new = [{"chunk_id": c, "text": c, "metadata": {}} for c in ("a", "c", "d")]
+    assert [ch["chunk_id"] for ch in diff.filter(new)] == ["d"]
+    assert diff.removed() == ["b"]
+    assert diff.unchanged() == 2
+    manifest = diff.save("b2", "sha-2", failed_ids=["d"])
+    assert manifest == {"a": "b1", "c": "b1"}
+    res = diff.delete_removed(dyn)
+    assert res == {"removed": 1, "failed": []}
+    assert s3_keys(aws, "kb_chunks") == ["usecase/uc/kb_chunks/b1/a.json", "usecase/uc/kb_chunks/b1/c.json"]
+    assert sorted(chunk_items(aws, "uc")) == ["a", "c"]
@@ -0,0 +1,67 @@
+import time
+import pytest
+from conftest import KB_ID
+from app.jobs import JobQueue, SQLiteJobStore, file_rows
+
+
+class FlakyStore(SQLiteJobStore):
+    """Fails the first status update, like a store that is briefly unreachable."""
+    def __init__(self, path):
+        super().__init__(path)
+        self.failures = 1
+
+    def update(self, job_id, fields):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("store unavailable")
+        super().update(job_id, fields)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteJobStore(str(tmp_path / "jobs.sqlite"))
+
+
+def wait_done(queue, job_id, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job still {job['status']}")
+
+
+def test_job_succeeds(orc, store):
+    queue = JobQueue(orc, store)
+    job = wait_done(queue, queue.submit("uc", KB_ID, [(b"a,b\n1,x\n", "a.csv")], "me", dedup=False))
+    assert (job["status"], job["stage"]) == ("succeeded", "done")
+    assert file_rows(job) == [{"file": "a.csv", "stage": "ingested", "chunks": 1}]
+
+
+def test_job_with_every_file_failing_is_failed(orc, store):
+    queue = JobQueue(orc, store)
+    job = wait_done(queue, queue.submit("uc", KB_ID, [(b"not a deck", "bad.pptx")], "me"))
+    assert job["status"] == "failed"
+    assert file_rows(job)[0]["stage"] == "error"
+    assert "bad.pptx" in job["error"]
+
+
+def test_job_with_some_files_failing_is_partial(orc, store):
+    queue = JobQueue(orc, store)
+    job = wait_done(queue, queue.submit("uc", KB_ID, [(b"a,b\n1,x\n", "a.csv"), (b"not a deck", "bad.pptx")], "me", dedup=False))
+    assert job["status"] == "partial"
+
+
+def test_uploads_with_the_same_name_keep_their_own_progress(orc, store):
+    queue = JobQueue(orc, store)
+    files = [(b"a,b\n1,x\n", "a.csv"), (b"a,b\n1,x\n2,y\n3,z\n", "a.csv"), (b"a,b\n1,x\n2,y\n", "a.csv")]
+    job = wait_done(queue, queue.submit("uc", KB_ID, files, "me", dedup=False))
+    assert [(r["file"], r["stage"], r["chunks"]) for r in file_rows(job)] == [("a.csv", "ingested", 1), ("a.csv", "ingested", 3), ("a.csv", "ingested", 2)]
+
+
+def test_job_crash_is_recorded(orc, tmp_path):
+    queue = JobQueue(orc, FlakyStore(str(tmp_path / "jobs.sqlite")))
+    job = wait_done(queue, queue.submit("uc", KB_ID, [(b"a,b\n1,x\n", "a.csv")], "me"))
+    assert job["status"] == "failed"
+    assert job["error"] == "store unavailable"
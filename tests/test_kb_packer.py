@@ -0,0 +1,95 @@
+import json
+from conftest import BUCKET, s3_keys, chunk_items, unreachable_for
+from app.chunk_sink import ChunkSink
+from app.dynamo_client import DynamoClient
+from app.incremental import ChunkDiff
+from app.kb_packer import build_document, expand_references, prune_document, offsets_key
+
+
+def read(aws, key: str) -> bytes:
+    return aws["s3"].objects[(BUCKET, key)]
+
+
+def rows(n: int, sheet: str = "Payments") -> list:
+    return [{"chunk_id": f"{sheet}-{i}", "text": json.dumps({"id": i, "amount": i * 10}), "metadata": {"doc_uri": "s3://src/a.xlsx", "sheet": sheet, "row": i}}
+            for i in range(1, n + 1)]
+
+
+def pack(aws, chunk_list, target_bytes=4096):
+    sink = ChunkSink(BUCKET, "uc", "b1", DynamoClient(), max_workers=2, pack_bytes=target_bytes)
+    return sink.write(chunk_list)
+
+
+def test_offsets_cover_each_chunk_line():
+    text, entries, attrs = build_document(rows(3))
+    assert [text[e["start"]:e["end"]] for e in entries] == text.split("\n")
+    assert text.split("\n")[1] == 'sheet=Payments row=2: {"id": 2, "amount": 20}'
+    assert (attrs["row_start"], attrs["row_end"], attrs["sheet"], attrs["chunks"]) == (1, 3, "Payments", 3)
+
+
+def test_packs_by_group_and_target_size(aws):
+    res = pack(aws, rows(100) + rows(5, sheet="Refunds"), target_bytes=1024)
+    assert res["written"] == 105 and not res["failed"]
+    docs = [k for k in s3_keys(aws, "kb_chunks") if k.endswith(".txt")]
+    assert len(docs) == len(res["documents"]) > 2
+    for doc in docs:
+        text = read(aws, doc).decode("utf-8")
+        entries = json.loads(read(aws, offsets_key(doc)))["chunks"]
+        attrs = json.loads(read(aws, doc + ".metadata.json"))["metadataAttributes"]
+        assert len({e["sheet"] for e in entries}) == 1
+        assert attrs["batch_id"] == "b1" and attrs["chunks"] == len(entries)
+        for e in entries:
+            assert text[e["start"]:e["end"]].startswith(f"sheet={e['sheet']} row={e['row']}: ")
+    items = chunk_items(aws, "uc")
+    assert items["Payments-7"]["chunk"]["metadata"]["kb_document"].endswith(".txt")
+
+
+def test_passage_resolves_to_exact_rows(aws):
+    pack(aws, rows(20))
+    doc = next(k for k in s3_keys(aws, "kb_chunks") if k.endswith(".txt"))
+    text = read(aws, doc).decode("utf-8")
+    start = text.index("row=5:")
+    passage = text[start:text.index("row=6:") + 10]
+    refs = expand_references([{"kb_chunk_id": f"s3://{BUCKET}/{doc}", "metadata": {"batch_id": "b1"}, "content": passage}])
+    assert [(r["kb_chunk_id"], r["metadata"]["row"]) for r in refs] == [("Payments-5", 5), ("Payments-6", 6)]
+
+    unplaced = expand_references([{"kb_chunk_id": f"s3://{BUCKET}/{doc}", "metadata": {"row_start": 1}, "content": "not in the document"}])
+    assert unplaced == [{"kb_chunk_id": f"s3://{BUCKET}/{doc}", "metadata": {"row_start": 1}}]
+
+
+def test_prune_rewrites_and_deletes_documents(aws):
+    res = pack(aws, rows(4))
+    (doc, cids), = res["documents"].items()
+    assert prune_document(aws["s3"], BUCKET, doc, {"Payments-2"}) == ["Payments-1", "Payments-3", "Payments-4"]
+    text = read(aws, doc).decode("utf-8")
+    entries = json.loads(read(aws, offsets_key(doc)))["chunks"]
+    assert "row=2:" not in text
+    assert [text[e["start"]:e["end"]] for e in entries] == text.split("\n")
+    assert json.loads(read(aws, doc + ".metadata.json"))["metadataAttributes"]["chunks"] == 3
+
+    assert prune_document(aws["s3"], BUCKET, doc, set(cids)) == []
+    assert s3_keys(aws, "kb_chunks") == [] and s3_keys(aws, "kb_offsets") == []
+
+
+def test_incremental_removal_prunes_packed_document(aws):
+    dyn = DynamoClient()
+    diff = ChunkDiff(BUCKET, "uc", "doc").load()
+    res = pack(aws, list(diff.filter(rows(4))))
+    diff.save("b1", "sha-1", documents=res["documents"])
+
+    diff = ChunkDiff(BUCKET, "uc", "doc").load()
+    list(diff.filter(rows(4)[:3]))
+    manifest = diff.save("b2", "sha-2")
+    assert diff.delete_removed(dyn) == {"removed": 1, "failed": []}
+    (doc, kept), = json.loads(read(aws, diff.key))["documents"].items()
+    assert kept == ["Payments-1", "Payments-2", "Payments-3"] and sorted(manifest) == kept
+    assert "row=4:" not in read(aws, doc).decode("utf-8")
+    assert "Payments-4" not in chunk_items(aws, "uc")
+
+
+def test_connection_error_fails_every_chunk_of_the_document(aws, no_retries):
+    unreachable_for(aws["s3"], {"any"})
+    res = pack(aws, rows(3))
+    assert res["written"] == 0
+    assert sorted(f["chunk_id"] for f in res["failed"]) == ["Payments-1", "Payments-2", "Payments-3"]
+    assert res["documents"] == {}
@@ -0,0 +1,45 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from conftest import KB_ID
+from app import metrics
+
+
+def test_spans_and_counters_reach_the_trace_across_threads():
+    with metrics.trace("t") as tr:
+        with metrics.span("stage"):
+            metrics.count("items", 2)
+        with ThreadPoolExecutor(2) as pool:
+            for _ in range(3):
+                pool.submit(contextvars.copy_context().run, metrics.count, "items")
+        assert list(metrics.timed(iter(range(4)), "produce")) == [0, 1, 2, 3]
+    s = tr.summary()
+    assert s["counters"] == {"items": 5}
+    assert (s["spans"]["stage"]["count"], s["spans"]["produce"]["count"]) == (1, 1)
+    metrics.count("outside")  # no active trace: a no-op
+
+
+def test_traces_go_to_the_exporters(monkeypatch):
+    monkeypatch.setattr(metrics, "_exporters", [])
+    memory = metrics.add_exporter(metrics.InMemoryExporter())
+    prom = metrics.add_exporter(metrics.PrometheusExporter())
+    for _ in range(2):
+        with metrics.trace("ingest"):
+            with metrics.span("upload"):
+                metrics.count("chunks", 10)
+    assert [t["counters"] for t in memory.traces] == [{"chunks": 10}] * 2
+    text = prom.render()
+    assert 'recon_trace_seconds_count{trace="ingest"} 2' in text
+    assert 'recon_span_seconds_count{trace="ingest",span="upload"} 2' in text
+    assert 'recon_events_total{trace="ingest",name="chunks"} 20' in text
+
+
+def test_stage_breakdown_is_returned_and_persisted(orc):
+    ingest = orc.ingest_file_and_sync("uc", KB_ID, b"a,b\n1,x\n2,y\n", "t.csv", "me", dedup=False)
+    assert ingest["metrics"]["counters"]["files"] == 1
+    assert {"hash", "upload", "parse", "parse_persist"} <= set(ingest["metrics"]["spans"])
+
+    recon = orc.query_kb_and_reconcile("uc", KB_ID, "what differs?", batch_id=ingest["batch_id"], use_cache=False)
+    assert "generate" in recon["metrics"]["spans"]
+    item = next(orc.list_recons("uc", limit=1))
+    stored = orc.load_recon("uc", item)["metrics"]
+    assert stored["trace"] == "recon" and "generate" in stored["spans"]
@@ -0,0 +1,41 @@
+import pytest
+from conftest import BUCKET
+from bench.synthetic import write_xlsx, write_pptx
+from app import parse_pool
+from app.chunks import assign_chunk_ids
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(parse_pool, "PARSE_WORKERS", 2)
+    yield parse_pool
+    parse_pool.shutdown()
+
+
+def same_chunks(chunks) -> list:
+    # parsers draw random chunk ids; the deterministic ones depend only on content and position
+    return list(assign_chunk_ids(list(chunks), "uc/doc"))
+
+
+def test_sharded_workbook_matches_in_process(pool, tmp_path):
+    path = write_xlsx(str(tmp_path / "book.xlsx"), rows=40, cols=4, sheets=3)
+    options = {"file_name": "book.xlsx", "doc_uri": f"s3://{BUCKET}/book.xlsx"}
+    with open(path, "rb") as f:
+        sharded = same_chunks(pool.workbook_chunks(f, BUCKET, "uc", "b1", **options))
+    assert pool._pool is not None
+    with open(path, "rb") as f:
+        local = same_chunks(pool.workbook_chunks(f, BUCKET, "uc", "b1", workers=0, **options))
+    assert len({ch["metadata"]["sheet"] for ch in local}) == 3
+    assert sharded == local
+
+
+def test_sharded_deck_matches_in_process(pool, tmp_path):
+    path = write_pptx(str(tmp_path / "deck.pptx"), slides=7, table_rows=3)
+    uri = f"s3://{BUCKET}/deck.pptx"
+    with open(path, "rb") as f:
+        sharded = same_chunks(pool.pptx_chunks(f, uri, shard_slides=2))
+    assert pool._pool is not None
+    with open(path, "rb") as f:
+        local = same_chunks(pool.pptx_chunks(f, uri, workers=0))
+    assert {ch["metadata"]["slide"] for ch in local} == set(range(1, 8))
+    assert sharded == local
@@ -0,0 +1,72 @@
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+from app import rate_limit
+from app.aws_clients import client_config
+
+
+def error(code: str, status: int = 400) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": code}, "ResponseMetadata": {"HTTPStatusCode": status}}, "Op")
+
+
+def flaky(failures: list):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if failures:
+            raise failures.pop(0)
+        return "ok"
+    return fn, calls
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(rate_limit, "AWS_THROTTLE_BACKOFF_BASE", 0.0)
+
+
+def test_botocore_retries_are_off_for_wrapped_calls():
+    assert client_config().retries == {"mode": "standard", "total_max_attempts": 1}
+    assert client_config(retrying=True).retries["mode"] == "adaptive"
+
+
+def test_transfers_and_paginators_keep_botocore_retries(monkeypatch):
+    from app import aws_clients
+    monkeypatch.setattr(aws_clients, "_clients", {})
+    s3 = aws_clients.get_client("s3")
+    assert s3.wrapped.meta.config.retries["total_max_attempts"] == 1
+    for method in (s3.upload_fileobj, s3.download_fileobj, s3.get_paginator):
+        assert method.__self__.meta.config.retries["mode"] == "adaptive"
+    paginator = s3.get_paginator("list_objects_v2")
+    assert paginator._method.__self__.meta.config.retries["mode"] == "adaptive"
+
+
+def test_throttling_and_transient_errors_are_retried():
+    fn, calls = flaky([error("ThrottlingException"), error("InternalError", 500), EndpointConnectionError(endpoint_url="x")])
+    assert rate_limit.call("svc-a", "Op", fn) == "ok"
+    assert len(calls) == 4
+    stats = rate_limit.stats()["svc-a"]
+    assert (stats["throttled"], stats["retried"], stats["gave_up"]) == (1, 2, 0)
+
+
+def test_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(rate_limit, "AWS_THROTTLE_MAX_RETRIES", 2)
+    fn, calls = flaky([error("SlowDown", 503)] * 5)
+    with pytest.raises(ClientError):
+        rate_limit.call("svc-b", "Op", fn)
+    assert len(calls) == 3
+    assert rate_limit.stats()["svc-b"]["gave_up"] == 1
+
+
+def test_retries_are_counted_on_the_trace():
+    from app import metrics
+    fn, _ = flaky([error("ThrottlingException"), error("ServiceUnavailable", 503)])
+    with metrics.trace("t") as t:
+        rate_limit.call("svc-d", "Op", fn)
+    assert t.counters["retries"] == 2
+
+
+def test_other_errors_are_not_retried():
+    fn, calls = flaky([error("ValidationException")])
+    with pytest.raises(ClientError):
+        rate_limit.call("svc-c", "Op", fn)
+    assert len(calls) == 1
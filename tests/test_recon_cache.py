@@ -0,0 +1,34 @@
+from conftest import KB_ID
+from app import dynamo_client
+from app.recon_cache import make_key
+
+
+def recon_items(aws, use_case: str) -> list:
+    items = aws["dynamodb"].tables[dynamo_client.TABLE_RECON].items
+    return [it for (uc, _), it in items.items() if uc == use_case]
+
+
+def test_key_is_scoped_to_use_case():
+    assert make_key("ucA", "p", None, "m", "b") != make_key("ucB", "p", None, "m", "b")
+    assert make_key("ucA", "p", None, "m", "b") == make_key("ucA", "p", None, "m", "b")
+
+
+def test_cache_hit_only_within_use_case(orc, aws):
+    first = orc.query_kb_and_reconcile("ucA", KB_ID, "match payments", batch_id="b1")
+    assert not first.get("cached")
+    again = orc.query_kb_and_reconcile("ucA", KB_ID, "match payments", batch_id="b1")
+    assert again["cached"] and again["recon_id"] == first["recon_id"]
+
+    other = orc.query_kb_and_reconcile("ucB", KB_ID, "match payments", batch_id="b1")
+    assert not other.get("cached")
+    assert other["record"]["use_case"] == "ucB"
+    assert len(recon_items(aws, "ucB")) == 1
+    assert len(recon_items(aws, "ucA")) == 1
+
+
+def test_stream_cache_is_scoped_to_use_case(orc):
+    done = [e for e in orc.query_kb_and_reconcile_stream("ucA", KB_ID, "q") if e["type"] == "done"][0]
+    assert not done["result"].get("cached")
+    done = [e for e in orc.query_kb_and_reconcile_stream("ucB", KB_ID, "q") if e["type"] == "done"][0]
+    assert not done["result"].get("cached")
+    assert done["result"]["record"]["use_case"] == "ucB"
@@ -0,0 +1,40 @@
+import gzip
+import json
+from conftest import BUCKET, s3_keys
+from app import dynamo_client
+
+
+def store(orc, n: int = 5):
+    for i in range(n):
+        answer = "x" * (dynamo_client.RECON_INLINE_MAX_BYTES + 1) if i == 3 else f"answer {i}"
+        orc.dyn.put_recon_result("uc", f"r{i}", {"batch_id": f"b{i}", "kb_id": "kb", "bedrock_raw_response": {"output": {"text": answer}}})
+
+
+def test_listing_pages_through_summaries(orc, aws):
+    store(orc)
+    queries = []
+    query = aws["dynamodb"].query
+
+    def recording_query(**kwargs):
+        queries.append(kwargs)
+        return query(**kwargs)
+    aws["dynamodb"].query = recording_query
+
+    first = list(orc.list_recons("uc", limit=2))
+    assert [r["recon_id"] for r in first] == ["r4", "r3"]
+    assert len(queries) == 1 and queries[0]["Limit"] == 2
+    assert "payload" not in queries[0]["ExpressionAttributeNames"].values()
+    rest = list(orc.list_recons("uc", limit=None, cursor=first[-1]["cursor"]))
+    assert [r["recon_id"] for r in rest] == ["r2", "r1", "r0"]
+    assert rest[0]["summary"]["kb_id"] == "kb"
+
+
+def test_large_payloads_are_offloaded(orc, aws):
+    store(orc)
+    items = {r["recon_id"]: r for r in orc.list_recons("uc", limit=None)}
+    assert "payload_uri" in items["r3"] and "payload_uri" not in items["r2"]
+    assert s3_keys(aws, "recons") == ["usecase/uc/recons/r3.json.gz"]
+    body = aws["s3"].objects[(BUCKET, "usecase/uc/recons/r3.json.gz")]
+    assert json.loads(gzip.decompress(body))["batch_id"] == "b3"
+    assert orc.load_recon("uc", items["r3"])["bedrock_raw_response"]["output"]["text"].startswith("xxx")
+    assert orc.load_recon("uc", items["r2"])["bedrock_raw_response"]["output"]["text"] == "answer 2"
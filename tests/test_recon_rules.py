@@ -0,0 +1,78 @@
+import json
+import pytest
+import pandas as pd
+from app.recon_rules import rows_frame, reconcile_frames, _amount_series
+
+RULES = {
+    "left": {"file": "ledger*", "key": ["id"], "amount": "amount", "currency": "ccy"},
+    "right": {"file": "bank*", "key": ["ref"], "amount": "value", "currency": "ccy"},
+    "tolerance": 0.01,
+}
+
+
+def frame(name: str, rows: list) -> pd.DataFrame:
+    return rows_frame({"chunk_id": f"{name}{i}", "text": json.dumps(r), "metadata": {"doc_uri": f"s3://b/{name}", "row": i + 2}}
+                      for i, r in enumerate(rows))
+
+
+def outcome(left: list, right: list, **rules) -> dict:
+    res = reconcile_frames(frame("l", left), frame("r", right), {**RULES, **rules})
+    return res["summary"], {(e["type"], tuple(e["key"].values())) for e in res["exceptions"]}
+
+
+@pytest.mark.parametrize("value, kwargs, expected", [
+    ("1,234.56", {}, 1234.56),
+    ("(1,234.56)", {}, -1234.56),
+    ("1,234.56-", {}, -1234.56),
+    ("$ -12", {}, -12.0),
+    ("1.234,56", {"decimal": ",", "thousands": "."}, 1234.56),
+    ("(1.234,56)", {"decimal": ",", "thousands": "."}, -1234.56),
+])
+def test_amount_text_formats(value, kwargs, expected):
+    assert _amount_series(pd.Series([value], dtype="object"), **kwargs).iloc[0] == pytest.approx(expected)
+
+
+def test_unparseable_amounts_are_invalid_and_logged(caplog):
+    s = _amount_series(pd.Series(["1-234", 12, None], dtype="object"))
+    assert s.isna().tolist() == [True, False, True] and s.iloc[1] == 12.0
+    summary, exceptions = outcome([{"id": 1, "amount": "1-234", "ccy": "USD"}], [{"ref": 1, "value": 5, "ccy": "USD"}])
+    assert exceptions == {("invalid_amount", ("1",))}
+    assert "could not be parsed" in caplog.text
+
+
+def test_amount_format_from_rules():
+    summary, _ = outcome([{"id": 1, "amount": "1.234,56", "ccy": "EUR"}], [{"ref": 1, "value": 1234.56, "ccy": "EUR"}],
+                         amount_format={"decimal": ",", "thousands": "."})
+    assert summary["matched"] == 1
+
+
+def test_tolerance_boundaries():
+    left = [{"id": i, "amount": 100, "ccy": "USD"} for i in (1, 2, 3)]
+    right = [{"ref": 1, "value": 100.01, "ccy": "USD"}, {"ref": 2, "value": 100.02, "ccy": "USD"}, {"ref": 3, "value": 99.99, "ccy": "USD"}]
+    summary, exceptions = outcome(left, right)
+    assert summary["matched"] == 2
+    assert exceptions == {("amount_mismatch", ("2",))}
+    summary, _ = outcome(left, right, tolerance=0.0, rel_tolerance=0.0002)
+    assert summary["matched"] == 3
+
+
+def test_currency_conversion_and_mismatch():
+    left = [{"id": 1, "amount": 100, "ccy": "EUR"}, {"id": 2, "amount": 10, "ccy": "CHF"}]
+    right = [{"ref": 1, "value": 108, "ccy": "usd"}, {"ref": 2, "value": 10, "ccy": "USD"}]
+    rates = {"base": "USD", "rates": {"EUR": 1.08}}
+    summary, exceptions = outcome(left, right, currency=rates)
+    assert summary["matched"] == 1
+    assert exceptions == {("unknown_currency", ("2",))}
+    _, exceptions = outcome(left[:1], right[:1])
+    assert exceptions == {("currency_mismatch", ("1",))}
+
+
+def test_duplicate_and_missing_keys():
+    left = [{"id": 1, "amount": 5, "ccy": "USD"}, {"id": 1, "amount": 6, "ccy": "USD"}, {"id": 2, "amount": 7, "ccy": "USD"},
+            {"id": None, "amount": 8, "ccy": "USD"}]
+    right = [{"ref": "1", "value": 5, "ccy": "USD"}, {"ref": "3", "value": 9, "ccy": "USD"}]
+    summary, exceptions = outcome(left, right)
+    # duplicated rows do not take part in the join, so their counterpart reads as one-sided
+    assert exceptions == {("duplicate_key", ("1",)), ("missing_in_left", ("1",)), ("missing_in_right", ("2",)),
+                          ("missing_in_left", ("3",)), ("missing_key", (None,))}
+    assert (summary["duplicate_key"], summary["missing_key"], summary["matched"]) == (2, 1, 0)
@@ -0,0 +1,20 @@
+from conftest import KB_ID
+from app import metrics
+
+
+def test_trace_is_not_left_in_the_callers_context(orc):
+    events = orc.query_kb_and_reconcile_stream("uc", KB_ID, "what differs?", use_cache=False)
+    assert next(events)["type"] == "text"
+    assert metrics.current() is None
+    done = list(events)[-1]
+    assert done["type"] == "done"
+    assert "generate" in done["result"]["metrics"]["spans"]
+    assert metrics.current() is None
+
+
+def test_abandoned_stream_ends_its_trace(orc):
+    with metrics.trace("caller") as caller:
+        events = orc.query_kb_and_reconcile_stream("uc", KB_ID, "what differs?", use_cache=False)
+        next(events)
+        events.close()
+        assert metrics.current() is caller
@@ -0,0 +1,39 @@
+from conftest import BUCKET
+from app.dynamo_client import DynamoClient
+from app.snippet_index import SnippetIndex, chunk_id_from_ref
+
+ROW = {"chunk_id": "c1", "text": '{"id": 7, "amount": 12.5}', "metadata": {"doc_uri": f"s3://{BUCKET}/usecase/uc/incoming/b1/t.csv", "row": 2}}
+
+
+def get_items(aws) -> int:
+    return aws["dynamodb"].stats()["by_operation"].get("GetItem", 0)
+
+
+def test_lookup_is_cached_and_renders_rows(aws):
+    dyn = DynamoClient()
+    dyn.put_chunks("uc", [ROW])
+    index = SnippetIndex(dyn)
+    assert index.resolve({"kb_chunk_id": "s3://b/usecase/uc/kb_chunks/b1/c1.json"}, "uc") == {"id": 7, "amount": 12.5}
+    calls = get_items(aws)
+    rec = index.lookup("uc", "c1")
+    assert (rec["kind"], rec["row"], get_items(aws)) == ("row", 2, calls)
+    assert chunk_id_from_ref({"metadata": {"chunk_id": "c9"}, "kb_chunk_id": "x/c1.json"}) == "c9"
+
+
+def test_misses_are_not_cached_and_writes_invalidate(aws):
+    dyn = DynamoClient()
+    index = SnippetIndex(dyn)
+    assert index.lookup("uc", "c1") is None
+    dyn.put_chunks("uc", [ROW])
+    assert index.lookup("uc", "c1")["text"] == ROW["text"]
+
+    dyn.put_chunks("uc", [{**ROW, "text": '{"id": 7, "amount": 13}'}])
+    assert index.lookup("uc", "c1")["text"] == '{"id": 7, "amount": 13}'
+    DynamoClient().delete_chunks("uc", ["c1"])
+    assert index.lookup("uc", "c1") is None
+
+
+def test_unknown_chunk_falls_back_to_the_source_row(aws):
+    aws["s3"].put_object(Bucket=BUCKET, Key="usecase/uc/incoming/b1/t.csv", Body=b"id,amount\n5,1\n6,2\n7,12.5\n")
+    index = SnippetIndex(DynamoClient())
+    assert index.resolve({"kb_chunk_id": "gone", "metadata": {"doc_uri": ROW["metadata"]["doc_uri"], "row": 2}}, "uc") == {"id": 7, "amount": 12.5}
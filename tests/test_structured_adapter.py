@@ -0,0 +1,50 @@
+import json
+import pandas as pd
+from conftest import BUCKET, s3_keys
+from app.structured_adapter import iter_row_chunks, serialise_rows, excel_to_row_chunks
+
+
+def write_book(path) -> str:
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Payments"
+    ws.append(["id", "amount", None, "id"])
+    for i in range(7):
+        ws.append([i, i * 1.5, f"n{i}", f"x{i}"] if i != 3 else [None, None, None, None])
+    other = wb.create_sheet("Fees")
+    other.append(["code", "fee"])
+    other.append(["A", 2])
+    wb.save(path)
+    return path
+
+
+def expected_rows(path) -> list:
+    rows = []
+    for sheet, df in pd.read_excel(path, sheet_name=None).items():
+        df = df.dropna(how="all")
+        rows.extend((sheet, int(i), json.loads(text)) for i, text in zip(df.index, serialise_rows(df)))
+    return rows
+
+
+def test_blocks_match_a_whole_sheet_read(tmp_path):
+    path = write_book(str(tmp_path / "book.xlsx"))
+    chunks = list(iter_row_chunks(path, BUCKET, "uc", "b1", block_rows=2, doc_uri="s3://b/book.xlsx"))
+    # values compare as numbers: a whole-sheet read turns an int column with a blank row into floats
+    assert [(ch["metadata"]["sheet"], ch["metadata"]["row"], json.loads(ch["text"])) for ch in chunks] == expected_rows(path)
+    assert '"Unnamed: 2":"n0","id.1":"x0"' in chunks[0]["text"]
+
+
+def test_csv_blocks_keep_row_numbers(tmp_path):
+    path = tmp_path / "t.csv"
+    path.write_text("a,b\n1,x\n2,y\n3,z\n4,w\n5,v\n")
+    chunks = list(iter_row_chunks(str(path), BUCKET, "uc", "b1", block_rows=2, columns=["a"]))
+    assert [(ch["metadata"]["row"], ch["text"]) for ch in chunks] == [(i, f'{{"a":{i + 1}}}') for i in range(5)]
+    assert chunks[0]["metadata"]["doc_uri"] == f"s3://{BUCKET}/usecase/uc/incoming/b1/"
+
+
+def test_rows_are_uploaded_as_structured_row_objects(aws, tmp_path):
+    path = write_book(str(tmp_path / "book.xlsx"))
+    batch = excel_to_row_chunks(path, BUCKET, "uc", "b1", sheets=["Fees"])
+    assert len(batch) == 1 and batch[0]["s3_uri"].endswith(f"/structured_rows/b1/{batch[0]['chunk_id']}.json")
+    assert s3_keys(aws, "structured_rows") == [batch[0]["s3_uri"].split("/", 3)[3]]
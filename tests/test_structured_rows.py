@@ -0,0 +1,30 @@
+from conftest import KB_ID
+from app.orchestrator import Orchestrator
+
+BODY = b"a,b\n1,x\n2,y\n3,z\n"
+
+
+def test_rows_parsed_at_ingest_are_reused(orc, aws):
+    res = orc.ingest_file_and_sync("uc", KB_ID, BODY, "t.csv", "me", dedup=False)
+    reads = aws["s3"].stats()["by_operation"].get("GetObject", 0)
+    frames = orc.load_structured_rows("uc", res["batch_id"])
+    assert aws["s3"].stats()["by_operation"].get("GetObject", 0) == reads
+    assert len(frames["t.csv"]) == 3
+
+    # a fresh process re-reads the source and produces the same chunk ids
+    fresh = Orchestrator().load_structured_rows("uc", res["batch_id"])
+    assert aws["s3"].stats()["by_operation"].get("GetObject", 0) == reads + 1
+    assert fresh["t.csv"].equals(frames["t.csv"])
+
+
+def test_frame_is_built_batch_by_batch():
+    from app.recon_rules import RowsFrameBuilder, rows_frame
+    chunks = [{"chunk_id": f"c{i}", "text": f'{{"a": {i}, "b": "x{i}"}}', "metadata": {"doc_uri": "s3://b/t.csv", "sheet": None, "row": i}}
+              for i in range(5)]
+    rows = RowsFrameBuilder(max_rows=5, batch=2)
+    assert list(rows.tee(iter(chunks))) == chunks
+    assert rows.frame().equals(rows_frame(chunks))
+
+    too_many = RowsFrameBuilder(max_rows=4, batch=2)
+    assert len(list(too_many.tee(iter(chunks)))) == 5
+    assert too_many.frame() is None
@@ -0,0 +1,43 @@
+import time
+import pytest
+from conftest import KB_ID
+from app.sync_scheduler import KBSyncScheduler
+
+
+def builds(aws) -> int:
+    return aws["bedrock-agent"].stats()["by_operation"].get("StartKnowledgeBaseBuild", 0)
+
+
+def scheduler(**kwargs) -> KBSyncScheduler:
+    return KBSyncScheduler(KB_ID, **{"debounce": 0.05, "poll_interval": 0.01, **kwargs})
+
+
+def test_requests_within_the_debounce_window_share_a_build(aws):
+    sched = scheduler()
+    tickets = [sched.request() for _ in range(3)]
+    statuses = [t.wait(5) for t in tickets]
+    assert builds(aws) == sched.builds_started == 1
+    assert all(s is statuses[0] for s in statuses) and statuses[0]["status"] == "COMPLETE"
+
+
+def test_requests_during_a_build_fold_into_the_next_one(aws):
+    aws["bedrock-agent"].build_s = 0.2
+    sched = scheduler()
+    first = sched.request()
+    while not builds(aws):
+        time.sleep(0.01)
+    later = [sched.request() for _ in range(3)]
+    first.wait(5)
+    assert not any(t.done() for t in later)
+    for t in later:
+        t.wait(5)
+    assert builds(aws) == 2
+
+
+def test_stuck_build_fails_its_waiters_and_frees_the_scheduler(aws):
+    aws["bedrock-agent"].build_s = 60
+    sched = scheduler(timeout=0.1)
+    with pytest.raises(RuntimeError, match="after 0.1s"):
+        sched.request().wait(5)
+    aws["bedrock-agent"].build_s = 0
+    assert sched.request().wait(5)["status"] == "COMPLETE"
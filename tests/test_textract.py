@@ -0,0 +1,132 @@
+import pytest
+from botocore.exceptions import ClientError
+from conftest import BUCKET, s3_keys
+from bench.synthetic import write_pdf
+from app import textract_processor
+from app.textract_processor import (iter_segmented_chunks, iter_analysis_pages, start_async_analysis_s3, iter_chunks_from_textract,
+                                    extract_chunks_from_textract_response)
+
+KEY = "usecase/uc/incoming/b1/doc.pdf"
+URI = f"s3://{BUCKET}/{KEY}"
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    with open(write_pdf(str(tmp_path / "doc.pdf"), pages=5), "rb") as f:
+        yield f
+
+
+def test_segments_are_encrypted_and_removed(aws, pdf):
+    s3 = aws["s3"]
+    put = s3.put_object
+    segment_args = []
+
+    def put_object(**kwargs):
+        segment_args.append({k: v for k, v in kwargs.items() if k != "Body"})
+        return put(**kwargs)
+    s3.put_object = put_object
+    assert list(iter_segmented_chunks(pdf, BUCKET, KEY, URI, segment_pages=2, max_jobs=2))
+    assert len(segment_args) == 3
+    assert all(a["ServerSideEncryption"] == "aws:kms" for a in segment_args)
+    assert s3_keys(aws, "incoming") == []
+
+
+def test_segments_are_removed_when_a_job_fails(aws, pdf):
+    textract = aws["textract"]
+    start = textract.start_document_analysis
+    started = []
+
+    def start_document_analysis(**kwargs):
+        if started:
+            raise ClientError({"Error": {"Code": "InvalidS3ObjectException", "Message": "x"}}, "StartDocumentAnalysis")
+        started.append(1)
+        return start(**kwargs)
+    textract.start_document_analysis = start_document_analysis
+    with pytest.raises(ClientError):
+        list(iter_segmented_chunks(pdf, BUCKET, KEY, URI, segment_pages=2, max_jobs=2))
+    assert s3_keys(aws, "incoming") == []
+
+
+def test_result_pages_follow_next_token(aws, pdf):
+    textract = aws["textract"]
+    textract.blocks_per_page = 300
+    aws["s3"].put_object(Bucket=BUCKET, Key=KEY, Body=pdf.read())
+    job_id = start_async_analysis_s3(BUCKET, KEY)
+    pages = list(iter_analysis_pages(job_id))
+    expected = textract.jobs[job_id][1]["Blocks"]
+    assert len(pages) == -(-len(expected) // 300) > 1
+    assert [b for p in pages for b in p["Blocks"]] == expected
+    assert textract.stats()["by_operation"]["GetDocumentAnalysis"] == len(pages)
+
+
+def test_polling_backs_off_until_the_job_finishes(aws, monkeypatch):
+    textract = aws["textract"]
+    textract.job_s = 3600
+    job_id = start_async_analysis_s3(BUCKET, KEY)
+    delays = []
+
+    def sleep(delay):
+        delays.append(delay)
+        if len(delays) == 6:
+            textract.jobs[job_id] = (0.0, textract.jobs[job_id][1])
+    monkeypatch.setattr(textract_processor.time, "sleep", sleep)
+    assert next(iter_analysis_pages(job_id, poll_initial=1.0, poll_max=4.0))["JobStatus"] == "SUCCEEDED"
+    assert delays == [1.0, 1.6, pytest.approx(2.56), 4.0, 4.0, 4.0]
+
+
+def block(id_, kind, children=(), **fields):
+    b = {"Id": id_, "BlockType": kind, "Page": 1, **fields}
+    if children:
+        b["Relationships"] = [{"Type": "CHILD", "Ids": list(children)}]
+    return b
+
+
+def shape(chunks) -> list:
+    return [(ch["text"], tuple(sorted(ch["metadata"].items()))) for ch in chunks]
+
+
+def test_tables_are_rebuilt_from_blocks_in_any_order():
+    # result pages may list a table before its cells and a cell before its words
+    pages = [
+        {"Blocks": [block("p", "PAGE", ["l"]), block("t", "TABLE", ["c2", "c1", "c3"], Page=2), block("c2", "CELL", ["w2"], RowIndex=1, ColumnIndex=2)]},
+        {"Blocks": [block("c1", "CELL", ["w1"], RowIndex=1, ColumnIndex=1), block("c3", "CELL", ["w3", "w4"], RowIndex=2, ColumnIndex=1),
+                    block("l", "LINE", ["w5"], Text="Total due"), block("w1", "WORD", Text="Amount"), block("w2", "WORD", Text="12.50"),
+                    block("w3", "WORD", Text="Late"), block("w4", "WORD", Text="fee"), block("w5", "WORD", Text="Total due")]},
+    ]
+    uri = "s3://b/doc.pdf"
+    chunks = extract_chunks_from_textract_response(iter(pages), uri)
+    assert shape(chunks) == shape([
+        {"text": "Total due", "metadata": {"doc_uri": uri, "page": 1}},
+        {"text": "Amount | 12.50", "metadata": {"doc_uri": uri, "page": 2, "table": 1, "row": 1}},
+        {"text": "12.50", "metadata": {"doc_uri": uri, "page": 2, "table": 1, "row": 1, "col": 2}},
+        {"text": "Amount", "metadata": {"doc_uri": uri, "page": 2, "table": 1, "row": 1, "col": 1}},
+        {"text": "Late fee", "metadata": {"doc_uri": uri, "page": 2, "table": 1, "row": 2}},
+        {"text": "Late fee", "metadata": {"doc_uri": uri, "page": 2, "table": 1, "row": 2, "col": 1}},
+    ])
+
+
+def test_synthetic_response_chunk_counts():
+    from bench.synthetic import make_textract_response
+    resp = make_textract_response(pages=2, lines_per_page=5, tables_per_page=2, rows=3, cols=4)
+    chunks = list(iter_chunks_from_textract(resp["Blocks"], "s3://b/doc.pdf"))
+    lines = [ch for ch in chunks if "table" not in ch["metadata"]]
+    cells = [ch for ch in chunks if "col" in ch["metadata"]]
+    assert (len(lines), len(chunks) - len(lines) - len(cells), len(cells)) == (10, 2 * 2 * 3, 2 * 2 * 3 * 4)
+    assert sorted({ch["metadata"]["table"] for ch in cells}) == [1, 2, 3, 4]
+
+
+def locators(chunks) -> list:
+    return sorted(tuple(ch["metadata"].get(k, 0) for k in ("page", "table", "row", "col")) for ch in chunks)
+
+
+def test_segments_match_a_single_job_analysis(aws, pdf):
+    aws["s3"].put_object(Bucket=BUCKET, Key=KEY, Body=pdf.read())
+    whole = list(iter_chunks_from_textract((b for p in iter_analysis_pages(start_async_analysis_s3(BUCKET, KEY)) for b in p["Blocks"]), URI))
+    segmented = list(iter_segmented_chunks(pdf, BUCKET, KEY, URI, segment_pages=2, max_jobs=2))
+    assert aws["textract"].stats()["by_operation"]["StartDocumentAnalysis"] == 1 + 3
+    assert locators(segmented) == locators(whole)
+    # segments are consumed in page order (within one, tables follow the lines)
+    segments = [(ch["metadata"]["page"] - 1) // 2 for ch in segmented]
+    assert segments == sorted(segments) and set(segments) == {0, 1, 2}
+    tables = [ch["metadata"]["table"] for ch in segmented if "table" in ch["metadata"]]
+    assert tables == sorted(tables) and set(tables) == set(range(1, max(tables) + 1))